@@ -0,0 +1,80 @@
+"""Benchmark the startup of each challengeutils subcommand: the time from
+starting Python until the command has imported everything it needs.  Each
+sample runs in a fresh interpreter so nothing is cached in sys.modules.
+Commands stop at their first Synapse call.  No login is done, but the
+synapseclient import that every login needs is included in the time.
+
+>>> python benchmarks/bench_cli_startup.py
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+SUBCOMMANDS = {
+    'annotatesubmission': ["annotatesubmission", "1", "annotations.json"],
+    'changestatus': ["changestatus", "1", "SCORED"],
+    'download_current_lead_submission': [
+        "download_current_lead_submission", "-i", "1", "-s", "SCORED"
+    ],
+    'downloadsubmission': ["downloadsubmission", "1"],
+    'killdockeroverquota': ["killdockeroverquota", "1", "10"],
+    'listevaluations': ["listevaluations", "syn1"],
+    'query': ["query", "select * from evaluation_1"],
+    'sendemail': ["sendemail", "--userids", "1", "--subject", "a",
+                  "--message", "b"],
+    'setentityacl': ["setentityacl", "syn1", "1", "view"],
+    'setevaluationquota': ["setevaluationquota", "1"],
+    'attachwriteup': ["attachwriteup", "1", "2"],
+    'auditpermissions': ["auditpermissions", "syn1"],
+    'createchallenge': ["createchallenge", "name", "--plan"],
+    'mirrorwiki': ["mirrorwiki", "syn1", "syn2"],
+}
+
+# Starts the clock, imports synapseclient like synapse_login does, runs the
+# command with no Synapse connection and prints the seconds and number of
+# modules it took to get to the first call
+RUN_COMMAND = """
+import time
+start = time.perf_counter()
+import json, sys
+from challengeutils import __main__ as cli
+args = cli.build_parser().parse_args(json.loads(sys.argv[1]))
+import synapseclient
+try:
+    args.func(None, args)
+except Exception:
+    pass
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'modules': len(sys.modules)}))
+"""
+
+
+def time_subcommand(argv):
+    """Seconds and number of loaded modules for one run of a subcommand"""
+    output = subprocess.run(
+        [sys.executable, "-c", RUN_COMMAND, json.dumps(argv)],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    ).stdout
+    result = json.loads(output.decode().splitlines()[-1])
+    return result['seconds'], result['modules']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Number of runs of each subcommand")
+    parser.add_argument("subcommands", nargs="*",
+                        help="Subcommands to time. Default is all")
+    args = parser.parse_args()
+
+    for name in args.subcommands or SUBCOMMANDS:
+        runs = [time_subcommand(SUBCOMMANDS[name])
+                for _ in range(args.repeat)]
+        seconds = statistics.median(run[0] for run in runs)
+        print(f"{name:35}{seconds * 1000:8.1f} ms{runs[0][1]:6d} modules")
+
+
+if __name__ == "__main__":
+    main()
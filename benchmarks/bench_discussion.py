@@ -0,0 +1,68 @@
+"""Benchmark keeping forum threads as the JSON response dicts against the
+lazily decoded Thread models
+
+>>> python benchmarks/bench_discussion.py
+"""
+import argparse
+import json
+import timeit
+import tracemalloc
+
+from synapseservices.discussion import Thread
+
+
+def thread_response(number, authors):
+    """JSON page of forum threads like /forum/{id}/threads returns"""
+    return json.dumps({'results': [
+        {'id': str(5583 + i),
+         'forumId': "444",
+         'projectId': "syn21849999",
+         'title': f"Thread {i}",
+         'createdOn': "2019-06-27T04:01:25.000Z",
+         'modifiedOn': "2019-06-27T04:01:25.000Z",
+         'lastActivity': "2019-06-27T04:01:25.000Z",
+         'createdBy': "3379097",
+         'etag': "dfsdf-df-4a44dfsd-982c-2d81102cf5d6",
+         'messageKey': f"444/5583/{i}/c1f8d4f6-a3d8-4b8e-9b3f-2b5e0d8f1a6e",
+         'numberOfViews': 10, 'numberOfReplies': 3,
+         'isEdited': False, 'isDeleted': False, 'isPinned': False,
+         'activeAuthors': [str(3379097 + author)
+                           for author in range(authors)]}
+        for i in range(number)
+    ]})
+
+
+def memory_per_thread(page, build):
+    """Bytes kept alive per thread after the page is parsed and wrapped"""
+    tracemalloc.start()
+    threads = [build(thread) for thread in json.loads(page)['results']]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    number = len(threads)
+    del threads
+    return size / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=10000,
+                        help="Number of threads")
+    parser.add_argument("-a", "--authors", type=int, default=20,
+                        help="Active authors per thread")
+    args = parser.parse_args()
+
+    page = thread_response(args.number, args.authors)
+    builders = {'dict': lambda thread: thread,
+                'Thread': Thread.from_dict}
+    for name, build in builders.items():
+        seconds = timeit.timeit(
+            lambda: [build(thread) for thread in json.loads(page)['results']],
+            number=5
+        ) / 5
+        memory = memory_per_thread(page, build)
+        print(f"{name:10}{seconds / args.number * 1e6:8.2f} us/thread"
+              f"{memory:10.0f} bytes/thread")
+
+
+if __name__ == "__main__":
+    main()
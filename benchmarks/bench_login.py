@@ -0,0 +1,48 @@
+"""Benchmark a full Synapse login against reusing a cached login.
+Needs Synapse credentials in the Synapse config and network access.
+
+>>> python benchmarks/bench_login.py -c ~/.synapseConfig
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from challengeutils import session
+from challengeutils.__main__ import CONFIG_FILE, synapse_login
+
+
+def time_login(synapse_config, repeat):
+    """Median seconds of a challengeutils login"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        synapse_login(synapse_config)
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--synapse_config", default=CONFIG_FILE,
+                        help="credentials file")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Number of logins")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ[session.SESSION_CACHE_ENV] = os.path.join(cache_dir,
+                                                             "session.json")
+        os.environ[session.SESSION_TTL_ENV] = "0"
+        full = time_login(args.synapse_config, args.repeat)
+        os.environ[session.SESSION_TTL_ENV] = "3600"
+        # The first login fills the cache
+        synapse_login(args.synapse_config)
+        cached = time_login(args.synapse_config, args.repeat)
+    print(f"full login   {full * 1000:8.1f} ms")
+    print(f"cached login {cached * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Benchmark rendering harness messages with compiled templates against
+filling in the templates twice with DefaultFormatter
+
+>>> python benchmarks/bench_messages.py
+"""
+import argparse
+import timeit
+
+from scoring_harness import messages
+
+KWARGS = dict(username="participant",
+              queue_name="Example Challenge Sub-challenge 1",
+              submission_name="prediction.csv",
+              submission_id="9700001",
+              message="Your submission is correctly formatted",
+              challenge_synid="syn1234")
+
+
+def two_pass(template, kwargs):
+    """How send_message used to fill in templates"""
+    filled = template.format_map(messages.DefaultFormatter(messages.DEFAULTS))
+    return filled.format_map(messages.DefaultFormatter(kwargs))
+
+
+def compiled(template, kwargs):
+    """Fill in templates with a compiled template"""
+    return messages.compile_template(template).render(kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=100000,
+                        help="Number of messages to render")
+    args = parser.parse_args()
+
+    templates = {'subject': messages.VALIDATION_PASSED_SUBJECT_TEMPLATE,
+                 'body': messages.VALIDATION_PASSED_TEMPLATE}
+    for name, template in templates.items():
+        assert two_pass(template, KWARGS) == compiled(template, KWARGS)
+        results = {}
+        for render in (two_pass, compiled):
+            results[render.__name__] = timeit.timeit(
+                lambda: render(template, KWARGS), number=args.number
+            )
+        for render_name, seconds in results.items():
+            print(f"{name:8}{render_name:10}"
+                  f"{seconds / args.number * 1e6:8.2f} us/message")
+        print(f"{name:8}speedup   "
+              f"{results['two_pass'] / results['compiled']:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
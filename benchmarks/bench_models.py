@@ -0,0 +1,67 @@
+"""Benchmark building synapseservices models with the precompiled slots
+models against the generic reflection based Service models
+
+>>> python benchmarks/bench_models.py
+"""
+import argparse
+import timeit
+import tracemalloc
+
+from synapseservices.base_service import Service, deserialize_model
+from synapseservices.challenge import Challenge
+
+RESPONSE = {'id': "9610001",
+            'projectId': "syn21849999",
+            'etag': "6a9b7c1e-5f0d-4c55-9a34-6d3a5b0c2f11",
+            'participantTeamId': "3412345"}
+
+
+class GenericChallenge(Service):
+    """How Challenge used to be built"""
+    def __init__(self, id=None, projectId=None, etag=None,
+                 participantTeamId=None):
+        self.openapi_types = {'id': str, 'projectid': str, 'etag': str,
+                              'participant_teamid': str}
+        self.attribute_map = {'id': 'id', 'projectid': 'projectId',
+                              'etag': 'etag',
+                              'participant_teamid': 'participantTeamId'}
+        self.id = id
+        self.projectid = projectId
+        self.etag = etag
+        self.participant_teamid = participantTeamId
+
+
+def memory_per_object(build, number):
+    """Bytes allocated per object while keeping number objects alive"""
+    tracemalloc.start()
+    objects = [build() for _ in range(number)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=100000,
+                        help="Number of objects to build")
+    args = parser.parse_args()
+
+    assert (Challenge.from_dict(RESPONSE).to_dict() ==
+            deserialize_model(RESPONSE, GenericChallenge).to_dict())
+    builders = {
+        'generic from_dict': lambda: deserialize_model(RESPONSE,
+                                                       GenericChallenge),
+        'slots from_dict': lambda: Challenge.from_dict(RESPONSE),
+        'generic **kwargs': lambda: GenericChallenge(**RESPONSE),
+        'slots **kwargs': lambda: Challenge(**RESPONSE)
+    }
+    for name, build in builders.items():
+        seconds = timeit.timeit(build, number=args.number)
+        memory = memory_per_object(build, min(args.number, 10000))
+        print(f"{name:20}{seconds / args.number * 1e6:8.2f} us/object"
+              f"{memory:10.0f} bytes/object")
+
+
+if __name__ == "__main__":
+    main()
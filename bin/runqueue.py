@@ -3,13 +3,24 @@
 import argparse
 import importlib
 import logging
+import os
+import time
 from datetime import timedelta
 
 import synapseclient
-from synapseclient.exceptions import SynapseAuthenticationError
-from synapseclient.exceptions import SynapseNoCredentialsError
+try:
+    from synapseclient.core.exceptions import SynapseAuthenticationError
+    from synapseclient.core.exceptions import SynapseNoCredentialsError
+except ModuleNotFoundError:
+    # For synapseclient < v2.0
+    from synapseclient.exceptions import SynapseAuthenticationError
+    from synapseclient.exceptions import SynapseNoCredentialsError
 
+from challengeutils import session
 from scoring_harness import lock
+from scoring_harness.messages import AdminDigest
+from scoring_harness.outbox import MessageOutbox
+from scoring_harness.timing import StageTimer
 
 logging.basicConfig(format='%(asctime)s %(message)s')
 LOGGER = logging.getLogger(__name__)
@@ -32,47 +43,17 @@ def import_config_py(config_path):
     return module
 
 
-# ==================================================
-#  Handlers for command
-# ==================================================
-def command(syn, evaluation_queue_maps, admin_user_ids=None, dry_run=False,
-            remove_cache=False, send_messages=False, notifications=True):
-    for queueid in evaluation_queue_maps:
-        for config in evaluation_queue_maps[queueid]:
-            invoke_func = config['func']
-            invoke = invoke_func(syn, queueid,
-                                 admin_user_ids=admin_user_ids,
-                                 dry_run=dry_run,
-                                 remove_cache=remove_cache,
-                                 send_messages=send_messages,
-                                 notifications=notifications,
-                                 **config['kwargs'])
-            invoke()
-
-
-def main(args):
-    """Main method that executes validate / scoring"""
-    # Synapse login
-    try:
-        if args.synapse_config is not None:
-            syn = synapseclient.Synapse(debug=args.debug,
-                                        configPath=args.synapse_config)
-        else:
-            syn = synapseclient.Synapse(debug=args.debug)
-        syn.login(silent=True)
-    except (SynapseAuthenticationError, SynapseNoCredentialsError):
-        raise ValueError("Must provide Synapse credentials as parameters or "
-                         "through a Synapse config file.")
+def get_evaluation_queue_maps(module):
+    """
+    Validates a configuration module and groups its
+    EVALUATION_QUEUES_CONFIG by evaluation queue id
 
-    # TODO: Check challenge admin ids
-    if args.admin_user_ids is None:
-        args.admin_user_ids = [syn.getUserProfile()['ownerId']]
-
-    try:
-        module = import_config_py(args.config_path)
-    except Exception:
-        raise ValueError("Error importing your python config script")
+    Args:
+        module: Imported configuration module
 
+    Returns:
+        dict: {evaluation id: [queue configuration, ...]}
+    """
     check_keys = set(["id", "func", 'kwargs'])
     evaluation_queue_maps = {}
     for queue in module.EVALUATION_QUEUES_CONFIG:
@@ -85,17 +66,111 @@ def main(args):
             evaluation_queue_maps[queue['id']].append(queue)
         else:
             evaluation_queue_maps[queue['id']] = [queue]
+    return evaluation_queue_maps
+
+
+def load_config(config_path, evaluation=None):
+    """
+    Imports and validates the configuration script.  Nothing is returned
+    unless the whole configuration is valid, so a running harness can
+    keep its previous configuration if a reload fails.
+
+    Args:
+        config_path: Path to configuration python script
+        evaluation: Evaluation id(s) to restrict the configuration to.
+                    Default is all evaluations in EVALUATION_QUEUES_CONFIG
+
+    Returns:
+        dict: {evaluation id: [queue configuration, ...]}
+    """
+    try:
+        module = import_config_py(config_path)
+    except Exception:
+        raise ValueError("Error importing your python config script")
+
+    evaluation_queue_maps = get_evaluation_queue_maps(module)
 
-    if args.evaluation:
+    if evaluation:
         try:
             eval_queues = {evalid: evaluation_queue_maps[evalid]
-                           for evalid in args.evaluation}
+                           for evalid in evaluation}
         except KeyError:
             raise ValueError("If evaluation is specified, must match an 'id' "
                              "in EVALUATION_QUEUES_CONFIG")
     else:
         eval_queues = evaluation_queue_maps
+    return eval_queues
 
+
+class ConfigWatcher:
+    """
+    Reloads the configuration script whenever it changes on disk.
+    The new configuration only replaces the current one once it has
+    been imported and validated.
+
+    Attributes:
+        config_path: Path to configuration python script
+        evaluation: Evaluation id(s) to restrict the configuration to
+        eval_queues: Current {evaluation id: [queue configuration, ...]}
+    """
+    def __init__(self, config_path, evaluation=None):
+        self.config_path = config_path
+        self.evaluation = evaluation
+        # load_config raises ValueError for a missing or invalid script
+        self.eval_queues = load_config(config_path, evaluation)
+        self._mtime = os.path.getmtime(config_path)
+
+    def reload_if_changed(self):
+        """
+        Reload the configuration if the file was modified
+
+        Returns:
+            bool: True if a new configuration was swapped in
+        """
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError as err:
+            LOGGER.error(f"Can't read {self.config_path}: {err}")
+            return False
+        if mtime == self._mtime:
+            return False
+        # Only check the file once per change, even if it is invalid
+        self._mtime = mtime
+        try:
+            eval_queues = load_config(self.config_path, self.evaluation)
+        except Exception as err:
+            LOGGER.error("Keeping previous configuration, "
+                         f"error reloading {self.config_path}: {err}")
+            return False
+        self.eval_queues = eval_queues
+        LOGGER.info(f"Reloaded configuration {self.config_path}")
+        return True
+
+
+# ==================================================
+#  Handlers for command
+# ==================================================
+def command(syn, evaluation_queue_maps, admin_user_ids=None, dry_run=False,
+            remove_cache=False, send_messages=False, notifications=True,
+            timer=None, outbox=None, admin_digest=None):
+    for queueid in evaluation_queue_maps:
+        for config in evaluation_queue_maps[queueid]:
+            invoke_func = config['func']
+            invoke = invoke_func(syn, queueid,
+                                 admin_user_ids=admin_user_ids,
+                                 dry_run=dry_run,
+                                 remove_cache=remove_cache,
+                                 send_messages=send_messages,
+                                 notifications=notifications,
+                                 timer=timer,
+                                 outbox=outbox,
+                                 admin_digest=admin_digest,
+                                 **config['kwargs'])
+            invoke()
+
+
+def run_cycle(syn, eval_queues, args, timer=None, outbox=None):
+    """Validates / scores all the evaluation queues once"""
     # Acquire lock, don't run two scoring scripts at once
     try:
         update_lock = lock.acquire_lock_or_fail('challenge',
@@ -107,19 +182,84 @@ def main(args):
         # temporary error according to /usr/include/sysexits.h
         return 75
 
+    # Admin notifications are grouped per queue for each run
+    admin_digest = None
+    if args.digest:
+        admin_digest = AdminDigest(syn, dry_run=args.dry_run,
+                                   window=args.digest_window, outbox=outbox)
+
     try:
         command(syn, eval_queues, admin_user_ids=args.admin_user_ids,
                 dry_run=args.dry_run, remove_cache=args.remove_cache,
                 send_messages=args.send_messages,
-                notifications=args.notifications)
+                notifications=args.notifications,
+                timer=timer,
+                outbox=outbox,
+                admin_digest=admin_digest)
     except Exception as e:
         LOGGER.error(e)
-
-    update_lock.release()
+    finally:
+        # Always release the lock so a failed flush doesn't block the
+        # next runs until the lock expires
+        try:
+            if admin_digest is not None:
+                admin_digest.flush()
+            if timer is not None:
+                timer.write()
+        finally:
+            update_lock.release()
 
     return 0
 
 
+def main(args):
+    """Main method that executes validate / scoring"""
+    # Synapse login, reusing the login of an earlier run until it expires
+    def login():
+        if args.synapse_config is not None:
+            syn = synapseclient.Synapse(debug=args.debug,
+                                        configPath=args.synapse_config)
+        else:
+            syn = synapseclient.Synapse(debug=args.debug)
+        syn.login(silent=True)
+        return syn
+
+    try:
+        syn = session.cached_login(args.synapse_config, login,
+                                   debug=args.debug)
+    except (SynapseAuthenticationError, SynapseNoCredentialsError):
+        raise ValueError("Must provide Synapse credentials as parameters or "
+                         "through a Synapse config file.")
+
+    # TODO: Check challenge admin ids
+    if args.admin_user_ids is None:
+        args.admin_user_ids = [syn.getUserProfile()['ownerId']]
+
+    watcher = ConfigWatcher(args.config_path, args.evaluation)
+    timer = StageTimer(metrics_path=args.metrics_file)
+    outbox = None
+    if args.outbox is not None:
+        outbox = MessageOutbox(args.outbox)
+        outbox.log_failed()
+        outbox.start(syn)
+
+    try:
+        if args.interval is None:
+            return run_cycle(syn, watcher.eval_queues, args, timer=timer,
+                             outbox=outbox)
+
+        LOGGER.info(f"Running every {args.interval} seconds, "
+                    f"watching {args.config_path} for changes")
+        while True:
+            watcher.reload_if_changed()
+            run_cycle(syn, watcher.eval_queues, args, timer=timer,
+                      outbox=outbox)
+            time.sleep(args.interval)
+    finally:
+        if outbox is not None:
+            outbox.stop(syn)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
@@ -163,6 +303,40 @@ if __name__ == '__main__':
                         nargs='+',
                         default=None)
 
+    parser.add_argument("--interval",
+                        help="Keep running, validating/scoring every INTERVAL "
+                             "seconds.  The config script is reloaded between "
+                             "runs whenever it changes.",
+                        type=int,
+                        default=None)
+
+    parser.add_argument("--metrics-file",
+                        help="Write the time spent in each stage of the "
+                             "harness to this file in the Prometheus text "
+                             "format",
+                        default=None)
+
+    parser.add_argument("--outbox",
+                        help="Queue messages to this SQLite file and send "
+                             "them in the background instead of waiting "
+                             "for each message to be sent.  Messages that "
+                             "fail to send are retried up to 10 times, then "
+                             "kept in the file unsent and logged as errors "
+                             "when the harness stops.",
+                        default=None)
+
+    parser.add_argument("--digest",
+                        help="Send challenge admins one summary message per "
+                             "queue for each run instead of one message per "
+                             "failed submission",
+                        action="store_true")
+
+    parser.add_argument("--digest-window",
+                        help="With --digest, send a queue's summary once its "
+                             "oldest error is this many seconds old",
+                        type=int,
+                        default=None)
+
     args = parser.parse_args()
     LOGGER.info("=" * 30)
     LOGGER.info("STARTING HARNESS")
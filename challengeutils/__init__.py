@@ -1,3 +1,3 @@
 from . import discussion
 from . import permissions
-from .__version__ import __version__
\ No newline at end of file
+from .__version__ import __version__
@@ -3,26 +3,17 @@ import argparse
 import json
 import logging
 import os
+import sys
+import time
 
-import pandas as pd
-import synapseclient
-
-try:
-    from synapseclient.core.retry import with_retry
-except ModuleNotFoundError:
-    # For synapseclient < v2.0
-    from synapseclient.retry import _with_retry as with_retry
-
-from . import createchallenge
-from . import download_current_lead_submission as dl_cur
-from . import evaluation_queue
-from . import helpers
-from . import mirrorwiki
-from . import permissions
-from . import utils
-from . import writeup_attacher
+from . import server
 from .__version__ import __version__
 
+# Subcommand modules and pandas are imported by the commands that use
+# them, so each command only pays for its own imports.  This is
+# synapseclient.client.CONFIG_FILE.
+CONFIG_FILE = os.path.join(os.path.expanduser('~'), '.synapseConfig')
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -37,6 +28,8 @@ def command_mirrorwiki(syn, args):
 
     >>> challengeutils mirrorwiki syn12345 syn23456
     """
+    from . import mirrorwiki
+
     mirrorwiki.mirrorwiki(syn, args.entityid, args.destinationid,
                           args.forceupdate)
 
@@ -48,9 +41,29 @@ def command_createchallenge(syn, args):
     creates, please head to `challenge administration <https://docs.synapse.org/articles/challenge_administration.html>`_.
 
     >>> challengeutils createchallenge "Challenge Name Here"
+
+    With --plan, prints the components that exist and the ones that would
+    be created.  With --apply, creates only the missing components without
+    prompting and records them in --state_file, so reruns after a failure
+    pick up where they left off.
+
+    >>> challengeutils createchallenge "Challenge Name Here" --apply --state_file challenge.json
     """
-    challenge_components = createchallenge.main(syn, args.challengename,
-                                                args.livesiteid)
+    from . import createchallenge
+
+    if args.plan or args.apply:
+        challenge_plan = createchallenge.plan(syn, args.challengename,
+                                              live_site=args.livesiteid,
+                                              state_path=args.state_file)
+        print(createchallenge.format_plan(challenge_plan))
+        if args.plan:
+            return challenge_plan
+        challenge_components = createchallenge.apply(
+            syn, challenge_plan, state_path=args.state_file
+        )
+    else:
+        challenge_components = createchallenge.main(syn, args.challengename,
+                                                    args.livesiteid)
     # component: project or team
     # componentid: project id or teamid
     urls = {}
@@ -78,6 +91,11 @@ def command_query(syn, args):
 
     >>> challengeutils query "select objectId, status from evaluation_12345"
     """
+    import pandas as pd
+    import synapseclient
+
+    from . import utils
+
     querydf = pd.DataFrame(list(utils.evaluation_queue_query(
         syn, args.uri, args.limit, args.offset)))
     if args.render:
@@ -103,6 +121,8 @@ def command_change_status(syn, args):
 
     >>> challengeutils changestatus 1234545 INVALID
     """
+    from . import utils
+
     print(utils.change_submission_status(syn, args.submissionid, args.status))
 
 
@@ -114,8 +134,62 @@ def command_writeup_attach(syn, args):
 
     >>> challengeutils attachwriteup writeupid submissionqueueid
     """
-    writeup_attacher.attach_writeup(syn, args.writeupqueue,
-                                    args.submissionqueue)
+    from . import writeup_attacher
+
+    summary = writeup_attacher.attach_writeup(syn, args.writeupqueue,
+                                              args.submissionqueue)
+    print(summary.to_string(index=False))
+
+
+def command_invite_members(syn, args):
+    """Invites the users and emails listed in a file to a team, one per
+    line.  Lines with an @ are invited by email.  Users that are already
+    members are skipped.
+
+    >>> challengeutils inviteteam team invitees.txt --report report.csv
+    """
+    import pandas as pd
+
+    from . import utils
+
+    with open(args.inviteefile) as invitee_file:
+        invitees = [line.strip() for line in invitee_file if line.strip()]
+    emails = [invitee for invitee in invitees if "@" in invitee]
+    users = [invitee for invitee in invitees if "@" not in invitee]
+    results = utils.invite_members_to_team(syn, args.team, users=users,
+                                           emails=emails,
+                                           message=args.message,
+                                           max_workers=args.max_workers)
+    reportdf = pd.DataFrame(
+        results, columns=['invitee', 'result', 'invitationid', 'error']
+    )
+    if args.report is not None:
+        reportdf.to_csv(args.report, index=False)
+    print(reportdf['result'].value_counts().to_string())
+
+
+def command_audit_permissions(syn, args):
+    """Writes who has which access to every project, folder, wiki and
+    evaluation queue of a challenge as a CSV with one row per object,
+    principal and access type.  With --previous, also writes the rows that
+    were added or removed since an earlier audit.
+
+    >>> challengeutils auditpermissions syn12345 syn23456 --output audit.csv --previous old_audit.csv
+    """
+    import pandas as pd
+
+    from . import permissions
+
+    auditdf = permissions.audit_permissions(syn, args.projectids,
+                                            max_workers=args.max_workers)
+    auditdf.to_csv(args.output, index=False)
+    print("Wrote {} permissions to {}".format(len(auditdf), args.output))
+    if args.previous is not None:
+        previousdf = pd.read_csv(args.previous, dtype=str)
+        diffdf = permissions.diff_permission_audits(previousdf, auditdf)
+        if args.diff_output is not None:
+            diffdf.to_csv(args.diff_output, index=False)
+        print(diffdf.to_csv(index=False))
 
 
 def command_set_entity_acl(syn, args):
@@ -126,6 +200,8 @@ def command_set_entity_acl(syn, args):
 
     >>> challengeutils setentityacl syn123545 user_or_team view
     """
+    from . import permissions
+
     permissions.set_entity_permissions(syn, args.entityid,
                                        principalid=args.principalid,
                                        permission_level=args.permission_level)
@@ -139,6 +215,8 @@ def command_set_evaluation_acl(syn, args):
 
     >>> challengeutils setevaluationacl 12345 user_or_team score
     """
+    from . import permissions
+
     permissions.set_evaluation_permissions(syn, args.evaluationid,
                                            principalid=args.principalid,
                                            permission_level=args.permission_level)  # noqa pylint: disable=line-too-long
@@ -158,6 +236,8 @@ def command_set_evaluation_quota(syn, args):
                                           --sub_limit 3
 
     """
+    from . import evaluation_queue
+
     print(evaluation_queue.set_evaluation_quota(syn, args.evaluationid,
                                                 round_start=args.round_start,
                                                 round_end=args.round_end,
@@ -167,12 +247,15 @@ def command_set_evaluation_quota(syn, args):
 
 
 def command_dl_cur_lead_sub(syn, args):
+    from . import download_current_lead_submission as dl_cur
+
     dl_cur.download_current_lead_sub(
         syn,
         args.submissionid,
         args.status,
         args.cutoff_annotation,
-        verbose=args.verbose)
+        verbose=args.verbose,
+        cache_dir=args.cache_dir)
 
 
 def command_list_evaluations(syn, args):
@@ -180,10 +263,14 @@ def command_list_evaluations(syn, args):
 
     >>> challengeutils listevaluations projectid
     """
+    from . import utils
+
     utils.list_evaluations(syn, args.projectid)
 
 
 def command_download_submission(syn, args):
+    from . import utils
+
     submission_dict = utils.download_submission(syn, args.submissionid,
                                                 download_location=args.download_location) # noqa pylint: disable=line-too-long
     if args.output:
@@ -205,6 +292,14 @@ def command_annotate_submission_with_json(syn, args):
 
     >>> challengeutils annotatesubmission 12345 annotations.json --to_public
     """
+    try:
+        from synapseclient.core.retry import with_retry
+    except ModuleNotFoundError:
+        # For synapseclient < v2.0
+        from synapseclient.retry import _with_retry as with_retry
+
+    from . import utils
+
     # By default is_private is True, so the cli is to_public as False
     # Which would be that is_private is True.
     is_private = not args.to_public
@@ -235,9 +330,40 @@ def command_kill_docker_over_quota(syn, args):
     that have been running for longer than the alloted time.
 
     >>> challengeutils killdockeroverquota evaluationid quota
+
+    With --interval, keeps checking the queue every interval seconds
+    with the same login.
+    """
+    from . import helpers
+
+    while True:
+        try:
+            killed = helpers.kill_docker_submission_over_quota(
+                syn, args.evaluationid, quota=args.quota
+            )
+        except Exception:
+            if args.interval is None:
+                raise
+            # One failed check shouldn't end the watch
+            logger.exception("Error checking submissions over quota")
+            killed = []
+        if killed:
+            print("Submissions over quota: {}".format(", ".join(killed)))
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+def command_server(syn, args):
+    """Runs a local server that keeps one logged in Synapse session and
+    runs the commands sent to its Unix socket.  Set CHALLENGEUTILS_SERVER
+    to the socket and challengeutils commands are run by the server, which
+    skips the startup and login of every call.
+
+    >>> challengeutils server --socket /tmp/challengeutils.sock
+    >>> CHALLENGEUTILS_SERVER=/tmp/challengeutils.sock challengeutils annotatesubmission 12345 annotations.json
     """
-    helpers.kill_docker_submission_over_quota(syn, args.evaluationid,
-                                              quota=args.quota)
+    server.serve(syn, args.socket, synapse_config=args.synapse_config)
 
 
 def build_parser():
@@ -247,7 +373,7 @@ def build_parser():
 
     parser.add_argument(
         "-c", "--synapse_config",
-        default=synapseclient.client.CONFIG_FILE,
+        default=CONFIG_FILE,
         help="credentials file")
 
     parser.add_argument('-v', '--version', action='version',
@@ -268,6 +394,21 @@ def build_parser():
         "--livesiteid",
         help=("Option to specify the live site synapse Id"
               " there is already a live site"))
+    plan_group = parser_createChallenge.add_mutually_exclusive_group()
+    plan_group.add_argument(
+        "--plan",
+        action='store_true',
+        help="Only show which challenge components exist and which would "
+             "be created")
+    plan_group.add_argument(
+        "--apply",
+        action='store_true',
+        help="Create only the missing challenge components, without "
+             "prompting")
+    parser_createChallenge.add_argument(
+        "--state_file",
+        help="File that records the challenge components for --plan "
+             "and --apply")
     parser_createChallenge.set_defaults(func=command_createchallenge)
 
     parser_mirrorWiki = subparsers.add_parser(
@@ -350,6 +491,32 @@ def build_parser():
         help='Challenge submission queue evaluation id')
     parser_attach_writeup.set_defaults(func=command_writeup_attach)
 
+    parser_audit = subparsers.add_parser(
+        'auditpermissions',
+        help='Audit the permissions of the projects, folders, wikis and '
+             'evaluation queues of a challenge')
+    parser_audit.add_argument(
+        "projectids",
+        nargs="+",
+        help='Synapse ids of the challenge projects')
+    parser_audit.add_argument(
+        "--output",
+        default="permission_audit.csv",
+        help='CSV file to write the audit to. '
+             'Default is permission_audit.csv')
+    parser_audit.add_argument(
+        "--previous",
+        help='Earlier audit CSV to compare against')
+    parser_audit.add_argument(
+        "--diff_output",
+        help='CSV file to write the changes since --previous to')
+    parser_audit.add_argument(
+        "--max_workers",
+        type=int,
+        default=8,
+        help='Number of requests run at the same time. Default is 8.')
+    parser_audit.set_defaults(func=command_audit_permissions)
+
     parser_set_entity_acl = subparsers.add_parser(
         'setentityacl',
         help='Sets the permissions of a Synapse Entity')
@@ -414,6 +581,12 @@ def build_parser():
         "-v", "--verbose",
         action='store_false')
 
+    parser_dl_cur_lead_sub.add_argument(
+        "--cache_dir",
+        help="Directory to keep an index of lead submissions and their "
+             "files in between calls, so lead files are only downloaded "
+             "when they change")
+
     parser_dl_cur_lead_sub.set_defaults(func=command_dl_cur_lead_sub)
 
     parser_list_evals = subparsers.add_parser(
@@ -498,6 +671,32 @@ def build_parser():
 
     parser_send_email.set_defaults(func=command_send_email)
 
+    parser_invite = subparsers.add_parser(
+        'inviteteam',
+        help='Invite the users and emails in a file to a team')
+    parser_invite.add_argument(
+        "team",
+        type=str,
+        help='Synapse team id or name')
+    parser_invite.add_argument(
+        "inviteefile",
+        type=str,
+        help='File with one Synapse username, user id or email per line')
+    parser_invite.add_argument(
+        "--message",
+        type=str,
+        help='Message for people getting invited to the team')
+    parser_invite.add_argument(
+        "--report",
+        type=str,
+        help='CSV file to write the result of each invitation to')
+    parser_invite.add_argument(
+        "--max_workers",
+        type=int,
+        default=8,
+        help='Number of invitations sent at the same time. Default is 8.')
+    parser_invite.set_defaults(func=command_invite_members)
+
     parser_kill_docker = subparsers.add_parser(
         'killdockeroverquota',
         help='Kill Docker submissions over the quota')
@@ -511,6 +710,11 @@ def build_parser():
         "quota",
         type=int,
         help="Time quota submission has to run in milliseconds")
+
+    parser_kill_docker.add_argument(
+        "--interval",
+        type=int,
+        help="Keep checking the queue every interval seconds")
     parser_kill_docker.set_defaults(func=command_kill_docker_over_quota)
 
     parser_set_quota = subparsers.add_parser(
@@ -554,6 +758,18 @@ def build_parser():
 
     parser_set_quota.set_defaults(func=command_set_evaluation_quota)
 
+    parser_server = subparsers.add_parser(
+        'server',
+        help='Run commands sent to a Unix socket with one Synapse login')
+
+    parser_server.add_argument(
+        "--socket",
+        default=os.environ.get(server.SERVER_ENV, server.DEFAULT_SOCKET),
+        help="Path of the Unix socket. Default is $CHALLENGEUTILS_SERVER "
+             "or ~/.challengeutils/server.sock")
+
+    parser_server.set_defaults(func=command_server)
+
     return parser
 
 
@@ -566,15 +782,28 @@ def perform_main(syn, args):
 
 
 def synapse_login(synapse_config):
-    try:
-        syn = synapseclient.login(silent=True)
-    except Exception:
-        syn = synapseclient.Synapse(configPath=synapse_config)
-        syn.login(silent=True)
-    return(syn)
+    """Logs into Synapse, reusing the login of an earlier call with the
+    same config until it expires.  See challengeutils.session."""
+    from . import session
+
+    def login():
+        import synapseclient
+
+        try:
+            syn = synapseclient.login(silent=True)
+        except Exception:
+            syn = synapseclient.Synapse(configPath=synapse_config)
+            syn.login(silent=True)
+        return syn
+
+    return session.cached_login(synapse_config, login)
 
 
 def main():
+    # Forward the command to a running server if CHALLENGEUTILS_SERVER is set
+    exit_code = server.forward(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
     args = build_parser().parse_args()
     syn = synapse_login(args.synapse_config)
     perform_main(syn, args)
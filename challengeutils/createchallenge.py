@@ -16,8 +16,15 @@ Example (run on bash)
 TODO Add participants
 TODO Add tests
 """
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import json
 import logging
+import os
+import re
 import sys
+import tempfile
+import time
 
 import synapseclient
 try:
@@ -58,6 +65,14 @@ LIVE_PAGE_MARKDOWN = (
 )
 
 
+# Placeholders in the template wiki, replaced in a single pass
+WIKI_PLACEHOLDERS = re.compile("|".join(
+    re.escape(placeholder)
+    for placeholder in ['challengeId=0', '{teamId}', 'teamId=0', '#!Map:0',
+                        '{challengeName}', 'projectId=syn0']
+))
+
+
 def create_project(syn, project_name):
     """Creates Synapse Project
 
@@ -76,6 +91,61 @@ def create_project(syn, project_name):
     return project
 
 
+def _get_existing_team(syn, team_name):
+    """Looks up a Synapse Team by name
+
+    Args:
+        syn: Synpase object
+        team_name: Name of team
+
+    Returns:
+        Synapse Team or None if the team doesn't exist
+    """
+    try:
+        # raises a ValueError if a team does not exist
+        return syn.getTeam(team_name)
+    except ValueError:
+        return None
+
+
+def _confirm_existing_team(team):
+    """Asks whether an existing team should be used for the challenge and
+    exits if it shouldn't
+
+    Args:
+        team: Synapse Team
+    """
+    logger.info('The team {} already exists.'.format(team['name']))
+    logger.info(team)
+    # If you press enter, this will default to 'y'
+    user_input = input('Do you want to use this team? (Y/n) ') or 'y'
+    if user_input.lower() not in ('y', 'yes'):
+        logger.info('Please specify a new challenge name. Exiting.')
+        sys.exit(1)
+
+
+def _store_team(syn, team_name, desc, can_public_join=False):
+    """Stores a new Synapse Team
+
+    Args:
+        syn: Synpase object
+        team_name: Name of team
+        desc: Description of team
+        can_public_join: true for teams which members can join without
+                         an invitation or approval. Default to False
+
+    Returns:
+        Synapse Team
+    """
+    team = synapseclient.Team(name=team_name,
+                              description=desc,
+                              canPublicJoin=can_public_join)
+    # raises a ValueError if a team with this name already exists
+    team = syn.store(team)
+    logger.info('Created Team {} ({})'.format(team.name, team.id))
+    return team
+
+
 def create_team(syn, team_name, desc, can_public_join=False):
     """Creates Synapse Team
 
@@ -89,23 +159,12 @@ def create_team(syn, team_name, desc, can_public_join=False):
     Returns:
         Synapse Team id
     """
-    try:
-        # raises a ValueError if a team does not exist
-        team = syn.getTeam(team_name)
-        logger.info('The team {} already exists.'.format(team_name))
-        logger.info(team)
-        # If you press enter, this will default to 'y'
-        user_input = input('Do you want to use this team? (Y/n) ') or 'y'
-        if user_input.lower() not in ('y', 'yes'):
-            logger.info('Please specify a new challenge name. Exiting.')
-            sys.exit(1)
-    except ValueError:
-        team = synapseclient.Team(name=team_name,
-                                  description=desc,
-                                  canPublicJoin=can_public_join)
-        # raises a ValueError if a team with this name already exists
-        team = syn.store(team)
-        logger.info('Created Team {} ({})'.format(team.name, team.id))
+    team = _get_existing_team(syn, team_name)
+    if team is not None:
+        _confirm_existing_team(team)
+    else:
+        team = _store_team(syn, team_name, desc,
+                           can_public_join=can_public_join)
     return team
 
 
@@ -176,22 +235,42 @@ def _update_wikipage_string(wikipage_string, challengeid, teamid,
     Returns:
         fixed wiki page string
     """
-    wikipage_string = wikipage_string.replace('challengeId=0',
-                                              'challengeId=%s' % challengeid)
-    wikipage_string = wikipage_string.replace('{teamId}', teamid)
-    wikipage_string = wikipage_string.replace('teamId=0',
-                                              'teamId=%s' % teamid)
-    wikipage_string = wikipage_string.replace('#!Map:0', '#!Map:%s' % teamid)
-    wikipage_string = wikipage_string.replace('{challengeName}',
-                                              challenge_name)
-    wikipage_string = wikipage_string.replace('projectId=syn0',
-                                              'projectId=%s' % synid)
-    return wikipage_string
+    replacements = {'challengeId=0': 'challengeId=%s' % challengeid,
+                    '{teamId}': teamid,
+                    'teamId=0': 'teamId=%s' % teamid,
+                    '#!Map:0': '#!Map:%s' % teamid,
+                    '{challengeName}': challenge_name,
+                    'projectId=syn0': 'projectId=%s' % synid}
+    return WIKI_PLACEHOLDERS.sub(lambda match: replacements[match.group(0)],
+                                 wikipage_string)
+
+
+def _team_specs(challenge_name):
+    """Teams needed for a challenge: participant, admin, organizer, and
+    preregistration team
+
+    Args:
+        challenge_name: Name of the challenge
+
+    Returns:
+        list: [(team map key, team name, description, can public join)]
+    """
+    # The organizer team is used to gate permissions
+    # The motivation is that not everyone needs admin access to the projects
+    return [('team_part_id', challenge_name + ' Participants',
+             'Challenge Particpant Team', True),
+            ('team_admin_id', challenge_name + ' Admin',
+             'Challenge Admin Team', False),
+            ('team_org_id', challenge_name + ' Organizers',
+             'Challenge Organizing Team', False),
+            ('team_prereg_id', challenge_name + ' Preregistrants',
+             'Challenge Pre-registration Team', True)]
 
 
 def _create_teams(syn, challenge_name):
     """Create teams needed for a challenge: participant, admin, organizer, and
-    preregistration team
+    preregistration team.  The teams are looked up and created concurrently,
+    existing teams are confirmed one at a time.
 
     Args:
         syn: Synapse connection
@@ -200,26 +279,25 @@ def _create_teams(syn, challenge_name):
     Returns:
         dict of challenge team ids
     """
-    team_part = challenge_name + ' Participants'
-    team_admin = challenge_name + ' Admin'
-    team_prereg = challenge_name + ' Preregistrants'
-    # The organizer team is used to gate permissions
-    # The motivation is that not everyone needs admin access to the projects
-    team_org = challenge_name + ' Organizers'
-    team_part_ent = create_team(syn, team_part, 'Challenge Particpant Team',
-                                can_public_join=True)
-    team_admin_ent = create_team(syn, team_admin, 'Challenge Admin Team',
-                                 can_public_join=False)
-    team_org_ent = create_team(syn, team_org, 'Challenge Organizing Team',
-                               can_public_join=False)
-    team_prereg_ent = create_team(syn, team_prereg,
-                                  'Challenge Pre-registration Team',
-                                  can_public_join=True)
-
-    team_map = {'team_part_id': team_part_ent['id'],
-                'team_admin_id': team_admin_ent['id'],
-                'team_prereg_id': team_prereg_ent['id'],
-                'team_org_id': team_org_ent['id']}
+    specs = _team_specs(challenge_name)
+    with ThreadPoolExecutor(max_workers=len(specs)) as executor:
+        existing = list(executor.map(
+            lambda spec: _get_existing_team(syn, spec[1]), specs
+        ))
+    for team in existing:
+        if team is not None:
+            _confirm_existing_team(team)
+
+    with ThreadPoolExecutor(max_workers=len(specs)) as executor:
+        teams = [executor.submit(_store_team, syn, name, desc,
+                                 can_public_join=can_public_join)
+                 if team is None else None
+                 for team, (_, name, desc, can_public_join)
+                 in zip(existing, specs)]
+        teams = [team if future is None else future.result()
+                 for team, future in zip(existing, teams)]
+
+    team_map = {spec[0]: team['id'] for spec, team in zip(specs, teams)}
     return team_map
 
 
@@ -250,11 +328,105 @@ def check_existing_and_delete_wiki(syn, synid):
             syn.delete(wiki)
 
 
+def _rewrite_staging_wiki(syn, project_staging, pages, challengeid, teamid,
+                          challenge_name, live_projectid, max_workers=8):
+    """Fills in the challenge's ids and name in the copied template wiki.
+    The pages are fetched and stored concurrently and pages without any
+    placeholders are not stored again.
+
+    Args:
+        syn: Synapse connection
+        project_staging: Staging site Synapse Project or id
+        pages: Wiki headers of the pages to rewrite
+        challengeid: Challenge id
+        teamid: Synapse id of participant team
+        challenge_name: Name of the challenge
+        live_projectid: Synapse id of live site
+        max_workers: Number of pages fetched or stored at the same time
+
+    Returns:
+        list: Stored wiki pages
+    """
+    def rewrite(page):
+        wikipage = syn.getWiki(project_staging, page['id'])
+        markdown = _update_wikipage_string(wikipage.markdown, challengeid,
+                                           teamid, challenge_name,
+                                           live_projectid)
+        if markdown == wikipage.markdown:
+            return None
+        wikipage.markdown = markdown
+        return syn.store(wikipage)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        stored = [wikipage for wikipage in executor.map(rewrite, pages)
+                  if wikipage is not None]
+    logger.info('Updated {} of {} wiki pages'.format(len(stored),
+                                                     len(pages)))
+    return stored
+
+
+@contextmanager
+def _stage(name, timings):
+    """Times a stage of the challenge creation
+
+    Args:
+        name: Name of the stage
+        timings: dict the stage's duration in seconds is added to
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+        logger.info('Stage {} took {:.2f}s'.format(name, timings[name]))
+
+
+def _set_project_permissions(syn, project, teams, organizer_level):
+    """Gives the admin team admin access and the organizer team
+    organizer_level access to a challenge project, with a single ACL update
+
+    Args:
+        syn: Synapse connection
+        project: Synapse Project
+        teams: dict of challenge team ids
+        organizer_level: Permission level of the organizer team
+    """
+    permissions.set_bulk_permissions(
+        syn, [(project, teams['team_admin_id'], "admin"),
+              (project, teams['team_org_id'], organizer_level)]
+    )
+
+
+def _create_challenge_and_queue(syn, challenge_name, project_live, teams):
+    """Activates the challenge on the live site and creates its
+    project submission queue
+
+    Args:
+        syn: Synapse connection
+        challenge_name: Name of the challenge
+        project_live: Live site Synapse Project
+        teams: dict of challenge team ids
+
+    Returns:
+        Challenge
+    """
+    challenge = create_challenge_widget(syn, project_live,
+                                        teams['team_part_id'])
+    create_evaluation_queue(syn, '%s Project Submission' % challenge_name,
+                            'Project Submission',
+                            project_live.id)
+    return challenge
+
+
 def main(syn, challenge_name, live_site=None):
     """Creates two project entity for challenge sites.
     1) live (public) and 2) staging (private until launch)
     Allow for users to set up the live site themselves
 
+    Components that don't depend on each other are created concurrently,
+    in stages: the teams, then both projects, then the challenge,
+    permissions and wikis.  The time taken by each stage is logged.
+
     Args:
         syn: Synapse object
         challenge_name: Name of the challenge
@@ -270,52 +442,379 @@ def main(syn, challenge_name, live_site=None):
                "preregistrantrant_teamid": teams['team_prereg_id']}
 
     """
+    timings = {}
+    start = time.perf_counter()
     # Create teams for challenge sites
-    teams = _create_teams(syn, challenge_name)
+    with _stage("teams", timings):
+        teams = _create_teams(syn, challenge_name)
+
+    # Create live and staging Projects
+    with _stage("projects", timings):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            if live_site is None:
+                live_future = executor.submit(create_project, syn,
+                                              challenge_name)
+            else:
+                live_future = executor.submit(syn.get, live_site)
+            staging_future = executor.submit(create_project, syn,
+                                             challenge_name + ' - staging')
+            project_live = live_future.result()
+            project_staging = staging_future.result()
+        # Checks if staging wiki exists, if so delete
+        check_existing_and_delete_wiki(syn, project_staging.id)
+
+    with _stage("challenge, permissions and wikis", timings):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = []
+            if live_site is None:
+                futures.append(executor.submit(
+                    _set_project_permissions, syn, project_live, teams,
+                    "download"
+                ))
+                futures.append(executor.submit(
+                    _create_live_wiki, syn, project_live,
+                    teams['team_prereg_id']
+                ))
+            futures.append(executor.submit(
+                _set_project_permissions, syn, project_staging, teams, "edit"
+            ))
+            challenge_future = executor.submit(
+                _create_challenge_and_queue, syn, challenge_name,
+                project_live, teams
+            )
+            logger.info('Copying wiki template to {}'.format(
+                project_staging.name
+            ))
+            wiki_future = executor.submit(synapseutils.copyWiki, syn,
+                                          DREAM_CHALLENGE_TEMPLATE_SYNID,
+                                          project_staging.id)
+            for future in futures:
+                future.result()
+            challenge = challenge_future.result()
+            new_wikiids = wiki_future.result()
+
+    with _stage("wiki rewrite", timings):
+        _rewrite_staging_wiki(syn, project_staging, new_wikiids,
+                              challenge.id, teams['team_part_id'],
+                              challenge_name, project_live.id)
+    logger.info('Challenge setup took {:.2f}s'.format(
+        time.perf_counter() - start
+    ))
+    return {"live_projectid": project_live.id,
+            "staging_projectid": project_staging.id,
+            "admin_teamid": teams['team_admin_id'],
+            "organizer_teamid": teams['team_org_id'],
+            "participant_teamid": teams['team_part_id'],
+            "preregistrantrant_teamid": teams['team_prereg_id']}
+
+
+def _load_state(state_path):
+    """Reads a challenge state file
+
+    Args:
+        state_path: Path to the state file or None
+
+    Returns:
+        dict: Saved state, empty if there is no state file
+    """
+    if state_path is None or not os.path.exists(state_path):
+        return {}
+    with open(state_path) as state_file:
+        return json.load(state_file)
+
+
+def _save_state(state_path, state):
+    """Writes a challenge state file, replacing it atomically
+
+    Args:
+        state_path: Path to the state file or None
+        state: State to save
+    """
+    if state_path is None:
+        return
+    # A unique temporary file, so parallel saves can't interleave
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(state_path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as state_file:
+            json.dump(state, state_file, indent=2, sort_keys=True)
+        os.replace(tmp_path, state_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _collect_results(futures, record):
+    """Waits for all futures, records the results of the ones that
+    succeeded and then raises the first error
+
+    Args:
+        futures: {key: future}
+        record: Function called with the key and result of each future
+                that succeeded
+    """
+    error = None
+    for key, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as err:
+            if error is None:
+                error = err
+            continue
+        record(key, result)
+    if error is not None:
+        raise error
+
+
+def _lookup(func, *args, **kwargs):
+    """Calls a Synapse lookup, returning None if the object doesn't exist"""
+    try:
+        return func(*args, **kwargs)
+    except (ValueError, SynapseHTTPError):
+        return None
+
+
+def _id_or_none(obj):
+    return None if obj is None else obj['id']
+
+
+def plan(syn, challenge_name, live_site=None, state_path=None):
+    """Reads the current state of every challenge component and works out
+    which ones still have to be created.  Components are looked up
+    concurrently, by the ids in the state file when there is one.
 
-    # Create live Project
+    Args:
+        syn: Synapse object
+        challenge_name: Name of the challenge
+        live_site: If there is already a live site, specify live site Synapse
+                   id. (Default is None)
+        state_path: Path to the state file of earlier runs. (Default is None)
+
+    Returns:
+        dict: {'challenge_name', 'live_site',
+               'components': {component: id, True or None},
+               'missing': [component, ...]}
+    """
+    state = _load_state(state_path)
+    components = state.get('components', {})
+    specs = _team_specs(challenge_name)
+    queue_name = '%s Project Submission' % challenge_name
+    found = {}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {}
+        for key, name, _, _ in specs:
+            futures[key] = executor.submit(
+                _lookup, syn.getTeam, components.get(key) or name
+            )
+        for key, name in [('live_projectid', challenge_name),
+                          ('staging_projectid',
+                           challenge_name + ' - staging')]:
+            if key == 'live_projectid' and live_site is not None:
+                found[key] = live_site
+            elif components.get(key) is not None:
+                futures[key] = executor.submit(
+                    _lookup, syn.get, components[key], downloadFile=False
+                )
+            else:
+                futures[key] = executor.submit(_lookup, syn.findEntityId,
+                                               name)
+        futures['queueid'] = executor.submit(_lookup,
+                                             syn.getEvaluationByName,
+                                             queue_name)
+        for key, future in futures.items():
+            result = future.result()
+            found[key] = result if isinstance(result, (str, type(None))) \
+                else _id_or_none(result)
+
+        # These need the project ids
+        futures = {}
+        live_id = found['live_projectid']
+        staging_id = found['staging_projectid']
+        if live_id is not None:
+            futures['challengeid'] = executor.submit(
+                _lookup, utils.get_challenge, syn, live_id
+            )
+            if live_site is None:
+                futures['live_wiki'] = executor.submit(_lookup, syn.getWiki,
+                                                       live_id)
+        if staging_id is not None:
+            futures['staging_wiki'] = executor.submit(
+                _lookup, syn.getWikiHeaders, staging_id
+            )
+        for key, future in futures.items():
+            result = future.result()
+            if key == 'staging_wiki':
+                found[key] = True if result else None
+            elif key == 'live_wiki':
+                found[key] = None if result is None else True
+            else:
+                found[key] = _id_or_none(result)
+    found.setdefault('challengeid', None)
+    found.setdefault('staging_wiki', None)
+
+    # Permissions and the wiki rewrite are only known from the state file,
+    # which records the project they were applied to
+    done = [('staging_permissions', staging_id),
+            ('staging_wiki_rewritten', staging_id)]
     if live_site is None:
-        project_live = create_project(syn, challenge_name)
-        permissions.set_entity_permissions(syn, project_live,
-                                           teams['team_admin_id'],
-                                           permission_level="admin")
-        permissions.set_entity_permissions(syn, project_live,
-                                           teams['team_org_id'],
-                                           permission_level="download")
-        _create_live_wiki(syn, project_live, teams['team_prereg_id'])
-    else:
-        project_live = syn.get(live_site)
+        found.setdefault('live_wiki', None)
+        done.append(('live_permissions', live_id))
+    for key, projectid in done:
+        applied = components.get(key)
+        found[key] = applied if applied is not None and \
+            applied == projectid else None
 
-    challenge = create_challenge_widget(syn, project_live,
-                                        teams['team_part_id'])
-    create_evaluation_queue(syn, '%s Project Submission' % challenge_name,
-                            'Project Submission',
-                            project_live.id)
+    missing = [key for key, value in found.items() if value is None]
+    return {'challenge_name': challenge_name,
+            'live_site': live_site,
+            'components': found,
+            'missing': sorted(missing)}
 
-    # Create staging Project
-    project_staging = create_project(syn, challenge_name + ' - staging')
-    permissions.set_entity_permissions(syn, project_staging,
-                                       teams['team_admin_id'],
-                                       permission_level="admin")
-    permissions.set_entity_permissions(syn, project_staging,
-                                       teams['team_org_id'],
-                                       permission_level="edit")
-    # Checks if staging wiki exists, if so delete
-    check_existing_and_delete_wiki(syn, project_staging.id)
-
-    logger.info('Copying wiki template to {}'.format(project_staging.name))
-    new_wikiids = synapseutils.copyWiki(syn, DREAM_CHALLENGE_TEMPLATE_SYNID,
-                                        project_staging.id)
-    for page in new_wikiids:
-        wikipage = syn.getWiki(project_staging, page['id'])
-        wikipage.markdown = _update_wikipage_string(wikipage.markdown,
-                                                    challenge.id,
-                                                    teams['team_part_id'],
-                                                    challenge_name,
-                                                    project_live.id)
-        syn.store(wikipage)
-    return {"live_projectid": project_live.id,
-            "staging_projectid": project_staging.id,
+
+def format_plan(challenge_plan):
+    """Describes a plan, one component per line
+
+    Args:
+        challenge_plan: Plan from plan()
+
+    Returns:
+        str: Description of the plan
+    """
+    lines = []
+    for key, value in sorted(challenge_plan['components'].items()):
+        if value is None:
+            lines.append("+ create {}".format(key))
+        else:
+            lines.append("= keep {} ({})".format(key, value))
+    return "\n".join(lines)
+
+
+def apply(syn, challenge_plan, state_path=None):
+    """Creates the missing components of a plan without prompting.  The
+    state file is saved after every stage, so a failed run can be
+    planned and applied again.
+
+    Args:
+        syn: Synapse object
+        challenge_plan: Plan from plan()
+        state_path: Path to save the state file to. (Default is None)
+
+    Returns:
+        dict: {"live_projectid": projectid,
+               "staging_projectid": projectid,
+               "admin_teamid": teams['team_admin_id'],
+               "organizer_teamid": teams['team_org_id'],
+               "participant_teamid": teams['team_part_id'],
+               "preregistrantrant_teamid": teams['team_prereg_id']}
+    """
+    challenge_name = challenge_plan['challenge_name']
+    components = dict(challenge_plan['components'])
+    timings = {}
+
+    def save():
+        _save_state(state_path, {'challenge_name': challenge_name,
+                                 'components': components})
+
+    def missing(key):
+        return key in components and components[key] is None
+
+    with _stage("teams", timings):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {
+                key: executor.submit(_store_team, syn, name, desc,
+                                     can_public_join=can_public_join)
+                for key, name, desc, can_public_join
+                in _team_specs(challenge_name) if missing(key)
+            }
+            try:
+                _collect_results(
+                    futures,
+                    lambda key, team: components.update({key: team['id']})
+                )
+            finally:
+                save()
+
+    with _stage("projects", timings):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {
+                key: executor.submit(create_project, syn, name)
+                for key, name in [('live_projectid', challenge_name),
+                                  ('staging_projectid',
+                                   challenge_name + ' - staging')]
+                if missing(key)
+            }
+            try:
+                _collect_results(
+                    futures,
+                    lambda key, project: components.update({key: project.id})
+                )
+            finally:
+                save()
+
+    live_id = components['live_projectid']
+    staging_id = components['staging_projectid']
+    teams = {key: components[key] for key, _, _, _
+             in _team_specs(challenge_name)}
+    with _stage("challenge, permissions and wikis", timings):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {}
+            if missing('live_permissions'):
+                futures['live_permissions'] = executor.submit(
+                    _set_project_permissions, syn, live_id, teams,
+                    "download"
+                )
+            if missing('staging_permissions'):
+                futures['staging_permissions'] = executor.submit(
+                    _set_project_permissions, syn, staging_id, teams, "edit"
+                )
+            if missing('live_wiki'):
+                futures['live_wiki'] = executor.submit(
+                    _create_live_wiki, syn, live_id, teams['team_prereg_id']
+                )
+            if missing('challengeid'):
+                futures['challengeid'] = executor.submit(
+                    create_challenge_widget, syn, live_id,
+                    teams['team_part_id']
+                )
+            if missing('queueid'):
+                futures['queueid'] = executor.submit(
+                    create_evaluation_queue, syn,
+                    '%s Project Submission' % challenge_name,
+                    'Project Submission', live_id
+                )
+            if missing('staging_wiki'):
+                futures['staging_wiki'] = executor.submit(
+                    synapseutils.copyWiki, syn,
+                    DREAM_CHALLENGE_TEMPLATE_SYNID, staging_id
+                )
+
+            def record(key, result):
+                if key in ('challengeid', 'queueid'):
+                    components[key] = result.id
+                elif key.endswith('permissions'):
+                    components[key] = live_id if key.startswith('live') \
+                        else staging_id
+                else:
+                    components[key] = True
+
+            # Components that were created are saved even if others failed
+            try:
+                _collect_results(futures, record)
+            finally:
+                save()
+
+    if missing('staging_wiki_rewritten'):
+        with _stage("wiki rewrite", timings):
+            _rewrite_staging_wiki(syn, staging_id,
+                                  syn.getWikiHeaders(staging_id),
+                                  components['challengeid'],
+                                  teams['team_part_id'], challenge_name,
+                                  live_id)
+            components['staging_wiki_rewritten'] = staging_id
+            save()
+    return {"live_projectid": live_id,
+            "staging_projectid": staging_id,
             "admin_teamid": teams['team_admin_id'],
             "organizer_teamid": teams['team_org_id'],
             "participant_teamid": teams['team_part_id'],
@@ -11,7 +11,7 @@ except ModuleNotFoundError:
     # For synapseclient < v2.0
     from synapseclient.utils import id_of
 
-from synapseservices.discussion import Forum
+from synapseservices.discussion import Forum, Reply, Thread
 
 QUERY_LIMIT = 1000
 
@@ -48,10 +48,11 @@ class DiscussionApi:
                         Defaults to EXCLUDE_DELETED.
 
         Yields:
-            list: Forum threads
+            Thread: Forum threads
         """
         uri = f'/forum/{forumid}/threads?filter={query_filter}'
-        return self.syn._GET_paginated(uri, limit=limit, offset=offset)
+        return map(Thread.from_dict,
+                   self.syn._GET_paginated(uri, limit=limit, offset=offset))
 
     def post_thread(self, forumid, title, message):
         """Create a new thread in a forum
@@ -82,16 +83,17 @@ class DiscussionApi:
             entityid: Synapse Entity id
 
         Yields:
-            DiscussionThreadBundles
+            Thread: DiscussionThreadBundles
         """
-        return self.syn._GET_paginated(f"/entity/{entityid}/threads",
-                                       limit=limit, offset=offset)
+        return map(Thread.from_dict,
+                   self.syn._GET_paginated(f"/entity/{entityid}/threads",
+                                           limit=limit, offset=offset))
 
     def get_thread(self, threadid):
         """Get a thread and its statistic given its ID
         https://rest-docs.synapse.org/rest/GET/thread/threadId.html
         """
-        return self.syn.restGET(f"/thread/{threadid}")
+        return Thread.from_dict(self.syn.restGET(f"/thread/{threadid}"))
 
     def update_thread_title(self, threadid):
         """Update title of a thread
@@ -152,7 +154,7 @@ class DiscussionApi:
 
     def get_reply(self, replyid):
         """Get a reply"""
-        return self.syn.restGET(f'/reply/{replyid}')
+        return Reply.from_dict(self.syn.restGET(f'/reply/{replyid}'))
 
     def get_thread_replies(self, threadid, query_filter='EXCLUDE_DELETED',
                            limit=20, offset=0):
@@ -165,10 +167,12 @@ class DiscussionApi:
                            Can be NO_FILTER, DELETED_ONLY, EXCLUDE_DELETED.
                            Defaults to EXCLUDE_DELETED.
         Yields:
-            list: Forum threads replies
+            Reply: Forum threads replies
         """
         replies = f'/thread/{threadid}/replies?filter={query_filter}'
-        return self.syn._GET_paginated(replies, limit=limit, offset=offset)
+        return map(Reply.from_dict,
+                   self.syn._GET_paginated(replies, limit=limit,
+                                           offset=offset))
 
     def get_reply_message_url(self, messagekey):
         """message URL of a thread. The message URL is the URL
@@ -318,9 +322,8 @@ def get_forum_participants(syn, ent):
     threads = get_forum_threads(syn, synid)
     users = set()
     for thread in threads:
-        unique_users = set(thread['activeAuthors'])
-        users.update(unique_users)
-    userprofiles = [syn.getUserProfile(user) for user in users]
+        users.update(thread.active_authors or ())
+    userprofiles = [syn.getUserProfile(str(user)) for user in users]
     return userprofiles
 
 
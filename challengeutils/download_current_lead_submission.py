@@ -1,8 +1,13 @@
 """Download the current leading submission for boot ladder boot method"""
+import json
 import os
+import tempfile
 
+from . import filestore
 from . import utils
 
+LEAD_FILENAME = "previous_submission.csv"
+
 
 def get_submitterid_from_submission_id(syn, submissionid, queue,
                                        verbose=False):
@@ -55,15 +60,162 @@ def get_submitters_lead_submission(syn, submitterid, queue,
         objectid = sub_dict['objectId']
         if verbose:
             print("Dowloading submissionid: " + objectid)
-        sub = syn.getSubmission(objectid, downloadLocation=".")
-        os.rename(sub.filePath, "previous_submission.csv")
-        return "previous_submission.csv"
+        sub = filestore.get_submission(syn, objectid, download_location=".")
+        os.rename(sub.filePath, LEAD_FILENAME)
+        return LEAD_FILENAME
     print("Downloading no file")
     return None
 
 
+class LeadSubmissionIndex:
+    """Index of each submitter's lead submission in a queue.  The index is
+    saved as JSON in a cache directory and refreshed with only the
+    submissions modified since the last refresh.  Lead files are kept in
+    a file store in the cache directory, so they are only downloaded when
+    a submitter's lead changes.  Files of submissions that are no longer
+    a lead are removed from that store.  A shared store configured by
+    CHALLENGEUTILS_STORE is used instead if there is one, which keeps to
+    its own size limit.
+
+    Attributes:
+        syn: Synapse connection
+        queue: Evaluation queue id
+        cutoff_annotation: Boolean cutoff annotation key
+        cache_dir: Directory the index and lead files are kept in
+    """
+    def __init__(self, syn, queue, cutoff_annotation, cache_dir):
+        self.syn = syn
+        self.queue = queue
+        self.cutoff_annotation = cutoff_annotation
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(
+            cache_dir, "lead_index_{}_{}.json".format(queue, cutoff_annotation)
+        )
+        self.store = filestore.default_store()
+        # Only the index uses its own store, so it removes old lead files
+        self._owns_store = self.store is None
+        if self._owns_store:
+            self.store = filestore.SubmissionFileStore(
+                os.path.join(cache_dir, "files")
+            )
+        # leads: {submitterid: {'objectId', 'createdOn'}}
+        # files: {objectid: path of the lead file in the store}
+        self.index = {'modifiedOn': 0, 'leads': {}, 'files': {}}
+        if os.path.exists(self.path):
+            with open(self.path) as index_file:
+                self.index = json.load(index_file)
+
+    def _is_lead(self, row):
+        """Submission is scored and met the cutoff"""
+        return (row.get('prediction_file_status') == 'SCORED' and
+                str(row.get(self.cutoff_annotation)).lower() == 'true')
+
+    def _query_lead(self, submitterid):
+        """Query the latest lead submission of one submitter"""
+        query = ("select objectId, createdOn from evaluation_{} "
+                 "where submitterId == '{}' "
+                 "and prediction_file_status == 'SCORED' and {} == 'true' "
+                 "order by createdOn DESC".format(self.queue, submitterid,
+                                                  self.cutoff_annotation))
+        for row in utils.evaluation_queue_query(self.syn, query, limit=1):
+            return {'objectId': row['objectId'],
+                    'createdOn': int(row['createdOn'])}
+        return None
+
+    def refresh(self):
+        """Update the index with the submissions modified since the last
+        refresh and save it"""
+        query = ("select objectId, submitterId, createdOn, modifiedOn, "
+                 "prediction_file_status, {} from evaluation_{} "
+                 "where modifiedOn > {}".format(self.cutoff_annotation,
+                                                self.queue,
+                                                self.index['modifiedOn']))
+        leads = self.index['leads']
+        # Submitters whose lead may no longer meet the cutoff
+        recheck = set()
+        for row in utils.evaluation_queue_query(self.syn, query, limit=100):
+            submitterid = row['submitterId']
+            created_on = int(row['createdOn'])
+            self.index['modifiedOn'] = max(self.index['modifiedOn'],
+                                           int(row['modifiedOn']))
+            lead = leads.get(submitterid)
+            if self._is_lead(row):
+                if lead is None or created_on >= lead['createdOn']:
+                    leads[submitterid] = {'objectId': row['objectId'],
+                                          'createdOn': created_on}
+            elif lead is not None and lead['objectId'] == row['objectId']:
+                recheck.add(submitterid)
+        for submitterid in recheck:
+            lead = self._query_lead(submitterid)
+            if lead is None:
+                leads.pop(submitterid)
+            else:
+                leads[submitterid] = lead
+        self.save()
+
+    def save(self):
+        """Save the index"""
+        # A unique temporary file, so parallel saves can't interleave
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as index_file:
+                json.dump(self.index, index_file)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def lead_submission(self, submitterid):
+        """Lead submission id of a submitter or None"""
+        lead = self.index['leads'].get(str(submitterid))
+        return None if lead is None else lead['objectId']
+
+    def download_lead(self, submitterid, download_path=LEAD_FILENAME,
+                      verbose=False):
+        """Put the submitter's lead file at download_path.  The file is
+        only downloaded if it isn't already in the store.
+
+        Args:
+            submitterid: Submitter id
+            download_path: Where to put the lead file
+            verbose: Boolean value to print
+
+        Returns:
+            download_path or None if the submitter has no lead
+        """
+        objectid = self.lead_submission(submitterid)
+        if objectid is None:
+            print("Downloading no file")
+            return None
+        stored_path = self.index['files'].get(objectid)
+        if stored_path is None or not os.path.exists(stored_path):
+            if verbose:
+                print("Dowloading submissionid: " + objectid)
+            sub = filestore.get_submission(self.syn, objectid,
+                                           store=self.store)
+            stored_path = sub.filePath
+            # Forget files of submissions that are no longer a lead
+            lead_ids = set(lead['objectId']
+                           for lead in self.index['leads'].values())
+            files = self.index['files']
+            self.index['files'] = {leadid: path for leadid, path
+                                   in files.items() if leadid in lead_ids}
+            self.index['files'][objectid] = stored_path
+            self.save()
+            if self._owns_store:
+                kept = set(self.index['files'].values())
+                for path in set(files.values()) - kept:
+                    self.store.remove(path)
+        filestore.link_file(stored_path, download_path)
+        return download_path
+
+
 def download_current_lead_sub(syn, submissionid, status,
-                              cutoff_annotation, verbose=False):
+                              cutoff_annotation, verbose=False,
+                              cache_dir=None):
     """Downloads current leading submission
 
     Args:
@@ -72,6 +224,11 @@ def download_current_lead_sub(syn, submissionid, status,
         status: Submission status
         cutoff_annotation: Boolean cutoff annotation key
         verbose: Boolean value to print
+        cache_dir: Directory to keep an index of lead submissions and
+                   their files in, so repeated calls only query the
+                   submissions that changed and only download a lead file
+                   when it changes. Default is None, which queries and
+                   downloads on every call.
 
     Returns:
         Path to current leading submission or None
@@ -79,6 +236,13 @@ def download_current_lead_sub(syn, submissionid, status,
     if status == "VALIDATED":
         current_sub = syn.getSubmission(submissionid, downloadFile=False)
         queue_num = current_sub['evaluationId']
+        if cache_dir is not None:
+            # The submitter is a team for team submissions
+            submitterid = current_sub.get('teamId') or current_sub['userId']
+            index = LeadSubmissionIndex(syn, queue_num, cutoff_annotation,
+                                        cache_dir)
+            index.refresh()
+            return index.download_lead(submitterid, verbose=verbose)
         submitterid = get_submitterid_from_submission_id(syn, submissionid,
                                                          queue_num, verbose)
         path = get_submitters_lead_submission(syn, submitterid, queue_num,
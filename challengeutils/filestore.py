@@ -0,0 +1,242 @@
+"""Content-addressed store of submission files.
+
+Submission files are kept in a local directory keyed by their file handle
+id and MD5, so a file is only downloaded once no matter how many tools ask
+for it.  Callers get a hardlink to the stored file or the read-only stored
+file itself.  The least recently used files are removed when the store
+grows past its size limit.
+
+The store is used by every challengeutils download when the
+CHALLENGEUTILS_STORE environment variable is set to a directory.
+CHALLENGEUTILS_STORE_MAX_BYTES limits its size.
+"""
+import json
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+STORE_ENV = "CHALLENGEUTILS_STORE"
+STORE_MAX_BYTES_ENV = "CHALLENGEUTILS_STORE_MAX_BYTES"
+# Stores created from the environment, reused so threads share locks
+_STORES = {}
+
+
+def submission_file_handle(sub):
+    """Get the file handle of a submitted File from the submission's
+    entity bundle, without downloading the file
+
+    Args:
+        sub: Synapse Submission
+
+    Returns:
+        dict: File handle or None if the submission isn't a File
+    """
+    bundle = json.loads(sub.get('entityBundleJSON') or '{}')
+    handleid = bundle.get('entity', {}).get('dataFileHandleId')
+    for file_handle in bundle.get('fileHandles', []):
+        if file_handle.get('id') == handleid:
+            return file_handle
+    return None
+
+
+def link_file(source, destination):
+    """Hardlink a file, or copy it if it is on another filesystem"""
+    if os.path.exists(destination):
+        os.unlink(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class SubmissionFileStore:
+    """Local store of submission files keyed by file handle id and MD5.
+    Threads sharing a store are synchronized, but there is no locking
+    between processes: processes sharing a directory can download the same
+    file twice, and one process can evict a file another process is about
+    to link.
+
+    Attributes:
+        root: Directory of the store
+        max_bytes: Size limit of the store in bytes. Default is None,
+                   which doesn't remove any files.
+    """
+    def __init__(self, root, max_bytes=None):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def _key_lock(self, key):
+        """Only download each file once, even from many threads"""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def path_of(self, file_handle):
+        """Path a file is stored at
+
+        Args:
+            file_handle: Synapse file handle
+
+        Returns:
+            str: Path in the store
+        """
+        key = "{}-{}".format(file_handle['id'], file_handle.get('contentMd5'))
+        return os.path.join(self.root, key, file_handle['fileName'])
+
+    def get_submission(self, syn, submission, download_location=None):
+        """Get a submission with its file from the store, downloading
+        the file into the store if it isn't there yet.
+
+        Args:
+            syn: Synapse object
+            submission: Submission or submission id
+            download_location: Directory to hardlink the file into.
+                               Default is None, which returns the read-only
+                               path in the store.
+
+        Returns:
+            Submission with filePath set
+        """
+        sub = syn.getSubmission(submission, downloadFile=False)
+        file_handle = submission_file_handle(sub)
+        if file_handle is None:
+            # Docker repositories and projects have no file to store
+            return sub
+
+        stored_path = self.path_of(file_handle)
+        if download_location is not None:
+            filepath = os.path.join(download_location,
+                                    file_handle['fileName'])
+        else:
+            filepath = stored_path
+        with self._key_lock(stored_path):
+            while True:
+                # evict holds the store lock, so the file can't be removed
+                # between marking it as recently used and linking it
+                with self._lock:
+                    if os.path.exists(stored_path):
+                        os.utime(stored_path)
+                        if filepath != stored_path:
+                            link_file(stored_path, filepath)
+                        break
+                self._download(syn, sub, stored_path)
+
+        sub.filePath = filepath
+        if sub.get('entity') is not None:
+            sub.entity['path'] = filepath
+        self.evict(keep=stored_path)
+        return sub
+
+    def _download(self, syn, sub, stored_path):
+        """Download a submission file into the store"""
+        tmpdir = tempfile.mkdtemp(dir=self.root, prefix=".download-")
+        try:
+            downloaded = syn.getSubmission(sub.id, downloadLocation=tmpdir)
+            os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+            os.replace(downloaded.filePath, stored_path)
+            os.chmod(stored_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        logger.info("Stored submission {} file {}".format(sub.id,
+                                                          stored_path))
+
+    def _stored_files(self):
+        """[(last used time, size, path), ...] of the stored files"""
+        stored = []
+        for key in os.listdir(self.root):
+            keydir = os.path.join(self.root, key)
+            if key.startswith(".") or not os.path.isdir(keydir):
+                continue
+            for filename in os.listdir(keydir):
+                filepath = os.path.join(keydir, filename)
+                info = os.stat(filepath)
+                stored.append((info.st_mtime, info.st_size, filepath))
+        return stored
+
+    def remove(self, filepath):
+        """Remove a stored file.  Hardlinks handed out keep their content.
+
+        Args:
+            filepath: Path in the store. Paths outside of the store are
+                      left alone.
+        """
+        filepath = os.path.abspath(filepath)
+        if os.path.dirname(os.path.dirname(filepath)) != self.root:
+            return
+        with self._lock:
+            if os.path.exists(filepath):
+                os.unlink(filepath)
+                os.rmdir(os.path.dirname(filepath))
+
+    def evict(self, keep=None):
+        """Remove the least recently used files until the store is
+        within its size limit.  Hardlinks handed out keep their content.
+
+        Args:
+            keep: Path in the store that must not be removed
+
+        Returns:
+            list: Paths of the removed files
+        """
+        if self.max_bytes is None:
+            return []
+        removed = []
+        with self._lock:
+            stored = sorted(self._stored_files())
+            total = sum(size for _, size, _ in stored)
+            for _, size, filepath in stored:
+                if total <= self.max_bytes:
+                    break
+                if filepath == keep:
+                    continue
+                os.unlink(filepath)
+                os.rmdir(os.path.dirname(filepath))
+                total -= size
+                removed.append(filepath)
+        return removed
+
+
+def default_store():
+    """Store configured by the CHALLENGEUTILS_STORE environment variable
+
+    Returns:
+        SubmissionFileStore or None if no store is configured
+    """
+    root = os.environ.get(STORE_ENV)
+    if not root:
+        return None
+    max_bytes = os.environ.get(STORE_MAX_BYTES_ENV)
+    max_bytes = int(max_bytes) if max_bytes else None
+    if (root, max_bytes) not in _STORES:
+        _STORES[(root, max_bytes)] = SubmissionFileStore(root,
+                                                         max_bytes=max_bytes)
+    return _STORES[(root, max_bytes)]
+
+
+def get_submission(syn, submission, download_location=None, store=None):
+    """Get a submission and its file through the file store.  Without a
+    store this is the same as syn.getSubmission.
+
+    Args:
+        syn: Synapse object
+        submission: Submission or submission id
+        download_location: Location to download submission
+        store: SubmissionFileStore. Default is the store configured by
+               the CHALLENGEUTILS_STORE environment variable.
+
+    Returns:
+        Submission with filePath set
+    """
+    store = store if store is not None else default_store()
+    if store is None:
+        return syn.getSubmission(submission,
+                                 downloadLocation=download_location)
+    return store.get_submission(syn, submission,
+                                download_location=download_location)
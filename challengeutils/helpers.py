@@ -1,20 +1,63 @@
 '''
 Challenge helper functions
 '''
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import csv
+import logging
 import os
+import shutil
 import sys
+import tempfile
 import time
+
 import synapseclient
+try:
+    from synapseclient.core.exceptions import SynapseHTTPError
+    from synapseclient.core.utils import md5_for_file
+except ModuleNotFoundError:
+    # For synapseclient < v2.0
+    from synapseclient.exceptions import SynapseHTTPError
+    from synapseclient.utils import md5_for_file
 import synapseutils
+from . import filestore
 from . import utils
 
+logger = logging.getLogger(__name__)
+
 WORKFLOW_LAST_UPDATED_KEY = "orgSagebionetworksSynapseWorkflowOrchestratorWorkflowLastUpdated"
 WORKFLOW_START_KEY = "orgSagebionetworksSynapseWorkflowOrchestratorExecutionStarted"
 TIME_REMAINING_KEY = "orgSagebionetworksSynapseWorkflowOrchestratorTimeRemaining"
+MANIFEST_COLUMNS = ['submissionid', 'submitter', 'createdOn', 'filepath',
+                    'md5']
+
+
+def _read_manifest(manifest):
+    """Read the download manifest into {submissionid: row}"""
+    if manifest is None or not os.path.exists(manifest):
+        return {}
+    with open(manifest, newline='') as manifest_file:
+        return {row['submissionid']: row
+                for row in csv.DictReader(manifest_file)}
+
+
+def _manifest_row(sub, submitter, filepath, md5):
+    """Row of the download manifest"""
+    return {'submissionid': sub.id,
+            'submitter': submitter,
+            'createdOn': sub.createdOn,
+            'filepath': filepath,
+            'md5': md5}
+
+
+def _is_downloaded(filepath, md5):
+    """Check if a file was already downloaded"""
+    if not os.path.exists(filepath):
+        return False
+    return md5 is None or md5_for_file(filepath).hexdigest() == md5
 
 
 def rename_submission_files(syn, evaluationid, download_location="./",
-                            status="SCORED"):
+                            status="SCORED", max_workers=4, manifest=None):
     '''
     This function renames the submission files of an evaluation queue.
     For many challenges we require participants to submit files that are
@@ -22,26 +65,106 @@ def rename_submission_files(syn, evaluationid, download_location="./",
 
         submitter_date_filename
 
+    Submissions are downloaded concurrently, and files that already exist
+    in the download location with the same name and MD5 are not downloaded
+    again.
+
     Args:
         syn: synapse object
         evaluationid:  Id of Evaluation queue
         download_location:  location to download files to (Default is ./)
         status: The submissions to download (Default is SCORED)
+        max_workers: Number of submissions to download at the same time
+                     (Default is 4)
+        manifest: CSV file that records where each submission was
+                  downloaded to.  Submissions in an existing manifest
+                  are skipped if their file is still there, so an
+                  interrupted download can be resumed. (Default is None)
+
+    Returns:
+        list: [{'submissionid', 'submitter', 'createdOn', 'filepath',
+                'md5'}, ...]
     '''
-    submission_bundle = syn.getSubmissionBundles(evaluationid, status=status)
-    for sub, status in submission_bundle:
+    submission_bundle = list(syn.getSubmissionBundles(evaluationid,
+                                                      status=status))
+    finished = _read_manifest(manifest)
+
+    # Only look up each team or user once
+    submitters = {}
+    for sub, _ in submission_bundle:
         if sub.get("teamId") is not None:
-            submitter = syn.getTeam(sub.get("teamId"))['name']
+            submitters[('team', sub.get("teamId"))] = None
         else:
-            submitter = syn.getUserProfile(sub.userId)['userName']
+            submitters[('user', sub.userId)] = None
+
+    def get_submitter_name(key):
+        kind, submitterid = key
+        if kind == 'team':
+            return syn.getTeam(submitterid)['name']
+        return syn.getUserProfile(submitterid)['userName']
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        submitters = dict(zip(submitters,
+                              executor.map(get_submitter_name, submitters)))
+
+    def download(sub):
+        if sub.get("teamId") is not None:
+            submitter = submitters[('team', sub.get("teamId"))]
+        else:
+            submitter = submitters[('user', sub.userId)]
+        file_handle = filestore.submission_file_handle(sub) or {}
+        md5 = file_handle.get('contentMd5')
+        row = finished.get(sub.id)
+        if row is not None and _is_downloaded(row['filepath'], md5):
+            return row
         date = sub.createdOn
-        submission_ent = \
-            syn.getSubmission(sub.id, downloadLocation=download_location)
-        filename = os.path.basename(submission_ent.filePath)
-        newname = submitter+"___"+date+"___"+filename
-        newname = newname.replace(' ', '_')
-        os.rename(filename, newname)
-        print(newname)
+        filename = file_handle.get('fileName')
+        if filename is not None:
+            newname = submitter+"___"+date+"___"+filename
+            newpath = os.path.join(download_location,
+                                   newname.replace(' ', '_'))
+            if _is_downloaded(newpath, md5):
+                return _manifest_row(sub, submitter, newpath, md5)
+        # Each submission gets its own directory so files with the same
+        # name can't clash while downloading
+        tmpdir = tempfile.mkdtemp(dir=download_location)
+        try:
+            submission_ent = filestore.get_submission(
+                syn, sub.id, download_location=tmpdir
+            )
+            filename = os.path.basename(submission_ent.filePath)
+            newname = submitter+"___"+date+"___"+filename
+            newpath = os.path.join(download_location,
+                                   newname.replace(' ', '_'))
+            os.replace(submission_ent.filePath, newpath)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        return _manifest_row(sub, submitter, newpath, md5)
+
+    rows = []
+    manifest_file = None
+    if manifest is not None:
+        manifest_exists = os.path.exists(manifest)
+        manifest_file = open(manifest, "a", newline='')
+        writer = csv.DictWriter(manifest_file, fieldnames=MANIFEST_COLUMNS)
+        if not manifest_exists:
+            writer.writeheader()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(download, sub)
+                       for sub, _ in submission_bundle]
+            for future in as_completed(futures):
+                row = future.result()
+                rows.append(row)
+                print(os.path.basename(row['filepath']))
+                if manifest_file is not None and \
+                        row['submissionid'] not in finished:
+                    writer.writerow(row)
+                    manifest_file.flush()
+    finally:
+        if manifest_file is not None:
+            manifest_file.close()
+    return rows
 
 
 def create_team_wikis(syn, synid, templateid, tracker_table_synid):
@@ -90,46 +213,167 @@ def kill_docker_submission_over_quota(syn, evaluation_id, quota=sys.maxsize):
     Rerunning submissions will require setting TimeRemaining annotation
     to a positive integer
 
+    Only the workflow timestamps of running submissions are queried, the
+    run times are computed for all submissions at once and the statuses of
+    the submissions over quota are stored in one batch.  The orchestrator
+    keeps updating these statuses, so if the batch hits an etag conflict
+    each status is fetched again and stored on its own.
+
     Args:
         syn (obj): Synapse object
         evaluation_id (int): Synapse evaluation queue id
         quota (int): Quota in milliseconds. Default is sys.maxsize.
                      One hour is 3600000.
+
+    Returns:
+        list: Ids of the submissions that were over quota
     '''
     if not isinstance(quota, int):
         raise ValueError("quota must be an integer")
     if quota <= 0:
         raise ValueError("quota must be larger than 0")
+    import numpy as np
+    import pandas as pd
+
+    evaluation_query = (f"select objectId, {WORKFLOW_LAST_UPDATED_KEY}, "
+                        f"{WORKFLOW_START_KEY} from evaluation_{evaluation_id}"
+                        " where status == 'EVALUATION_IN_PROGRESS'")
+    query_results = utils.evaluation_queue_query(syn, evaluation_query,
+                                                 limit=100)
+    resultsdf = pd.DataFrame(list(query_results),
+                             columns=['objectId', WORKFLOW_LAST_UPDATED_KEY,
+                                      WORKFLOW_START_KEY])
+    if resultsdf.empty:
+        return []
+    # If last updated and start doesn't exist, set to 0
+    last_updated = pd.to_numeric(resultsdf[WORKFLOW_LAST_UPDATED_KEY])
+    start = pd.to_numeric(resultsdf[WORKFLOW_START_KEY])
+    model_run_time = (np.nan_to_num(last_updated.to_numpy(dtype=float)) -
+                      np.nan_to_num(start.to_numpy(dtype=float)))
+    over_quota = set(resultsdf['objectId'][model_run_time > quota])
+    if not over_quota:
+        return []
 
-    evaluation_query = (f"select * from evaluation_{evaluation_id} where "
-                        "status == 'EVALUATION_IN_PROGRESS'")
-    query_results = utils.evaluation_queue_query(syn, evaluation_query)
-
-    for result in query_results:
-        # If last updated and start doesn't exist, set to 0
-        last_updated = int(result.get(WORKFLOW_LAST_UPDATED_KEY, 0))
-        start = int(result.get(WORKFLOW_START_KEY, 0))
-        model_run_time = last_updated - start
-        if model_run_time > quota:
-            status = syn.getSubmissionStatus(result['objectId'])
-            add_annotations = {TIME_REMAINING_KEY: 0}
+    statuses = []
+    add_annotations = {TIME_REMAINING_KEY: 0}
+    status_uri = (f"/evaluation/{evaluation_id}/submission/status/all"
+                  "?status=EVALUATION_IN_PROGRESS")
+    for status in syn._GET_paginated(status_uri, limit=100):
+        if status['id'] in over_quota:
             status = utils.update_single_submission_status(status,
                                                            add_annotations)
-            syn.store(status)
-
+            statuses.append(status)
     # Rerunning submissions will require setting this
     # annotation to a positive integer
+    try:
+        utils.store_submission_statuses(syn, evaluation_id, statuses)
+    except SynapseHTTPError as err:
+        if getattr(err.response, 'status_code', None) != 412:
+            raise
+        logger.info("Submission statuses changed while killing "
+                    "submissions, storing them one at a time")
+        return _kill_submissions(syn, [status['id'] for status in statuses],
+                                 add_annotations)
+    return [status['id'] for status in statuses]
 
 
-def archive_writeup(syn, evaluation, stat="VALIDATED", reArchive=False):
+def _kill_submissions(syn, submissionids, add_annotations):
+    """Annotate the latest status of each submission, skipping the ones
+    that change again before they are stored.  They are killed the next
+    time the queue is checked.
+
+    Returns:
+        list: Ids of the killed submissions
+    """
+    killed = []
+    for submissionid in submissionids:
+        status = syn.getSubmissionStatus(submissionid)
+        status = utils.update_single_submission_status(status,
+                                                       add_annotations)
+        try:
+            syn.store(status)
+        except SynapseHTTPError as err:
+            if getattr(err.response, 'status_code', None) != 412:
+                raise
+            logger.warning(f"Submission {submissionid} changed while it "
+                           "was being killed, retrying on the next check")
+            continue
+        killed.append(submissionid)
+    return killed
+
+
+ARCHIVE_ADMIN_PRINCIPALID = "3324230"
+ARCHIVE_ADMIN_PERMISSIONS = ['DELETE', 'DOWNLOAD', 'CREATE', 'READ',
+                             'CHANGE_PERMISSIONS', 'UPDATE', 'MODERATE',
+                             'CHANGE_SETTINGS']
+
+
+def _is_archived(status):
+    """Checks the submission status annotations for an archived project"""
+    annotations = status.get('annotations') or {}
+    return any(annotation.get("key") == "archived"
+               for annotation in annotations.get('stringAnnos', []))
+
+
+def _archive_project_name(sub, rearchive=False):
+    """Name of the archive project of a submission.  The name is the same
+    on every run so a project left by a failed copy is found again, unless
+    the submission is archived again, which creates a new project.
+    """
+    name = sub.name.replace("&", "+").replace("'", "")
+    if rearchive:
+        name = '{} {}'.format(name, int(round(time.time() * 1000)))
+    return 'Archived {} {} {}'.format(name, sub.id, sub.entityId)
+
+
+def _archive_submission(syn, sub, status, rearchive=False):
+    """Copy a submitted writeup into an archive project and record the
+    project on the submission status.  The status is stored as soon as the
+    copy is done, so it acts as the checkpoint for reruns.  An archive
+    project left behind by a failed copy is reused.
+
+    Args:
+        syn: Synapse object
+        sub: Synapse Submission
+        status: Synapse Submission Status
+        rearchive: Archive into a new project. Default is False.
+
+    Returns:
+        str: Archived project id
+    """
+    name = _archive_project_name(sub, rearchive=rearchive)
+    projectid = syn.findEntityId(name)
+    if projectid is None:
+        entity = syn.store(synapseclient.Project(name))
+    else:
+        entity = syn.get(projectid, downloadFile=False)
+    syn.setPermissions(entity, ARCHIVE_ADMIN_PRINCIPALID,
+                       ARCHIVE_ADMIN_PERMISSIONS)
+    synapseutils.copy(syn, sub.entityId, entity.id,
+                      updateExisting=projectid is not None)
+    archived = {"archived": entity.id}
+    status = utils.update_single_submission_status(status, archived)
+    syn.store(status)
+    return entity.id
+
+
+def archive_writeup(syn, evaluation, stat="VALIDATED", reArchive=False,
+                    max_workers=4):
     """
     Archive the submissions for the given evaluation queue and
     store them in the destination synapse folder.
 
+    Submissions are archived in parallel.  Every submission's status is
+    annotated as soon as it is archived, so rerunning after failures only
+    archives the submissions that are left.
+
     :param evaluation: a synapse evaluation queue or its ID
-    :param query: a query that will return the desired submissions.
-                  At least the ID must be returned. Defaults to:
-                  'select * from evaluation_[EVAL_ID] where status=="SCORED"'
+    :param stat: status of the submissions to archive. Default is VALIDATED
+    :param reArchive: archive submissions that are already archived
+    :param max_workers: number of submissions archived at the same time
+
+    :returns: ({submission id: archived project id},
+               {submission id: error}) of this run
     """
     if type(evaluation) != synapseclient.Evaluation:
         evaluation = syn.getEvaluation(evaluation)
@@ -137,24 +381,22 @@ def archive_writeup(syn, evaluation, stat="VALIDATED", reArchive=False):
     print("\n\nArchiving", evaluation.id, evaluation.name)
     print("-" * 60)
 
-    for sub, status in syn.getSubmissionBundles(evaluation, status=stat):
-        # retrieve file into cache and copy it to destination
-        checkIfArchived = filter(
-            lambda x: x.get("key") == "archived",
-            status.annotations['stringAnnos'])
-        if len(list(checkIfArchived)) == 0 or reArchive:
-            projectEntity = synapseclient.Project(
-                'Archived {} {} {} {}'.format(
-                    sub.name.replace("&", "+").replace("'", ""),
-                    int(round(time.time() * 1000)),
-                    sub.id,
-                    sub.entityId))
-            entity = syn.store(projectEntity)
-            adminPriv = [
-                'DELETE', 'DOWNLOAD', 'CREATE', 'READ', 'CHANGE_PERMISSIONS',
-                'UPDATE', 'MODERATE', 'CHANGE_SETTINGS']
-            syn.setPermissions(entity, "3324230", adminPriv)
-            synapseutils.copy(syn, sub.entityId, entity.id)
-            archived = {"archived": entity.id}
-            status = utils.update_single_submission_status(status, archived)
-            syn.store(status)
+    archived = {}
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for sub, status in syn.getSubmissionBundles(evaluation, status=stat):
+            if _is_archived(status) and not reArchive:
+                continue
+            future = executor.submit(_archive_submission, syn, sub, status,
+                                     rearchive=reArchive)
+            futures[future] = sub.id
+        for future in as_completed(futures):
+            subid = futures[future]
+            try:
+                archived[subid] = future.result()
+            except Exception as err:
+                print("Failed to archive submission {}: {}".format(subid,
+                                                                   err))
+                failed[subid] = err
+    return archived, failed
@@ -1,10 +1,15 @@
 """Convenience functions to set permissions on Synapse entities,
 without having to know the granular access control list"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+
 import synapseclient
 try:
+    from synapseclient.core.exceptions import SynapseHTTPError
     from synapseclient.core.utils import id_of
 except ModuleNotFoundError:
     # For synapseclient < v2.0
+    from synapseclient.exceptions import SynapseHTTPError
     from synapseclient.utils import id_of
 
 VIEW = ["READ"]
@@ -23,6 +28,9 @@ EVALUATION_PERMS_MAPPINGS = {'view': VIEW,
                              'score': SCORE,
                              'admin': ADMIN_EVALS,
                              'remove': []}
+AUDIT_COLUMNS = ['object_type', 'object_id', 'object_name', 'benefactor_id',
+                 'principal_id', 'access_type']
+AUDIT_KEY = ['object_type', 'object_id', 'principal_id', 'access_type']
 ENTITY_PERMS_MAPPINGS = {'view': VIEW,
                          'download': DOWNLOAD,
                          'edit': EDIT,
@@ -31,6 +39,28 @@ ENTITY_PERMS_MAPPINGS = {'view': VIEW,
                          'remove': []}
 
 
+def _permission_level_mapping(is_evaluation, permission_level):
+    """
+    Helper function to map a permission level to access types
+
+    Args:
+        is_evaluation: True for evaluations, False for entities
+        permission_level: Permission level
+
+    Returns:
+        list: Access types
+    """
+    if is_evaluation:
+        permission_level_mapping = EVALUATION_PERMS_MAPPINGS
+    else:
+        permission_level_mapping = ENTITY_PERMS_MAPPINGS
+
+    if permission_level not in permission_level_mapping.keys():
+        raise ValueError("permission_level must be one of these: {0}".format(
+            ', '.join(permission_level_mapping.keys())))
+    return permission_level_mapping[permission_level]
+
+
 def _set_permissions(syn, syn_obj, principalid, permission_level):
     """
     Helper function to set the ACL on entity or evaluation
@@ -45,17 +75,11 @@ def _set_permissions(syn, syn_obj, principalid, permission_level):
                           'remove' can be specified to delete the permissions
         principalid: Synapse id of a user or team.
     """
-    if isinstance(syn_obj, synapseclient.Evaluation):
-        permission_level_mapping = EVALUATION_PERMS_MAPPINGS
-    else:
-        permission_level_mapping = ENTITY_PERMS_MAPPINGS
-
-    if permission_level not in permission_level_mapping.keys():
-        raise ValueError("permission_level must be one of these: {0}".format(
-            ', '.join(permission_level_mapping.keys())))
-
+    access_type = _permission_level_mapping(
+        isinstance(syn_obj, synapseclient.Evaluation), permission_level
+    )
     syn.setPermissions(syn_obj, principalId=principalid,
-                       accessType=permission_level_mapping[permission_level])
+                       accessType=access_type)
 
 
 def set_evaluation_permissions(syn, evaluation, principalid,
@@ -100,6 +124,111 @@ def set_entity_permissions(syn, entity, principalid,
     _set_permissions(syn, entity, principalid, permission_level)
 
 
+def _is_evaluation(syn_obj):
+    """Evaluations are Evaluation objects or ids that aren't Synapse ids"""
+    if isinstance(syn_obj, synapseclient.Evaluation):
+        return True
+    if isinstance(syn_obj, synapseclient.Entity):
+        return False
+    return not str(id_of(syn_obj)).lower().startswith("syn")
+
+
+def _update_acl(acl, principalid, access_type):
+    """
+    Helper function to set the access of a principal in an ACL
+
+    Args:
+        acl: Access control list
+        principalid: Synapse id of a user or team
+        access_type: List of access types. An empty list removes
+                     the principal from the ACL.
+    """
+    resource_access = [access for access in acl['resourceAccess']
+                       if access.get('principalId') != principalid]
+    if access_type:
+        resource_access.append({'accessType': list(access_type),
+                                'principalId': principalid})
+    acl['resourceAccess'] = resource_access
+
+
+def _apply_acl_changes(syn, syn_obj, is_evaluation, changes):
+    """
+    Helper function to read an ACL once, apply every change to it and
+    write it once
+
+    Args:
+        syn: Synapse object
+        syn_obj: An Evaluation, Entity or their id
+        is_evaluation: True if syn_obj is an evaluation
+        changes: List of (principal id, access types)
+
+    Returns:
+        dict: Stored access control list
+    """
+    objid = id_of(syn_obj)
+    if is_evaluation:
+        acl = syn.restGET("/evaluation/{}/acl".format(objid))
+    else:
+        # An entity gets its ACL from its benefactor
+        benefactor = syn.restGET("/entity/{}/benefactor".format(objid))
+        acl = syn.restGET("/entity/{}/acl".format(benefactor['id']))
+    for principalid, access_type in changes:
+        _update_acl(acl, principalid, access_type)
+    if is_evaluation:
+        return syn.restPUT("/evaluation/acl", json.dumps(acl))
+    if benefactor['id'] == objid:
+        return syn.restPUT("/entity/{}/acl".format(objid), json.dumps(acl))
+    # Create a new ACL for an entity that inherited its benefactor's
+    return syn.restPOST("/entity/{}/acl".format(objid), json.dumps(acl))
+
+
+def set_bulk_permissions(syn, permission_changes, max_workers=4):
+    """
+    Sets many permissions at once.  The changes are grouped by entity or
+    evaluation so every ACL is read once and written once, and different
+    ACLs are updated concurrently.
+
+    Args:
+        syn: Synapse object
+        permission_changes: List of (entity or evaluation, principalid,
+                            permission_level).  Ids that aren't Synapse
+                            ids (syn123) are taken to be evaluation ids.
+                            See set_entity_permissions and
+                            set_evaluation_permissions for the
+                            permission levels.  Later changes for the same
+                            principal win.
+        max_workers: Number of ACLs updated at the same time
+
+    Returns:
+        dict: {entity or evaluation id: stored access control list}
+    """
+    grouped = {}
+    for syn_obj, principalid, permission_level in permission_changes:
+        is_evaluation = _is_evaluation(syn_obj)
+        access_type = _permission_level_mapping(is_evaluation,
+                                                permission_level)
+        key = (str(id_of(syn_obj)), is_evaluation)
+        grouped.setdefault(key, []).append((principalid, access_type))
+
+    principalids = {principalid
+                    for changes in grouped.values()
+                    for principalid, _ in changes}
+    # Look up user names and the public principal once
+    principal_map = {principalid: syn._getUserbyPrincipalIdOrName(principalid)
+                     for principalid in principalids}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            objid: executor.submit(
+                _apply_acl_changes, syn, objid, is_evaluation,
+                [(principal_map[principalid], access_type)
+                 for principalid, access_type in changes]
+            )
+            for (objid, is_evaluation), changes in grouped.items()
+        }
+        return {objid: future.result() for objid, future in futures.items()}
+
+
 def get_user_entity_permissions(syn, entity):
     """Gets the list of permission that the caller has on a given Entity.
     https://rest-docs.synapse.org/rest/org/sagebionetworks/repo/model/auth/UserEntityPermissions.html
@@ -114,3 +243,136 @@ def get_user_entity_permissions(syn, entity):
     synid = id_of(entity)
     permissions = syn.restGET("/entity/{}/permissions".format(synid))
     return permissions
+
+
+def _walk_challenge_objects(syn, projectids, max_workers=8):
+    """
+    Helper function to list the folders, wikis and evaluation queues of
+    challenge projects.  Each level of folders is listed concurrently.
+
+    Args:
+        syn: Synapse object
+        projectids: List of Synapse project ids
+        max_workers: Number of listings run at the same time
+
+    Returns:
+        list: [(object type, object id, object name, owner id)]
+              where the owner id is the entity a wiki belongs to
+    """
+    def get_project(projectid):
+        project = syn.get(projectid, downloadFile=False)
+        return ('project', project.id, project.name, None)
+
+    def get_wikis(projectid):
+        try:
+            headers = syn.getWikiHeaders(projectid)
+        except SynapseHTTPError:
+            return []
+        return [('wiki', header['id'], header.get('title', ''), projectid)
+                for header in headers]
+
+    def get_evaluations(projectid):
+        return [('evaluation', evaluation.id, evaluation.name, None)
+                for evaluation in syn.getEvaluationByContentSource(projectid)]
+
+    def get_folders(parentid):
+        return [('folder', child['id'], child['name'], None)
+                for child in syn.getChildren(parentid,
+                                             includeTypes=['folder'])]
+
+    objects = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        objects.extend(executor.map(get_project, projectids))
+        for listed in executor.map(get_wikis, projectids):
+            objects.extend(listed)
+        for listed in executor.map(get_evaluations, projectids):
+            objects.extend(listed)
+        parents = list(projectids)
+        while parents:
+            folders = [folder
+                       for listed in executor.map(get_folders, parents)
+                       for folder in listed]
+            objects.extend(folders)
+            parents = [folder[1] for folder in folders]
+    return objects
+
+
+def audit_permissions(syn, projectids, max_workers=8):
+    """
+    Lists who has which access to every project, folder, wiki and
+    evaluation queue of a challenge.  Each distinct ACL is fetched once and
+    ACLs are fetched concurrently.  Wikis have the ACL of the entity they
+    belong to.
+
+    Args:
+        syn: Synapse object
+        projectids: List of Synapse project ids, ie. the live and
+                    staging sites
+        max_workers: Number of requests run at the same time
+
+    Returns:
+        pd.DataFrame: One row per object, principal and access type with
+                      the columns in AUDIT_COLUMNS
+    """
+    import pandas as pd
+
+    objects = _walk_challenge_objects(syn, projectids,
+                                      max_workers=max_workers)
+
+    def get_benefactor(obj):
+        object_type, objid, _, ownerid = obj
+        if object_type == 'evaluation':
+            return None
+        entityid = objid if ownerid is None else ownerid
+        return syn.restGET("/entity/{}/benefactor".format(entityid))['id']
+
+    def get_acl(acl_key):
+        is_evaluation, objid = acl_key
+        if is_evaluation:
+            return syn.restGET("/evaluation/{}/acl".format(objid))
+        return syn.restGET("/entity/{}/acl".format(objid))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        benefactors = list(executor.map(get_benefactor, objects))
+        acl_keys = [(True, obj[1]) if benefactor is None
+                    else (False, benefactor)
+                    for obj, benefactor in zip(objects, benefactors)]
+        unique_keys = list(dict.fromkeys(acl_keys))
+        acls = dict(zip(unique_keys, executor.map(get_acl, unique_keys)))
+
+    rows = []
+    for (object_type, objid, name, _), benefactor, acl_key in zip(
+            objects, benefactors, acl_keys):
+        for access in acls[acl_key]['resourceAccess']:
+            for access_type in sorted(access['accessType']):
+                rows.append((object_type, str(objid), name, benefactor,
+                             str(access['principalId']), access_type))
+    return pd.DataFrame(rows, columns=AUDIT_COLUMNS)
+
+
+def diff_permission_audits(previous, current):
+    """
+    Compares two permission audits
+
+    Args:
+        previous: Earlier audit from audit_permissions
+        current: Later audit from audit_permissions
+
+    Returns:
+        pd.DataFrame: The rows that were added or removed, with a change
+                      column that is either added or removed
+    """
+    key_types = {column: str for column in AUDIT_KEY}
+    merged = previous.astype(key_types).merge(
+        current.astype(key_types), on=AUDIT_KEY, how='outer',
+        suffixes=('_previous', ''), indicator=True
+    )
+    changed = merged[merged['_merge'] != 'both'].copy()
+    changed['change'] = changed['_merge'].map({'left_only': 'removed',
+                                               'right_only': 'added'})
+    for column in ['object_name', 'benefactor_id']:
+        changed[column] = changed[column].fillna(
+            changed[column + '_previous']
+        )
+    changed = changed[['change'] + AUDIT_COLUMNS]
+    return changed.sort_values(AUDIT_KEY).reset_index(drop=True)
@@ -0,0 +1,285 @@
+"""Local server that runs challengeutils commands with one logged-in
+Synapse session.
+
+`challengeutils server` logs in once and listens on a Unix socket.  When
+the CHALLENGEUTILS_SERVER environment variable is set to that socket, the
+`challengeutils` command forwards its arguments to the server and prints
+what the command printed, so each call skips the imports and the login.
+The command line interface stays the same.  If the server can't be
+reached, the command runs locally as usual.
+
+Commands that download files, prompt or keep running (createchallenge,
+downloadsubmission, download_current_lead_submission and
+killdockeroverquota --interval) always run locally, and so does any
+command given a different Synapse config than the server's.  Forwarded
+commands run one at a time in the server.  Their relative path arguments
+are resolved against the working directory of the caller, so they behave
+the same as without the server.  The socket is only accessible by the
+user that started the server.
+
+This module only uses the standard library so forwarding stays fast.
+"""
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+
+from .session import DEFAULT_SYNAPSE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SERVER_ENV = "CHALLENGEUTILS_SERVER"
+DEFAULT_SOCKET = os.path.join(os.path.expanduser('~'), '.challengeutils',
+                              'server.sock')
+# Seconds to wait for the server to accept a connection and to run a command
+CONNECT_TIMEOUT = 5
+COMMAND_TIMEOUT = 600
+# Commands capture stdout and stderr, which are shared by the whole process
+_COMMAND_LOCK = threading.Lock()
+# Commands that download files into the working directory, prompt or keep
+# running are never forwarded
+_LOCAL_COMMANDS = ('server', 'createchallenge', 'downloadsubmission',
+                   'download_current_lead_submission')
+# Arguments that are paths, which are resolved against the caller's directory
+_PATH_ARGS = ('annotation_values', 'diff_output', 'inviteefile', 'output',
+              'outputfile', 'previous', 'report')
+
+
+def _split_argv(argv):
+    """Synapse config, subcommand and subcommand arguments of a command
+    line, ie. ['-c', 'cfg', 'server'] is ('cfg', 'server', [])"""
+    synapse_config = None
+    args = iter(argv)
+    for arg in args:
+        option, has_value, value = arg.partition('=')
+        if arg == '-c' or (len(option) > 2 and
+                           '--synapse_config'.startswith(option)):
+            synapse_config = value if has_value else next(args, None)
+        elif arg.startswith('-c'):
+            synapse_config = arg[2:]
+        elif not arg.startswith('-'):
+            return synapse_config, arg, list(args)
+    return synapse_config, None, []
+
+
+def _config_path(synapse_config):
+    """Absolute path of a Synapse config, None being the default config"""
+    return os.path.abspath(
+        os.path.expanduser(synapse_config or DEFAULT_SYNAPSE_CONFIG)
+    )
+
+
+def _runs_locally(argv):
+    """Whether a command must run locally instead of on the server"""
+    _, command, args = _split_argv(argv)
+    if command in _LOCAL_COMMANDS:
+        return True
+    return command == 'killdockeroverquota' and any(
+        arg == '--interval' or arg.startswith('--interval=') for arg in args
+    )
+
+
+def _exit_code(code):
+    """Exit code of a SystemExit code, which can also be None or a message"""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def run_command(syn, argv, cwd=None):
+    """Run a challengeutils command with a logged in Synapse object,
+    capturing what it prints
+
+    Args:
+        syn: Synapse object
+        argv: Command line arguments, ie. ['annotatesubmission', '12345',
+              'annotations.json']
+        cwd: Directory that relative path arguments are resolved
+             against. Default is the current directory.
+
+    Returns:
+        dict: {'stdout': str, 'stderr': str, 'exit_code': int}
+    """
+    from . import __main__ as cli
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    handler = logging.StreamHandler(stderr)
+    handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    root_logger = logging.getLogger()
+    with _COMMAND_LOCK, redirect_stdout(stdout), redirect_stderr(stderr):
+        root_logger.addHandler(handler)
+        try:
+            if _runs_locally(argv):
+                raise ValueError(f"{_split_argv(argv)[1]} can't run on the "
+                                 "server")
+            args = cli.build_parser().parse_args(argv)
+            for dest in _PATH_ARGS:
+                path = getattr(args, dest, None)
+                if path is not None and cwd is not None:
+                    setattr(args, dest, os.path.join(cwd, path))
+            cli.perform_main(syn, args)
+            exit_code = 0
+        except SystemExit as err:
+            exit_code = _exit_code(err.code)
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            root_logger.removeHandler(handler)
+    return {'stdout': stdout.getvalue(),
+            'stderr': stderr.getvalue(),
+            'exit_code': exit_code}
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request line and writes one JSON response line.
+    Commands sent with another Synapse config than the server's are
+    refused, so the caller runs them locally."""
+    # Seconds a client has to send its request
+    timeout = CONNECT_TIMEOUT
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode())
+        synapse_config = request.get('synapse_config')
+        if _config_path(synapse_config) != self.server.synapse_config:
+            response = {'refused': f"the server uses "
+                                   f"{self.server.synapse_config}"}
+        else:
+            response = run_command(self.server.syn, request['argv'],
+                                   cwd=request.get('cwd'))
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+def _remove_stale_socket(socket_path):
+    """Remove a socket left behind by a server that is no longer running"""
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(socket_path)
+        else:
+            raise ValueError(f"A server is already listening on {socket_path}")
+
+
+class CommandServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    """Unix socket server that runs challengeutils commands
+
+    Attributes:
+        syn: Logged in Synapse object used by every command
+        socket_path: Path of the Unix socket
+        synapse_config: Path of the Synapse config the server logged in
+                        with. Default is ~/.synapseConfig.
+    """
+    daemon_threads = True
+
+    def __init__(self, syn, socket_path, synapse_config=None):
+        self.syn = syn
+        self.socket_path = os.path.abspath(socket_path)
+        self.synapse_config = _config_path(synapse_config)
+        os.makedirs(os.path.dirname(self.socket_path), mode=0o700,
+                    exist_ok=True)
+        _remove_stale_socket(self.socket_path)
+        # Only the user that started the server can connect to it
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(self.socket_path, _CommandHandler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def serve(syn, socket_path=DEFAULT_SOCKET, synapse_config=None):
+    """Run commands sent to the socket until interrupted
+
+    Args:
+        syn: Logged in Synapse object
+        socket_path: Path of the Unix socket. Default is DEFAULT_SOCKET.
+        synapse_config: Path of the Synapse config syn logged in with.
+                        Default is ~/.synapseConfig.
+    """
+    with CommandServer(syn, socket_path,
+                       synapse_config=synapse_config) as server:
+        logger.info(f"Listening on {server.socket_path}. Set "
+                    f"{SERVER_ENV}={server.socket_path} to use it.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopping server")
+
+
+def send_command(socket_path, argv, cwd=None, timeout=COMMAND_TIMEOUT):
+    """Send a command to a running server
+
+    Args:
+        socket_path: Path of the server's Unix socket
+        argv: Command line arguments
+        cwd: Directory that relative path arguments are resolved
+             against. Default is the current directory.
+        timeout: Seconds to wait for the command. Default is 600.
+
+    Returns:
+        dict: {'stdout': str, 'stderr': str, 'exit_code': int} or
+              {'refused': str} if the server uses another Synapse config
+
+    Raises:
+        OSError: The server can't be reached
+    """
+    cwd = cwd or os.getcwd()
+    request = {'argv': list(argv), 'cwd': cwd,
+               'synapse_config': _config_path(_split_argv(argv)[0])}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(socket_path)
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        try:
+            with sock.makefile("rb") as response_file:
+                return json.loads(response_file.readline().decode())
+        except socket.timeout:
+            # The command may have run, so it isn't run again locally
+            return {'stdout': '',
+                    'stderr': f"No response from the server on {socket_path} "
+                              f"in {timeout} seconds\n",
+                    'exit_code': 1}
+
+
+def forward(argv):
+    """Run a command on the server set by CHALLENGEUTILS_SERVER and print
+    its output
+
+    Args:
+        argv: Command line arguments
+
+    Returns:
+        int: Exit code of the command or None if it wasn't forwarded
+    """
+    socket_path = os.environ.get(SERVER_ENV)
+    if not socket_path or _runs_locally(argv):
+        return None
+    try:
+        response = send_command(socket_path, argv)
+    except OSError as err:
+        logger.warning(f"Running locally, no server on {socket_path}: {err}")
+        return None
+    if 'refused' in response:
+        logger.warning(f"Running locally, {response['refused']}")
+        return None
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['exit_code']
@@ -0,0 +1,239 @@
+"""Cache of Synapse logins shared between challengeutils calls.
+
+A full Synapse login checks the endpoints and the client version and
+validates the credentials, which is several requests per call.  After a
+login the username and endpoints are saved to a cache file that only the
+user can read, and later calls with the same Synapse config reuse them
+without any requests until the cached login expires.  The secret is never
+cached: it is read again from SYNAPSE_AUTH_TOKEN or the [authentication]
+section of the Synapse config on every call, so only logins with one of
+these are cached.
+
+CHALLENGEUTILS_SESSION_CACHE sets the cache file and
+CHALLENGEUTILS_SESSION_TTL the seconds a login is reused.  A TTL of 0
+turns the cache off.
+"""
+import configparser
+import hashlib
+import json
+import logging
+import os
+import stat
+import time
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_ENV = "CHALLENGEUTILS_SESSION_CACHE"
+SESSION_TTL_ENV = "CHALLENGEUTILS_SESSION_TTL"
+DEFAULT_SESSION_CACHE = os.path.join(os.path.expanduser('~'),
+                                     '.challengeutils', 'session.json')
+DEFAULT_SESSION_TTL = 3600
+# synapseclient.client.CONFIG_FILE, used when no config is given
+DEFAULT_SYNAPSE_CONFIG = os.path.join(os.path.expanduser('~'),
+                                      '.synapseConfig')
+ENDPOINTS = ['repoEndpoint', 'authEndpoint', 'fileHandleEndpoint',
+             'portalEndpoint']
+
+
+def _credential_classes():
+    """{type: credentials class} or {} for synapseclient < 2.0, which
+    has no credentials to cache"""
+    try:
+        from synapseclient.core.credentials.cred_data import (
+            SynapseApiKeyCredentials, SynapseAuthTokenCredentials
+        )
+    except ModuleNotFoundError:
+        return {}
+    return {'authtoken': SynapseAuthTokenCredentials,
+            'apikey': SynapseApiKeyCredentials}
+
+
+def _config_path(synapse_config):
+    """Absolute path of a Synapse config, None being the default config"""
+    return os.path.abspath(
+        os.path.expanduser(synapse_config or DEFAULT_SYNAPSE_CONFIG)
+    )
+
+
+def _read_secret(synapse_config):
+    """(credentials type, secret) the way synapseclient finds them in
+    SYNAPSE_AUTH_TOKEN or the config, or None if neither has one"""
+    auth_token = os.environ.get("SYNAPSE_AUTH_TOKEN")
+    if auth_token:
+        return 'authtoken', auth_token
+    config = configparser.RawConfigParser()
+    try:
+        config.read(_config_path(synapse_config))
+    except configparser.Error:
+        return None
+    if not config.has_section('authentication'):
+        return None
+    authentication = dict(config.items('authentication'))
+    if authentication.get('authtoken'):
+        return 'authtoken', authentication['authtoken']
+    if authentication.get('apikey'):
+        return 'apikey', authentication['apikey']
+    return None
+
+
+def _session_key(synapse_config):
+    """Logins are only reused with the same config file, unchanged since
+    the login, and the same SYNAPSE_AUTH_TOKEN"""
+    config_path = _config_path(synapse_config)
+    try:
+        config_mtime = os.stat(config_path).st_mtime
+    except OSError:
+        config_mtime = None
+    key = json.dumps([config_path, config_mtime,
+                      os.environ.get("SYNAPSE_AUTH_TOKEN")])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class SessionCache:
+    """File of cached Synapse logins keyed by Synapse config
+
+    Attributes:
+        path: Path of the cache file
+        ttl: Seconds a login is reused. Default is 3600.
+    """
+    def __init__(self, path, ttl=DEFAULT_SESSION_TTL):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.ttl = ttl
+
+    def _read(self):
+        """Cached logins that haven't expired"""
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+            logger.warning(f"Ignoring {self.path}, it must only be "
+                           "readable by its owner")
+            return {}
+        try:
+            with open(self.path) as cache_file:
+                sessions = json.load(cache_file)
+        except ValueError:
+            return {}
+        now = time.time()
+        # Logins cached by earlier versions kept the secret, drop them
+        return {key: session for key, session in sessions.items()
+                if session.get('expires', 0) > now and 'secret' not in session}
+
+    def _write(self, sessions):
+        """Atomically replace the cache file, readable only by its owner"""
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump(sessions, cache_file)
+        os.replace(tmp_path, self.path)
+
+    def load(self, synapse_config, **synapse_kwargs):
+        """Synapse object logged in with a cached login
+
+        Args:
+            synapse_config: Path of the Synapse config used to log in
+            **synapse_kwargs: Passed to synapseclient.Synapse
+
+        Returns:
+            Logged in Synapse object or None if there is no cached login
+            or its secret is gone from the environment and config
+        """
+        session = self._read().get(_session_key(synapse_config))
+        credential_class = _credential_classes().get(
+            (session or {}).get('type')
+        )
+        secret = _read_secret(synapse_config)
+        if credential_class is None or secret is None or \
+                secret[0] != session['type']:
+            return None
+        import synapseclient
+
+        if synapse_config is not None:
+            synapse_kwargs['configPath'] = synapse_config
+        syn = synapseclient.Synapse(skip_checks=True, **synapse_kwargs)
+        syn.setEndpoints(skip_checks=True, **session['endpoints'])
+        syn.credentials = credential_class(secret[1], session['username'])
+        return syn
+
+    def save(self, syn, synapse_config):
+        """Cache the username and endpoints of a Synapse object.  Logins
+        that didn't use the secret of SYNAPSE_AUTH_TOKEN or the config
+        aren't cached.
+
+        Args:
+            syn: Logged in Synapse object
+            synapse_config: Path of the Synapse config used to log in
+        """
+        for credential_type, credential_class in \
+                _credential_classes().items():
+            if isinstance(syn.credentials, credential_class):
+                break
+        else:
+            return
+        if _read_secret(synapse_config) != (credential_type,
+                                            syn.credentials.secret):
+            return
+        sessions = self._read()
+        sessions[_session_key(synapse_config)] = {
+            'type': credential_type,
+            'username': syn.credentials.username,
+            'endpoints': {endpoint: getattr(syn, endpoint)
+                          for endpoint in ENDPOINTS},
+            'expires': time.time() + self.ttl
+        }
+        self._write(sessions)
+
+    def clear(self):
+        """Remove all cached logins"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def default_cache():
+    """Cache configured by the CHALLENGEUTILS_SESSION_CACHE and
+    CHALLENGEUTILS_SESSION_TTL environment variables
+
+    Returns:
+        SessionCache or None if the TTL is 0
+    """
+    ttl = os.environ.get(SESSION_TTL_ENV) or DEFAULT_SESSION_TTL
+    try:
+        ttl = int(ttl)
+    except ValueError:
+        logger.warning(f"{SESSION_TTL_ENV} must be a number of seconds, "
+                       f"using {DEFAULT_SESSION_TTL}")
+        ttl = DEFAULT_SESSION_TTL
+    if ttl <= 0:
+        return None
+    path = os.environ.get(SESSION_CACHE_ENV) or DEFAULT_SESSION_CACHE
+    return SessionCache(path, ttl=ttl)
+
+
+def cached_login(synapse_config, login, cache=None, **synapse_kwargs):
+    """Reuse a cached login or log in and cache it
+
+    Args:
+        synapse_config: Path of the Synapse config used to log in
+        login: Function without arguments that does a full login and
+               returns the Synapse object
+        cache: SessionCache. Default is the cache configured by the
+               environment.
+        **synapse_kwargs: Passed to synapseclient.Synapse for cached logins
+
+    Returns:
+        Logged in Synapse object
+    """
+    cache = cache if cache is not None else default_cache()
+    if cache is None:
+        return login()
+    syn = cache.load(synapse_config, **synapse_kwargs)
+    if syn is not None:
+        return syn
+    syn = login()
+    try:
+        cache.save(syn, synapse_config)
+    except OSError as err:
+        logger.warning(f"Couldn't cache the Synapse login: {err}")
+    return syn
@@ -1,10 +1,14 @@
 """
 Challenge utility functions
 """
+import calendar
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import json
 import logging
 import sys
+import threading
+import time
 import urllib
 
 import synapseclient
@@ -20,6 +24,8 @@ except ModuleNotFoundError:
 
 from synapseservices.challenge import Challenge
 
+from . import filestore
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -184,6 +190,50 @@ def evaluation_queue_query(syn, uri, limit=20, offset=0):
             yield result
 
 
+def _status_to_json(status):
+    """Request body of a submission status.  SubmissionStatus objects
+    serialize their annotations to the Synapse format with json(), plain
+    dicts from the REST API are already in that format."""
+    if hasattr(status, 'json'):
+        return json.loads(status.json())
+    return status
+
+
+def store_submission_statuses(syn, evaluationid, statuses, batch_size=500):
+    """
+    Store many submission statuses of an evaluation queue with as few
+    requests as possible.
+    https://rest-docs.synapse.org/rest/POST/evaluation/evalId/statusBatch.html
+
+    Args:
+        syn: Synapse object
+        evaluationid: Evaluation queue id
+        statuses: List of submission statuses
+        batch_size: Number of statuses per request. The maximum
+                    is 500 (Default is 500)
+
+    Returns:
+        list: Batch upload responses
+    """
+    responses = []
+    batch_token = None
+    for start in range(0, len(statuses), batch_size):
+        end = start + batch_size
+        batch = {'statuses': [_status_to_json(status)
+                              for status in statuses[start:end]],
+                 'isFirstBatch': start == 0,
+                 'isLastBatch': end >= len(statuses)}
+        if batch_token is not None:
+            batch['batchToken'] = batch_token
+        response = syn.restPOST(
+            "/evaluation/{}/statusBatch".format(evaluationid),
+            json.dumps(batch)
+        )
+        batch_token = response.get('nextUploadToken')
+        responses.append(response)
+    return responses
+
+
 def get_challenge(syn, entity):
     """Get the Challenge associated with a Project.
 
@@ -293,19 +343,21 @@ def update_all_submissions_annotation_acl(syn, evaluationid, annotations,
         syn.store(new_status)
 
 
-def invite_member_to_team(syn, team, user=None, email=None, message=None):
+def _invite_to_team(syn, teamid, user=None, email=None, message=None):
     """
-    Invite members to a team
+    Helper function to invite a user or email to a team that has already
+    been looked up
 
     Args:
         syn: Synapse object
-        team: Synapse Team id or name
+        teamid: Synapse Team id
         user: Synapse username or profile id
-        email: Email of user, do not specify both email and user,
-               but must specify one
+        email: Email of user
         message: Message for people getting invited to the team
+
+    Returns:
+        Membership invitation or None if the user is already a member
     """
-    teamid = syn.getTeam(team)['id']
     is_member = False
     invite = {'teamId': str(teamid)}
 
@@ -331,6 +383,70 @@ def invite_member_to_team(syn, team, user=None, email=None, message=None):
     return None
 
 
+def invite_member_to_team(syn, team, user=None, email=None, message=None):
+    """
+    Invite members to a team
+
+    Args:
+        syn: Synapse object
+        team: Synapse Team id or name
+        user: Synapse username or profile id
+        email: Email of user, do not specify both email and user,
+               but must specify one
+        message: Message for people getting invited to the team
+    """
+    teamid = syn.getTeam(team)['id']
+    return _invite_to_team(syn, teamid, user=user, email=email,
+                           message=message)
+
+
+def invite_members_to_team(syn, team, users=None, emails=None, message=None,
+                           max_workers=8):
+    """
+    Invite many users and emails to a team.  The team is looked up once,
+    and users are checked and invited in parallel.  Users that are
+    already members are skipped.
+
+    Args:
+        syn: Synapse object
+        team: Synapse Team id or name
+        users: List of Synapse usernames or profile ids
+        emails: List of emails
+        message: Message for people getting invited to the team
+        max_workers: Number of invitations handled at the same time
+
+    Returns:
+        list: [{'invitee', 'result', 'invitationid', 'error'}, ...] in the
+              order of the users then the emails. result is one of
+              invited, member or error.
+    """
+    teamid = syn.getTeam(team)['id']
+    invitees = ([{'user': user} for user in users or []] +
+                [{'email': email} for email in emails or []])
+
+    def invite(invitee):
+        name = invitee.get('user', invitee.get('email'))
+        row = {'invitee': name, 'result': None, 'invitationid': None,
+               'error': None}
+        try:
+            invitation = _invite_to_team(syn, teamid, message=message,
+                                         **invitee)
+        except Exception as err:
+            logger.error("Failed to invite {}: {}".format(name, err))
+            row['result'] = "error"
+            row['error'] = str(err)
+        else:
+            if invitation is None:
+                row['result'] = "member"
+            else:
+                row['result'] = "invited"
+                row['invitationid'] = invitation.get('id')
+        return row
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(invite, invitees))
+
+
 def register_team(syn, entity, team):
     '''
     Registers team to challenge
@@ -402,23 +518,92 @@ class NewUserProfile(synapseclient.team.UserProfile):
         return int(self['ownerId'])
 
 
-def _get_team_set(syn, team):
-    '''
-    Helper function to return a set of usernames
+class TeamMemberCache:
+    '''
+    Cache of team members keyed by team id.  Members are kept as a sorted
+    array of user ids so membership can be compared without building
+    profile objects.
+
+    Attributes:
+        ttl: Seconds a team's members are reused before they are fetched
+             again. Default is 300.
+    '''
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._teams = {}
+        self._lock = threading.Lock()
+
+    def get(self, syn, team):
+        '''
+        Get the members of a team, fetching them if they aren't cached
+        or have expired
+
+        Args:
+            syn: Synapse object
+            team: Synapse team id or object
+
+        Returns:
+            tuple: (sorted numpy array of user ids,
+                    {user id: user profile})
+        '''
+        teamid = str(id_of(team))
+        now = time.time()
+        with self._lock:
+            cached = self._teams.get(teamid)
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1], cached[2]
+        import numpy as np
+
+        profiles = {int(member['member']['ownerId']): member['member']
+                    for member in syn.getTeamMembers(team)}
+        memberids = np.array(sorted(profiles), dtype=np.int64)
+        with self._lock:
+            self._teams[teamid] = (now, memberids, profiles)
+        return memberids, profiles
+
+    def invalidate(self, team=None):
+        '''
+        Forget the cached members of a team
+
+        Args:
+            team: Synapse team id or object. Default is None, which
+                  forgets every team.
+        '''
+        with self._lock:
+            if team is None:
+                self._teams.clear()
+            else:
+                self._teams.pop(str(id_of(team)), None)
+
+
+def _team_members_operation(syn, a, b, operation, cache=None):
+    '''
+    Helper function to fetch the members of both teams concurrently and
+    apply a set operation to their sorted user id arrays
 
     Args:
         syn: Synapse object
-        team: Synapse team id, name or object
+        a: Synapse Team id or name
+        b: Synapse Team id or name
+        operation: Function of the two user id arrays
+        cache: TeamMemberCache to reuse members between calls.
+               Default is None, which fetches the members every call.
 
     Returns:
-        Set of synapse user profiles in team
+        Set of synapse user profiles in the result
     '''
-    members = syn.getTeamMembers(team)
-    members_set = set(NewUserProfile(**member['member']) for member in members)
-    return members_set
+    cache = TeamMemberCache() if cache is None else cache
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        future_a = executor.submit(cache.get, syn, a)
+        future_b = executor.submit(cache.get, syn, b)
+        ids_a, profiles_a = future_a.result()
+        ids_b, profiles_b = future_b.result()
+    profiles = {**profiles_b, **profiles_a}
+    return set(NewUserProfile(**profiles[int(memberid)])
+               for memberid in operation(ids_a, ids_b))
 
 
-def team_members_diff(syn, a, b):
+def team_members_diff(syn, a, b, cache=None):
     '''
     Calculates the diff between teama and teamb
 
@@ -426,17 +611,22 @@ def team_members_diff(syn, a, b):
         syn: Synapse object
         a: Synapse Team id or name
         b: Synapse Team id or name
+        cache: TeamMemberCache to reuse members between calls.
+               Default is None, which fetches the members every call.
 
     Returns:
         Set of synapse user profiles in teama but not in teamb
     '''
-    uniq_teama_members = _get_team_set(syn, a)
-    uniq_teamb_members = _get_team_set(syn, b)
-    members_not_in_teamb = uniq_teama_members.difference(uniq_teamb_members)
-    return members_not_in_teamb
+    import numpy as np
 
+    return _team_members_operation(
+        syn, a, b,
+        lambda ids_a, ids_b: np.setdiff1d(ids_a, ids_b, assume_unique=True),
+        cache=cache
+    )
 
-def team_members_intersection(syn, a, b):
+
+def team_members_intersection(syn, a, b, cache=None):
     '''
     Calculates the intersection between teama and teamb
 
@@ -444,17 +634,23 @@ def team_members_intersection(syn, a, b):
         syn: Synapse object
         a: Synapse Team id or name
         b: Synapse Team id or name
+        cache: TeamMemberCache to reuse members between calls.
+               Default is None, which fetches the members every call.
 
     Returns:
         Set of synapse user profiles that belong in both teams
     '''
-    uniq_teama_members = _get_team_set(syn, a)
-    uniq_teamb_members = _get_team_set(syn, b)
-    intersect_members = uniq_teama_members.intersection(uniq_teamb_members)
-    return intersect_members
+    import numpy as np
+
+    return _team_members_operation(
+        syn, a, b,
+        lambda ids_a, ids_b: np.intersect1d(ids_a, ids_b,
+                                            assume_unique=True),
+        cache=cache
+    )
 
 
-def team_members_union(syn, a, b):
+def team_members_union(syn, a, b, cache=None):
     '''
     Calculates the union between teama and teamb
 
@@ -462,48 +658,95 @@ def team_members_union(syn, a, b):
         syn: Synapse object
         a: Synapse Team id or name
         b: Synapse Team id or name
+        cache: TeamMemberCache to reuse members between calls.
+               Default is None, which fetches the members every call.
 
     Returns:
         Set of a combination of synapse user profiles from both teams
     '''
-    uniq_teama_members = _get_team_set(syn, a)
-    uniq_teamb_members = _get_team_set(syn, b)
-    union_members = uniq_teama_members.union(uniq_teamb_members)
-    return union_members
+    import numpy as np
+
+    return _team_members_operation(syn, a, b, np.union1d, cache=cache)
 
 
-def _check_date_range(date_str, start_datetime, end_datetime):
+def _datetime_to_epoch(datetime_str):
     '''
-    Helper function to check if the date is within range
+    Helper function to convert a date time bound to epoch milliseconds
     Note: the date and time is in UTC
 
     Args:
-        date_str: date string
+        datetime_str: date time in YYYY-MM-DD H:M format,
+                      example: 2019-01-01 1:00
+
+    Returns:
+        int: Epoch time in milliseconds or None if no date time is given
+    '''
+    if datetime_str is None:
+        return None
+    date_obj = datetime.datetime.strptime(datetime_str, '%Y-%m-%d %H:%M')
+    return calendar.timegm(date_obj.timetuple()) * 1000
+
+
+def get_submission_bundles(syn, evaluationid, status=None,
+                           start_datetime=None, end_datetime=None,
+                           max_workers=8):
+    '''
+    Get the submission bundles of an evaluation queue filtered by status
+    and creation date.  The filters are applied by an evaluation queue
+    query, so only the bundles of matching submissions are fetched.
+    Note: the date and time is in UTC
+
+    Args:
+        syn: Synapse object
+        evaluationid: evaluation id
+        status: Submission status or list of statuses. Default is None,
+                which gets submissions of any status.
         start_datetime: start date time in YYYY-MM-DD H:M format,
                         example: 2019-01-01 1:00
         end_datetime: end date time in YYYY-MM-DD H:M format,
                       example: 2019-01-01 23:59
+        max_workers: Number of bundles fetched at the same time
 
-    Returns:
-        boolean
-    '''
-    result = True
-    if start_datetime is not None or end_datetime is not None:
-        date_obj = datetime.datetime.strptime(date_str,
-                                              '%Y-%m-%dT%H:%M:%S.%fZ')
-        if start_datetime is not None:
-            start_obj = datetime.datetime.strptime(start_datetime,
-                                                   '%Y-%m-%d %H:%M')
-            result = date_obj >= start_obj
-        if end_datetime is not None:
-            end_obj = datetime.datetime.strptime(end_datetime,
-                                                 '%Y-%m-%d %H:%M')
-            result = date_obj <= end_obj
-    return result
+    Yields:
+        tuple: (Submission, Submission Status)
+    '''
+    statuses = [status] if status is None or isinstance(status, str) \
+        else list(status)
+    start_epoch = _datetime_to_epoch(start_datetime)
+    end_epoch = _datetime_to_epoch(end_datetime)
+    if start_epoch is None and end_epoch is None:
+        # Without a date range every bundle is needed, which the bundle
+        # listing returns a page at a time
+        for bundle_status in statuses:
+            yield from syn.getSubmissionBundles(evaluationid,
+                                                status=bundle_status)
+        return
+
+    conditions = []
+    if start_epoch is not None:
+        conditions.append(f"createdOn >= {start_epoch}")
+    if end_epoch is not None:
+        conditions.append(f"createdOn <= {end_epoch}")
+    submissionids = []
+    for bundle_status in statuses:
+        query_conditions = list(conditions)
+        if bundle_status is not None:
+            query_conditions.append(f"status == '{bundle_status}'")
+        query = (f"select objectId from evaluation_{evaluationid} "
+                 f"where {' and '.join(query_conditions)}")
+        submissionids.extend(result['objectId'] for result in
+                             evaluation_queue_query(syn, query, limit=100))
+
+    def get_bundle(submissionid):
+        return (syn.getSubmission(submissionid, downloadFile=False),
+                syn.getSubmissionStatus(submissionid))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(get_bundle, submissionids)
 
 
 def _get_contributors(syn, evaluationid, status,
-                      start_datetime, end_datetime):
+                      start_datetime, end_datetime, max_workers=1):
     '''
     Helper function to get contributors from a given evaluation id.
     Note: the date and time is in UTC
@@ -516,24 +759,29 @@ def _get_contributors(syn, evaluationid, status,
                         example: 2019-01-01 23:00
         end_datetime: end date time in YYYY-MM-DD H:M format,
                       example: 2019-01-01 23:59
+        max_workers: Number of submissions fetched at the same time
 
     Returns:
         Set of contributors' user ids
     '''
-    bundles = syn.getSubmissionBundles(evaluationid, status=status)
+    bundles = get_submission_bundles(syn, evaluationid, status=status,
+                                     start_datetime=start_datetime,
+                                     end_datetime=end_datetime,
+                                     max_workers=max_workers)
     contributors = set()
     for sub, _ in bundles:
-        if _check_date_range(sub.createdOn, start_datetime, end_datetime):
-            principalids = set(contributor['principalId']
-                               for contributor in sub.contributors)
-            contributors.update(principalids)
+        principalids = set(contributor['principalId']
+                           for contributor in sub.contributors)
+        contributors.update(principalids)
     return contributors
 
 
 def get_contributors(syn, evaluationids, status='SCORED',
-                     start_datetime=None, end_datetime=None):
+                     start_datetime=None, end_datetime=None, max_workers=8):
     '''
-    Function to get contributors from a list of evaluation ids
+    Function to get contributors from a list of evaluation ids.
+    The evaluation queues are read concurrently, sharing max_workers
+    between them.
     Note: the date and time is in UTC
 
     Args:
@@ -544,15 +792,22 @@ def get_contributors(syn, evaluationids, status='SCORED',
                         example: 2019-01-01 1:00
         end_datetime: end date time in YYYY-MM-DD H:M format,
                       example: 2019-01-01 23:59
+        max_workers: Number of requests made at the same time
 
     Returns:
         Set of contributors' user ids
     '''
     all_contributors = set()
-    for evaluationid in evaluationids:
-        contributors = _get_contributors(syn, evaluationid, status,
-                                         start_datetime, end_datetime)
-        all_contributors = all_contributors.union(contributors)
+    evaluationids = list(evaluationids)
+    queue_workers = max(1, min(max_workers, len(evaluationids)))
+    submission_workers = max(1, max_workers // queue_workers)
+    with ThreadPoolExecutor(max_workers=queue_workers) as executor:
+        futures = [executor.submit(_get_contributors, syn, evaluationid,
+                                   status, start_datetime, end_datetime,
+                                   max_workers=submission_workers)
+                   for evaluationid in evaluationids]
+        for future in futures:
+            all_contributors.update(future.result())
     return all_contributors
 
 
@@ -583,7 +838,8 @@ def download_submission(syn, submissionid, download_location=None):
     Returns:
         dict: submission json results
     '''
-    sub = syn.getSubmission(submissionid, downloadLocation=download_location)
+    sub = filestore.get_submission(syn, submissionid,
+                                   download_location=download_location)
     entity = sub['entity']
     result = {'docker_repository': sub.get("dockerRepositoryName"),
               'docker_digest': sub.get("dockerDigest"),
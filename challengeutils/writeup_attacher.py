@@ -1,52 +1,113 @@
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
 from synapseclient.annotations import to_submission_status_annotations
 from . import utils
 
+logger = logging.getLogger(__name__)
+
+WRITEUP_COLUMNS = ['writeUp', 'archivedWriteUp']
 
-def append_writeup_to_main_submission(row, syn):
+
+def _add_writeup_annotations(status, writeup, archived):
     '''
-    Helper function that appends the write up synapse id and archived
-    write up synapse id on the main submission
+    Adds the write up and archived write up annotations to a
+    submission status
 
     Args:
-        row: Dictionary row['team'], row['objectId'], row['archived'],
-             row['entityId']
-        syn: synapse object
+        status: Synapse submission status
+        writeup: Write up synapse id
+        archived: Archived write up synapse id
+
+    Returns:
+        Updated submission status
     '''
-    if pd.isnull(row['archived']):
-        print("NO WRITEUP: " + row['team'])
-    else:
-        status = syn.getSubmissionStatus(row['objectId'])
-        add_writeup_dict = {
-            'writeUp': row['entityId'], 'archivedWriteUp': row['archived']}
+    add_writeup_dict = {'writeUp': writeup, 'archivedWriteUp': archived}
+    add_writeup = to_submission_status_annotations(
+        add_writeup_dict, is_private=False)
+    return utils.update_single_submission_status(status, add_writeup)
 
-        add_writeup = to_submission_status_annotations(
-            add_writeup_dict, is_private=False)
-        new_status = utils.update_single_submission_status(
-            status, add_writeup)
-        syn.store(new_status)
 
+def _writeup_changes(submissionsdf, writeupsdf):
+    '''
+    Works out which submissions need their write up annotations updated
+
+    Args:
+        submissionsdf: Main queue submissions with objectId, team and
+                       their current writeUp and archivedWriteUp
+        writeupsdf: Validated write ups with team, entityId and archived
 
-def attach_writeup(syn, writeup_queueid, submission_queueid):
+    Returns:
+        pd.DataFrame: One row per submission with objectId, team, writeUp,
+                      archivedWriteUp and action, which is one of
+                      no_writeup, unchanged or updated
     '''
-    Attach the write up to the submission queue
+    import pandas as pd
+
+    submissionsdf = submissionsdf.reindex(
+        columns=['objectId', 'team'] + WRITEUP_COLUMNS
+    )
+    writeupsdf = writeupsdf.reindex(columns=['team', 'entityId', 'archived'])
+    merged = submissionsdf.merge(writeupsdf, on="team", how="left")
+    # A team with several write ups gets the last one, as if each
+    # write up was attached in turn
+    merged = merged.drop_duplicates("objectId", keep="last")
+
+    no_writeup = merged['archived'].isnull()
+    unchanged = ((merged['writeUp'] == merged['entityId']) &
+                 (merged['archivedWriteUp'] == merged['archived']))
+    merged['action'] = "updated"
+    merged.loc[unchanged, 'action'] = "unchanged"
+    merged.loc[no_writeup, 'action'] = "no_writeup"
+    summary = pd.DataFrame({'objectId': merged['objectId'],
+                            'team': merged['team'],
+                            'writeUp': merged['entityId'],
+                            'archivedWriteUp': merged['archived'],
+                            'action': merged['action']})
+    return summary.reset_index(drop=True)
+
+
+def attach_writeup(syn, writeup_queueid, submission_queueid, max_workers=8):
+    '''
+    Attach the write up to the submission queue.  Only submissions whose
+    write up annotations change are updated, and their statuses are
+    stored in batches.
 
     Args:
         writeup_queueid:   Write up evaluation queue id
         submission_queueid: Submission queue id
+        max_workers: Number of submission statuses fetched at the same time
+
+    Returns:
+        pd.DataFrame: Summary with objectId, team, writeUp, archivedWriteUp
+                      and action (no_writeup, unchanged or updated)
     '''
+    import pandas as pd
+
     writeups = list(utils.evaluation_queue_query(
         syn,
         "select team, entityId, archived from evaluation_{} "
         "where status == 'VALIDATED'".format(writeup_queueid)))
     submissions = list(utils.evaluation_queue_query(
         syn,
-        "select objectId, team from evaluation_{} "
+        "select objectId, team, writeUp, archivedWriteUp from evaluation_{} "
         "where status == 'SCORED'".format(submission_queueid)))
-    writeupsdf = pd.DataFrame(writeups)
-    submissionsdf = pd.DataFrame(submissions)
-    submissions_with_writeupsdf = \
-        submissionsdf.merge(writeupsdf, on="team", how="left")
+    summary = _writeup_changes(pd.DataFrame(submissions),
+                               pd.DataFrame(writeups))
+
+    for team in summary['team'][summary['action'] == "no_writeup"]:
+        logger.info("NO WRITEUP: {}".format(team))
 
-    submissions_with_writeupsdf.apply(
-        lambda row: append_writeup_to_main_submission(row, syn), axis=1)
+    updates = summary[summary['action'] == "updated"]
+    if updates.empty:
+        return summary
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        statuses = list(executor.map(syn.getSubmissionStatus,
+                                     updates['objectId']))
+    new_statuses = [
+        _add_writeup_annotations(status, writeup, archived)
+        for status, writeup, archived in zip(statuses, updates['writeUp'],
+                                             updates['archivedWriteUp'])
+    ]
+    utils.store_submission_statuses(syn, submission_queueid, new_statuses)
+    return summary
@@ -2,7 +2,9 @@
 from abc import ABCMeta, abstractmethod
 import logging
 import os
+from challengeutils.filestore import get_submission
 from challengeutils.utils import update_single_submission_status
+from .timing import StageTimer
 
 logging.basicConfig(format='%(asctime)s %(message)s')
 LOGGER = logging.getLogger(__name__)
@@ -50,6 +52,12 @@ class EvaluationQueueProcessor(metaclass=ABCMeta):
             running the processor.
         dry_run: Do not update Synapse. Default is False.
         remove_cache: Removes submission file from cache. Default is False.
+        timer: StageTimer that records how long each stage takes.
+        outbox: MessageOutbox that messages are queued to. Default is None,
+            which sends messages right away.
+        admin_digest: AdminDigest that administrator notifications are
+            added to. Default is None, which sends one message per
+            submission.
     """
     # Status of submissions to process
     _status = "RECEIVED"
@@ -58,7 +66,8 @@ class EvaluationQueueProcessor(metaclass=ABCMeta):
 
     def __init__(self, syn, evaluation, admin_user_ids=None, dry_run=False,
                  remove_cache=False, send_messages=False,
-                 notifications=True, **kwargs):
+                 notifications=True, timer=None, outbox=None,
+                 admin_digest=None, **kwargs):
         """Init EvaluationQueueProcessor
 
         Args:
@@ -73,6 +82,12 @@ class EvaluationQueueProcessor(metaclass=ABCMeta):
                            Default is False
             notifications: Send messages to admins
                            Default is True
+            timer: StageTimer to record stage timings to.
+                   Default is a new StageTimer.
+            outbox: MessageOutbox to queue messages to.
+                    Default is None, which sends messages right away.
+            admin_digest: AdminDigest to add administrator notifications
+                          to. Default is None.
         """
         self.syn = syn
         self.evaluation = syn.getEvaluation(evaluation)
@@ -81,6 +96,9 @@ class EvaluationQueueProcessor(metaclass=ABCMeta):
         self.remove_cache = remove_cache
         self.send_messages = send_messages
         self.notifications = notifications
+        self.timer = timer if timer is not None else StageTimer()
+        self.outbox = outbox
+        self.admin_digest = admin_digest
         self.kwargs = kwargs
 
     def __call__(self):
@@ -94,8 +112,11 @@ class EvaluationQueueProcessor(metaclass=ABCMeta):
         LOGGER.info("-" * 20)
         LOGGER.info(f"Evaluating {self.evaluation.name} "
                     f"({self.evaluation.id})")
-        submission_bundles = self.syn.getSubmissionBundles(self.evaluation,
-                                                           status=self._status)
+        with self.timer.span("fetch_bundles",
+                             evaluation_id=self.evaluation.id):
+            submission_bundles = list(self.syn.getSubmissionBundles(
+                self.evaluation, status=self._status
+            ))
         for submission, sub_status in submission_bundles:
             LOGGER.info(f"Interacting with submission: {submission.id}")
             # refetch the submission so that we get the file path
@@ -103,7 +124,9 @@ class EvaluationQueueProcessor(metaclass=ABCMeta):
             # getSubmissionBundles
             submission_info = self.interact_with_submission(submission)
 
-            self.store_submission_status(sub_status, submission_info)
+            with self.timer.span("store", evaluation_id=self.evaluation.id,
+                                 submission_id=submission.id):
+                self.store_submission_status(sub_status, submission_info)
 
             # Remove submission file if cache clearing is requested.
             if self.remove_cache:
@@ -111,7 +134,10 @@ class EvaluationQueueProcessor(metaclass=ABCMeta):
 
             # Notify submitter
             if not self.dry_run:
-                self.notify(submission, submission_info)
+                with self.timer.span("notify",
+                                     evaluation_id=self.evaluation.id,
+                                     submission_id=submission.id):
+                    self.notify(submission, submission_info)
 
         LOGGER.info("-" * 20)
 
@@ -134,10 +160,16 @@ class EvaluationQueueProcessor(metaclass=ABCMeta):
                    'message': 'Success!'}
         """
         # raise NotImplementedError
-        submission = self.syn.getSubmission(submission)
+        submission_id = submission.id
+        with self.timer.span("download", evaluation_id=self.evaluation.id,
+                             submission_id=submission_id):
+            submission = get_submission(self.syn, submission)
         try:
-            interaction_status = self.interaction_func(submission,
-                                                       **self.kwargs)
+            with self.timer.span("interaction_func",
+                                 evaluation_id=self.evaluation.id,
+                                 submission_id=submission_id):
+                interaction_status = self.interaction_func(submission,
+                                                           **self.kwargs)
             is_valid = interaction_status['valid']
             annotations = interaction_status['annotations']
             validation_error = None
@@ -2,6 +2,12 @@
 '''
 Message templates
 '''
+import functools
+import logging
+import string
+import time
+
+LOGGER = logging.getLogger(__name__)
 
 # Messages for challenge scoring script.
 DEFAULTS = dict(challenge_instructions_url="https://www.synapse.org/#!Synapse:{challenge_synid}",
@@ -92,6 +98,25 @@ ERROR_NOTIFICATION_TEMPLATE = """\
 {scoring_script}</p>
 """
 
+ADMIN_DIGEST_SUBJECT_TEMPLATE = "{count} submission(s) to {queue_name} need attention"
+ADMIN_DIGEST_TEMPLATE = """\
+<p>Hello Challenge Administrator,</p>
+
+<p>The scoring script for {queue_name} encountered errors with {count} submission(s):</p>
+
+{entries}
+<p>Sincerely,<br>
+{scoring_script}</p>
+"""
+ADMIN_DIGEST_ENTRY_TEMPLATE = """\
+<p>submission name: <b>{submission_name}</b><br>
+submission ID: <b>{submission_id}</b></p>
+
+<blockquote><pre>
+{message}
+</pre></blockquote>
+"""
+
 
 class DefaultFormatter(dict):
     """
@@ -104,6 +129,171 @@ class DefaultFormatter(dict):
         return '{'+key+'}'
 
 
+def _placeholder(field, conversion, format_spec):
+    """Placeholder of a field as it is written in a template"""
+    return ("{" + field + ("!" + conversion if conversion else "") +
+            (":" + format_spec if format_spec else "") + "}")
+
+
+def _format_value(value, conversion, format_spec):
+    """Format a value like str.format does for {field!conversion:spec}"""
+    if conversion == "r":
+        value = repr(value)
+    elif conversion == "a":
+        value = ascii(value)
+    elif conversion == "s":
+        value = str(value)
+    if format_spec:
+        return format(value, format_spec)
+    return str(value)
+
+
+class MessageTemplate:
+    """
+    Message template that is parsed once and then rendered in a single
+    pass.  Rendering gives the same result as filling in DEFAULTS and then
+    the message values with DefaultFormatter: placeholders without a value
+    are left in the message.  Conversions and format specs, ie. {name!r}
+    or {count:>5}, are applied to the values.
+
+    Attributes:
+        template: The template string
+        fields: Names of the placeholders left after filling in DEFAULTS
+    """
+    def __init__(self, template, defaults=None):
+        defaults = DEFAULTS if defaults is None else defaults
+        self.template = template
+        # DEFAULTS are the same for every message so they are filled in
+        # once.  Their values can have placeholders of their own.
+        formatter = string.Formatter()
+        filled = []
+        for literal, field, format_spec, conversion in \
+                formatter.parse(template):
+            filled.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            if field in defaults:
+                filled.append(_format_value(defaults[field], conversion,
+                                            format_spec))
+            else:
+                filled.append(_placeholder(field, conversion, format_spec))
+        # [(literal text, field name or None, conversion, format spec), ...]
+        self._parts = list(formatter.parse("".join(filled)))
+        self.fields = frozenset(field for _, field, _, _ in self._parts
+                                if field is not None)
+
+    def render(self, values):
+        """
+        Fill in the template
+
+        Args:
+            values: dict of placeholder values
+
+        Returns:
+            str: The message
+        """
+        rendered = []
+        append = rendered.append
+        for literal, field, format_spec, conversion in self._parts:
+            append(literal)
+            if field is None:
+                continue
+            if field in values:
+                if conversion or format_spec:
+                    append(_format_value(values[field], conversion,
+                                         format_spec))
+                else:
+                    append(str(values[field]))
+            else:
+                append(_placeholder(field, conversion, format_spec))
+        return "".join(rendered)
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_template(template, defaults):
+    """Compiled template, cached by the template and the defaults"""
+    return MessageTemplate(template, dict(defaults))
+
+
+def compile_template(template):
+    """
+    Compile a template once and reuse it for every message.  Templates are
+    compiled again when DEFAULTS change.
+
+    Args:
+        template: Template string
+
+    Returns:
+        MessageTemplate
+    """
+    return _compile_template(template, tuple(DEFAULTS.items()))
+
+
+class AdminDigest:
+    """
+    Collects the error notifications sent to challenge administrators and
+    sends them as one summary message per queue, instead of one message
+    per submission.
+
+    Attributes:
+        syn: Synapse object
+        dry_run: Print the digest instead of sending it. Default is False.
+        window: Send a queue's digest once its oldest notification is this
+                many seconds old, even if the run isn't over.
+                Default is None, which only sends on flush.
+        outbox: MessageOutbox to queue the digests to. Default is None.
+    """
+    def __init__(self, syn, dry_run=False, window=None, outbox=None):
+        self.syn = syn
+        self.dry_run = dry_run
+        self.window = window
+        self.outbox = outbox
+        # {(queue_name, userids): {'started': time, 'entries': [kwargs]}}
+        self._digests = {}
+
+    def add(self, userids, **kwargs):
+        """
+        Add a notification to the digest of its queue
+
+        Args:
+            userids: Synapse user ids of the challenge administrators
+            **kwargs: Message template values.  Must contain queue_name.
+        """
+        key = (kwargs.get('queue_name'), tuple(userids))
+        digest = self._digests.setdefault(
+            key, {'started': time.time(), 'entries': []}
+        )
+        digest['entries'].append(kwargs)
+        if (self.window is not None and
+                time.time() - digest['started'] >= self.window):
+            self._send(key)
+
+    def _send(self, key):
+        queue_name, userids = key
+        digest = self._digests.pop(key)
+        entries = digest['entries']
+        rendered = "".join(
+            compile_template(ADMIN_DIGEST_ENTRY_TEMPLATE).render(entry)
+            for entry in entries
+        )
+        # All entries of a queue share the challenge
+        kwargs = dict(entries[0])
+        kwargs.update(queue_name=queue_name, count=len(entries),
+                      entries=rendered)
+        return send_message(syn=self.syn,
+                            userids=list(userids),
+                            subject_template=ADMIN_DIGEST_SUBJECT_TEMPLATE,
+                            message_template=ADMIN_DIGEST_TEMPLATE,
+                            dry_run=self.dry_run,
+                            kwargs=kwargs,
+                            outbox=self.outbox)
+
+    def flush(self):
+        """Send the digests of all queues"""
+        for key in list(self._digests):
+            self._send(key)
+
+
 # ---------------------------------------------------------
 # functions for sending various types of messages
 # ---------------------------------------------------------
@@ -112,55 +302,68 @@ def send_message(syn,
                  subject_template,
                  message_template,
                  dry_run,
-                 kwargs):
+                 kwargs,
+                 outbox=None):
     '''
-    Sends emails to participants
+    Sends emails to participants.  If an outbox is specified, the message
+    is queued to the outbox instead of being sent right away.
     '''
-    subject = subject_template.format_map(DefaultFormatter(DEFAULTS))
-    subject = subject.format_map(DefaultFormatter(kwargs))
-    message = message_template.format_map(DefaultFormatter(DEFAULTS))
-    message = message.format_map(DefaultFormatter(kwargs))
+    subject = compile_template(subject_template).render(kwargs)
+    message = compile_template(message_template).render(kwargs)
     if dry_run:
         print("\nDry Run: would have sent:")
         print(subject)
         print("-" * 60)
         print(message)
         return None
+    if outbox is not None:
+        return outbox.put(userids, subject, message)
     response = syn.sendMessage(userIds=userids,
                                messageSubject=subject,
                                messageBody=message,
                                contentType="text/html")
-    print("sent: ", response)
+    LOGGER.debug(f"sent: {response}")
     return response
 
 
-def validation_failed(syn, userids, send_messages, dry_run, **kwargs):
+def validation_failed(syn, userids, send_messages, dry_run, outbox=None,
+                      digest=None, **kwargs):
     '''
-    Helper function to send validation failed email
+    Helper function to send validation failed email.  If a digest
+    is specified, the message is added to the digest instead.
     '''
     if send_messages:
+        if digest is not None:
+            return digest.add(userids, **kwargs)
         return send_message(syn=syn,
                             userids=userids,
                             subject_template=VALIDATION_FAILED_SUBJECT_TEMPLATE,
                             message_template=VALIDATION_FAILED_TEMPLATE,
                             dry_run=dry_run,
-                            kwargs=kwargs)
+                            kwargs=kwargs,
+                            outbox=outbox)
 
 
-def scoring_error(syn, userids, send_messages, dry_run, **kwargs):
+def scoring_error(syn, userids, send_messages, dry_run, outbox=None,
+                  digest=None, **kwargs):
     '''
-    Helper function to send scoring error email
+    Helper function to send scoring error email.  If a digest
+    is specified, the message is added to the digest instead.
     '''
     if send_messages:
+        if digest is not None:
+            return digest.add(userids, **kwargs)
         return send_message(syn,
                             userids=userids,
                             subject_template=SCORING_ERROR_SUBJECT_TEMPLATE,
                             message_template=SCORING_ERROR_TEMPLATE,
                             dry_run=dry_run,
-                            kwargs=kwargs)
+                            kwargs=kwargs,
+                            outbox=outbox)
 
 
-def validation_passed(syn, userids, acknowledge_receipt, dry_run, **kwargs):
+def validation_passed(syn, userids, acknowledge_receipt, dry_run, outbox=None,
+                      **kwargs):
     '''
     Helper function to send validation passed email
     '''
@@ -170,10 +373,12 @@ def validation_passed(syn, userids, acknowledge_receipt, dry_run, **kwargs):
                             subject_template=VALIDATION_PASSED_SUBJECT_TEMPLATE,
                             message_template=VALIDATION_PASSED_TEMPLATE,
                             dry_run=dry_run,
-                            kwargs=kwargs)
+                            kwargs=kwargs,
+                            outbox=outbox)
 
 
-def scoring_succeeded(syn, userids, send_messages, dry_run, **kwargs):
+def scoring_succeeded(syn, userids, send_messages, dry_run, outbox=None,
+                      **kwargs):
     '''
     Helper function to send scoring succeeded emails
     '''
@@ -183,10 +388,12 @@ def scoring_succeeded(syn, userids, send_messages, dry_run, **kwargs):
                             subject_template=SCORING_SUCEEDED_SUBJECT_TEMPLATE,
                             message_template=SCORING_SUCEEDED_TEMPLATE,
                             dry_run=dry_run,
-                            kwargs=kwargs)
+                            kwargs=kwargs,
+                            outbox=outbox)
 
 
-def error_notification(syn, userids, send_notifications, dry_run, **kwargs):
+def error_notification(syn, userids, send_notifications, dry_run, outbox=None,
+                       **kwargs):
     '''
     Helper function to send error notification emails
     '''
@@ -196,4 +403,5 @@ def error_notification(syn, userids, send_notifications, dry_run, **kwargs):
                             subject_template=ERROR_NOTIFICATION_SUBJECT_TEMPLATE,
                             message_template=ERROR_NOTIFICATION_TEMPLATE,
                             dry_run=dry_run,
-                            kwargs=kwargs)
+                            kwargs=kwargs,
+                            outbox=outbox)
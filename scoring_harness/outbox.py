@@ -0,0 +1,234 @@
+"""Persistent outbox for harness messages.  Messages are queued to a local
+SQLite database and sent by a background sender, so scoring doesn't wait
+on Synapse messaging and messages that fail to send are not lost."""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logging.basicConfig(format='%(asctime)s %(message)s')
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+_CREATE_TABLE = """\
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    userids TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+)
+"""
+
+
+class MessageOutbox:
+    """Queue of messages waiting to be sent
+
+    Attributes:
+        path: Path to the SQLite outbox database
+        max_workers: Number of messages sent at the same time. Default is 4.
+        retries: Number of times to try sending a message. Messages that
+                 fail more often are kept in the outbox but never sent
+                 again, see failed().  Default is 10.
+        wait: Seconds to wait before the first retry, doubled for every
+              retry after that.  Default is 3.
+    """
+    def __init__(self, path, max_workers=4, retries=10, wait=3):
+        self.path = path
+        self.max_workers = max_workers
+        self.retries = retries
+        self.wait = wait
+        self._db_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        with self._transaction() as conn:
+            conn.execute(_CREATE_TABLE)
+
+    @contextmanager
+    def _transaction(self):
+        """Connection that commits on success and is always closed"""
+        with self._db_lock:
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def put(self, userids, subject, body, content_type="text/html"):
+        """Add a message to the outbox
+
+        Args:
+            userids: List of Synapse user ids
+            subject: Message subject
+            body: Message body
+            content_type: Message content type. Default is text/html.
+
+        Returns:
+            int: Id of the queued message
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (userids, subject, body, content_type) "
+                "VALUES (?, ?, ?, ?)",
+                (json.dumps([str(userid) for userid in userids]),
+                 subject, body, content_type)
+            )
+        return cursor.lastrowid
+
+    def pending(self, due_only=False):
+        """Messages that still have to be sent
+
+        Args:
+            due_only: Only return messages whose retry wait has passed.
+                      Default is False.
+
+        Returns:
+            list: [{'id', 'userids', 'subject', 'body', 'content_type',
+                    'attempts'}, ...]
+        """
+        query = ("SELECT id, userids, subject, body, content_type, attempts "
+                 "FROM outbox WHERE attempts < ?")
+        params = [self.retries]
+        if due_only:
+            query += " AND next_attempt <= ?"
+            params.append(time.time())
+        with self._transaction() as conn:
+            rows = conn.execute(query + " ORDER BY id", params).fetchall()
+        return [{'id': row[0],
+                 'userids': json.loads(row[1]),
+                 'subject': row[2],
+                 'body': row[3],
+                 'content_type': row[4],
+                 'attempts': row[5]} for row in rows]
+
+    def failed(self):
+        """Messages that reached the number of retries and won't be sent
+
+        Returns:
+            list: [{'id', 'userids', 'subject', 'attempts', 'last_error'},
+                   ...]
+        """
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, userids, subject, attempts, last_error "
+                "FROM outbox WHERE attempts >= ? ORDER BY id",
+                (self.retries,)
+            ).fetchall()
+        return [{'id': row[0],
+                 'userids': json.loads(row[1]),
+                 'subject': row[2],
+                 'attempts': row[3],
+                 'last_error': row[4]} for row in rows]
+
+    def log_failed(self):
+        """Log the messages that won't be sent so admins can see them
+
+        Returns:
+            int: Number of failed messages
+        """
+        failed = self.failed()
+        for message in failed:
+            LOGGER.error(f"Message {message['id']} '{message['subject']}' "
+                         f"to {message['userids']} was not sent after "
+                         f"{message['attempts']} attempts: "
+                         f"{message['last_error']}")
+        return len(failed)
+
+    def _sent(self, messageid):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM outbox WHERE id = ?", (messageid,))
+
+    def _failed(self, message, error):
+        attempts = message['attempts'] + 1
+        next_attempt = time.time() + self.wait * 2 ** (attempts - 1)
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt = ?, "
+                "last_error = ? WHERE id = ?",
+                (attempts, next_attempt, str(error), message['id'])
+            )
+        if attempts >= self.retries:
+            LOGGER.error(f"Giving up sending message {message['id']} "
+                         f"after {attempts} attempts: {error}")
+
+    def drain(self, syn, due_only=True):
+        """Send the messages in the outbox
+
+        Args:
+            syn: Synapse object
+            due_only: Only send messages whose retry wait has passed.
+                      Default is True.
+
+        Returns:
+            int: Number of messages sent
+        """
+        with self._drain_lock:
+            messages = self.pending(due_only=due_only)
+            if not messages:
+                return 0
+
+            def send(message):
+                return syn.sendMessage(userIds=message['userids'],
+                                       messageSubject=message['subject'],
+                                       messageBody=message['body'],
+                                       contentType=message['content_type'])
+
+            sent = 0
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [(message, executor.submit(send, message))
+                           for message in messages]
+                for message, future in futures:
+                    try:
+                        future.result()
+                    except Exception as err:
+                        self._failed(message, err)
+                    else:
+                        self._sent(message['id'])
+                        sent += 1
+            return sent
+
+    def start(self, syn, interval=5):
+        """Start sending messages in a background thread
+
+        Args:
+            syn: Synapse object
+            interval: Seconds between checks of the outbox. Default is 5.
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.drain(syn)
+                except Exception as err:
+                    LOGGER.error(f"Error sending outbox messages: {err}")
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="message-outbox",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, syn=None):
+        """Stop the background sender
+
+        Args:
+            syn: If specified, try once more to send all pending messages
+                 before returning.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if syn is not None:
+            self.drain(syn, due_only=False)
+        self.log_failed()
@@ -31,6 +31,7 @@ class EvaluationQueueScorer(EvaluationQueueProcessor):
                                        userids=[submitterid],
                                        send_messages=self.send_messages,
                                        dry_run=self.dry_run,
+                                       outbox=self.outbox,
                                        message=message,
                                        username=submitter_name,
                                        queue_name=self.evaluation.name,
@@ -42,6 +43,8 @@ class EvaluationQueueScorer(EvaluationQueueProcessor):
                                    userids=self.admin_user_ids,
                                    send_messages=self.send_messages,
                                    dry_run=self.dry_run,
+                                   outbox=self.outbox,
+                                   digest=self.admin_digest,
                                    message=message,
                                    username="Challenge Administrator",
                                    queue_name=self.evaluation.name,
@@ -36,19 +36,25 @@ class EvaluationQueueValidator(EvaluationQueueProcessor):
                                        userids=submitterid_list,
                                        acknowledge_receipt=self.acknowledge_receipt,  # noqa pylint: disable=line-too-long
                                        dry_run=self.dry_run,
+                                       outbox=self.outbox,
                                        username=submitter_name,
                                        queue_name=self.evaluation.name,
                                        submission_id=submission.id,
                                        submission_name=submission.name,
                                        challenge_synid=self.evaluation.contentSource)  # noqa pylint: disable=line-too-long
         else:
+            # Only notifications to admins are collected into a digest
+            digest = None
             if not isinstance(error, AssertionError):
                 submitterid_list = self.admin_user_ids
                 submitter_name = "Challenge Administrator"
+                digest = self.admin_digest
             messages.validation_failed(syn=self.syn,
                                        userids=submitterid_list,
                                        send_messages=self.send_messages,
                                        dry_run=self.dry_run,
+                                       outbox=self.outbox,
+                                       digest=digest,
                                        username=submitter_name,
                                        queue_name=self.evaluation.name,
                                        submission_id=submission.id,
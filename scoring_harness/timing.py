@@ -0,0 +1,87 @@
+"""Timing of the stages a submission goes through in the scoring harness"""
+from contextlib import contextmanager
+import json
+import logging
+import os
+import time
+
+logging.basicConfig(format='%(asctime)s %(message)s')
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+METRIC_NAME = "scoring_harness_stage_seconds"
+
+
+class StageTimer:
+    """Records how long each stage of the harness takes.  Every span is
+    logged as a JSON line and added to running totals that can be written
+    out in the Prometheus text exposition format.
+
+    Attributes:
+        metrics_path: File to write Prometheus metrics to. Default is None.
+        totals: {(evaluation id, stage): [count, seconds]}
+    """
+    def __init__(self, metrics_path=None):
+        self.metrics_path = metrics_path
+        self.totals = {}
+
+    @contextmanager
+    def span(self, stage, evaluation_id=None, submission_id=None):
+        """Time the enclosed block
+
+        Args:
+            stage: Name of the stage (ie. download, store)
+            evaluation_id: Evaluation queue id
+            submission_id: Submission id
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start,
+                        evaluation_id=evaluation_id,
+                        submission_id=submission_id)
+
+    def record(self, stage, seconds, evaluation_id=None, submission_id=None):
+        """Record the duration of a stage
+
+        Args:
+            stage: Name of the stage
+            seconds: Duration in seconds
+            evaluation_id: Evaluation queue id
+            submission_id: Submission id
+        """
+        span = {'stage': stage,
+                'seconds': round(seconds, 6),
+                'evaluation_id': evaluation_id,
+                'submission_id': submission_id}
+        LOGGER.info(json.dumps(span))
+        key = (evaluation_id, stage)
+        count, total = self.totals.get(key, (0, 0.0))
+        self.totals[key] = [count + 1, total + seconds]
+
+    def to_prometheus(self):
+        """Running totals in the Prometheus text exposition format
+
+        Returns:
+            str: Prometheus metrics
+        """
+        lines = [f"# HELP {METRIC_NAME} Time spent in each stage of "
+                 "processing submissions.",
+                 f"# TYPE {METRIC_NAME} summary"]
+        for (evaluation_id, stage), (count, total) in sorted(
+                self.totals.items(), key=lambda item: str(item[0])):
+            labels = f'evaluation_id="{evaluation_id}",stage="{stage}"'
+            lines.append(f"{METRIC_NAME}_count{{{labels}}} {count}")
+            lines.append(f"{METRIC_NAME}_sum{{{labels}}} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Write the metrics file if a metrics path was given.  The file is
+        replaced atomically so a collector never reads a partial file."""
+        if self.metrics_path is None:
+            return
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, "w") as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        os.replace(tmp_path, self.metrics_path)
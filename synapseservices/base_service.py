@@ -190,3 +190,122 @@ class Service(object):
     def __ne__(self, other):
         """Returns true if both objects are not equal"""
         return not self == other
+
+
+_PRIMITIVE_TYPES = (str, int, float, bool)
+
+
+def _value_to_dict(value):
+    """Converts a model value the way Service.to_dict does"""
+    if isinstance(value, list):
+        return [x.to_dict() if hasattr(x, "to_dict") else x for x in value]
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: item.to_dict() if hasattr(item, "to_dict") else item
+                for key, item in value.items()}
+    return value
+
+
+def _converter(klass):
+    """Returns a function that deserializes a value of a model field"""
+    if klass in _PRIMITIVE_TYPES:
+        return lambda value: None if value is None \
+            else _deserialize_primitive(value, klass)
+    if isinstance(klass, ModelMeta):
+        return lambda value: None if value is None else klass.from_dict(value)
+    return lambda value: _deserialize(value, klass)
+
+
+def _compile_model(cls):
+    """Generates __init__, from_dict, to_dict and __eq__ of a model from its
+    attribute_map and openapi_types, so no reflection is needed when
+    objects are built"""
+    attrs = list(cls.attribute_map.items())
+    namespace = {'_value_to_dict': _value_to_dict}
+    init_lines = []
+    from_dict_lines = []
+    to_dict_items = []
+    for index, (attr, key) in enumerate(attrs):
+        klass = cls.openapi_types.get(attr, object)
+        init_lines.append(f"    self.{attr} = {key}")
+        if klass is object:
+            from_dict_lines.append(f"    self.{attr} = get({key!r})")
+        else:
+            namespace[f"_convert{index}"] = _converter(klass)
+            from_dict_lines.append(
+                f"    self.{attr} = _convert{index}(get({key!r}))"
+            )
+        if klass in _PRIMITIVE_TYPES:
+            to_dict_items.append(f"{attr!r}: self.{attr}")
+        else:
+            to_dict_items.append(f"{attr!r}: _value_to_dict(self.{attr})")
+    init_args = "".join(f", {key}=None" for _, key in attrs)
+    values = "".join(f"self.{attr}, " for attr, _ in attrs)
+    other_values = "".join(f"other.{attr}, " for attr, _ in attrs)
+    source = "\n".join(
+        [f"def __init__(self{init_args}):"] + (init_lines or ["    pass"]) +
+        ["def from_dict(cls, dikt):",
+         "    self = cls.__new__(cls)",
+         "    get = dikt.get"] + from_dict_lines + ["    return self"] +
+        ["def to_dict(self):",
+         f"    return {{{', '.join(to_dict_items)}}}",
+         "def __eq__(self, other):",
+         "    if other.__class__ is not self.__class__:",
+         "        return False",
+         f"    return ({values}) == ({other_values})"]
+    )
+    exec(compile(source, f"<model {cls.__name__}>", "exec"), namespace)
+    cls.__init__ = namespace['__init__']
+    cls.from_dict = classmethod(namespace['from_dict'])
+    cls.to_dict = namespace['to_dict']
+    cls.__eq__ = namespace['__eq__']
+    cls._json_attributes = {key: attr for attr, key in attrs}
+
+
+class ModelMeta(type):
+    """Builds models with __slots__ and precompiled constructors from
+    the attribute_map and openapi_types of the class"""
+    def __new__(mcs, name, bases, namespace):
+        attribute_map = namespace.get('attribute_map')
+        if attribute_map is None:
+            namespace.setdefault('__slots__', ())
+            return super().__new__(mcs, name, bases, namespace)
+        namespace['__slots__'] = tuple(attribute_map)
+        cls = super().__new__(mcs, name, bases, namespace)
+        _compile_model(cls)
+        return cls
+
+
+class Model(metaclass=ModelMeta):
+    """Base of the service models.  Subclasses set attribute_map and
+    openapi_types as class attributes.  Objects are built with the
+    Synapse JSON keys, ie. Model(**response) or Model.from_dict(response),
+    and values can be read by JSON key, ie. model['id']."""
+    # openapiTypes: The key is attribute name and the
+    # value is attribute type.
+    openapi_types = {}
+    _json_attributes = {}
+
+    def __getitem__(self, key):
+        """Gets a value by its JSON key"""
+        try:
+            attr = self._json_attributes[key]
+        except KeyError:
+            raise KeyError(key)
+        return getattr(self, attr)
+
+    def to_str(self):
+        """Returns the string representation of the model
+
+        :rtype: str
+        """
+        return pprint.pformat(self.to_dict())
+
+    def __repr__(self):
+        """For `print` and `pprint`"""
+        return self.to_str()
+
+    def __ne__(self, other):
+        """Returns true if both objects are not equal"""
+        return not self == other
@@ -1,84 +1,170 @@
-from .base_service import Service, deserialize_model
+import array
+from collections.abc import Mapping
+import datetime
+import pprint
 
+from .base_service import Model
 
-class Forum(Service):
-    def __init__(self, id=None, projectId=None, etag=None):
 
-        self.openapi_types = {
-            'id': str,
-            'projectid': str,
-            'etag': str
-        }
+class Forum(Model):
+    """Forum - The discussion forum of a Project
 
-        self.attribute_map = {
-            'id': 'id',
-            'projectid': 'projectId',
-            'etag': 'etag'
-        }
+    Args:
+        id: The ID of this Forum
+        projectId: The ID of the Project this Forum belongs to
+        etag: Synapse employs an Optimistic Concurrency Control (OCC) scheme to handle concurrent updates.
+    """
+    openapi_types = {
+        'id': str,
+        'projectid': str,
+        'etag': str
+    }
 
-        self._id = id
-        self._projectid = projectId
-        self._etag = etag
+    attribute_map = {
+        'id': 'id',
+        'projectid': 'projectId',
+        'etag': 'etag'
+    }
+
+
+def _parse_date(value):
+    """Parses a Synapse date (ie. 2019-06-27T04:01:25.000Z)"""
+    if value is None:
+        return None
+    return datetime.datetime.strptime(
+        value, '%Y-%m-%dT%H:%M:%S.%fZ'
+    ).replace(tzinfo=datetime.timezone.utc)
+
+
+def _field(key, doc):
+    """Property that reads a JSON key of the bundle"""
+    return property(lambda self: self._data.get(key), doc=doc)
+
+
+def _date_field(key, doc):
+    """Property that parses a date of the bundle when it is read"""
+    return property(lambda self: _parse_date(self._data.get(key)), doc=doc)
+
+
+class _Bundle(Mapping):
+    """Discussion bundle that keeps the JSON response and only decodes
+    fields when they are read.  Values can be read as attributes or by
+    JSON key like the response dict, ie. bundle['id'], and bundles are
+    read-only mappings of the JSON keys, so dict(bundle) is the response."""
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
 
     @classmethod
-    def from_dict(cls, dikt) -> 'Forum':
-        """Returns the dict as a model
-        :param dikt: A dict.
-        :type: dict
-        :return: The Activity of this Activity.  # noqa: E501
-        :rtype: Activity
-        """
-        return deserialize_model(dikt, cls)
+    def from_dict(cls, dikt):
+        """Returns the dict as a model"""
+        return cls(dikt)
 
-    @property
-    def id(self):
-        """Gets the id of this Activity.
-        :return: The id of this Activity.
-        :rtype: str
-        """
-        return self._id
-
-    @id.setter
-    def id(self, id):
-        """Sets the id of this Activity.
-        :param id: The id of this Activity.
-        :type id: str
-        """
-
-        self._id = id
+    def __getitem__(self, key):
+        return self._data[key]
 
-    @property
-    def projectid(self):
-        """Gets the name of this Activity.
-        :return: The name of this Activity.
-        :rtype: str
-        """
-        return self._projectid
-
-    @projectid.setter
-    def projectid(self, projectid):
-        """Sets the name of this Activity.
-        :param name: The name of this Activity.
-        :type name: str
-        """
-        if projectid is None:
-            raise ValueError("Invalid value for `projectid`, must not be `None`")  # noqa: E501
-
-        self._projectid = projectid
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def to_dict(self):
+        """Returns the JSON response of the bundle"""
+        return dict(self._data)
+
+    def __eq__(self, other):
+        """Bundles are equal to mappings with the same JSON"""
+        if not isinstance(other, Mapping):
+            return False
+        return self.to_dict() == dict(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return pprint.pformat(self.to_dict())
+
+
+class Thread(_Bundle):
+    """DiscussionThreadBundle - A thread of a forum.  The active authors are
+    kept as an array of user ids and dates are parsed when they are read.
+    https://rest-docs.synapse.org/rest/org/sagebionetworks/repo/model/discussion/DiscussionThreadBundle.html
+    """
+    __slots__ = ('_active_authors',)
+
+    def __init__(self, data):
+        authors = data.get('activeAuthors')
+        if authors is not None:
+            data = {key: value for key, value in data.items()
+                    if key != 'activeAuthors'}
+            authors = array.array('q', map(int, authors))
+        super().__init__(data)
+        self._active_authors = authors
+
+    id = _field('id', "The ID of this thread")
+    forum_id = _field('forumId', "The ID of the forum of this thread")
+    project_id = _field('projectId', "The ID of the project of this thread")
+    title = _field('title', "The title of this thread")
+    created_by = _field('createdBy', "The user ID of the thread author")
+    etag = _field('etag', "The etag of this thread")
+    message_key = _field('messageKey', "The key of the thread message")
+    number_of_views = _field('numberOfViews', "Number of views")
+    number_of_replies = _field('numberOfReplies', "Number of replies")
+    is_edited = _field('isEdited', "Whether the thread was edited")
+    is_deleted = _field('isDeleted', "Whether the thread was deleted")
+    is_pinned = _field('isPinned', "Whether the thread is pinned")
+    created_on = _date_field('createdOn', "When the thread was created")
+    modified_on = _date_field('modifiedOn',
+                              "When the thread was last modified")
+    last_activity = _date_field('lastActivity',
+                                "When the thread was last replied to")
 
     @property
-    def etag(self):
-        """Gets the description of this Activity.
-        :return: The description of this Activity.
-        :rtype: str
-        """
-        return self._etag
-
-    @etag.setter
-    def etag(self, etag):
-        """Sets the description of this Activity.
-        :param description: The description of this Activity.
-        :type description: str
-        """
-
-        self._etag = etag
+    def active_authors(self):
+        """User ids of the active authors as an array of integers"""
+        return self._active_authors
+
+    def __getitem__(self, key):
+        if key == 'activeAuthors':
+            if self._active_authors is None:
+                raise KeyError(key)
+            return [str(author) for author in self._active_authors]
+        return self._data[key]
+
+    def __iter__(self):
+        yield from self._data
+        if self._active_authors is not None:
+            yield 'activeAuthors'
+
+    def __len__(self):
+        return len(self._data) + (self._active_authors is not None)
+
+    def to_dict(self):
+        """Returns the JSON response of the thread"""
+        dikt = dict(self._data)
+        if self._active_authors is not None:
+            dikt['activeAuthors'] = self['activeAuthors']
+        return dikt
+
+
+class Reply(_Bundle):
+    """DiscussionReplyBundle - A reply to a thread.  Dates are parsed when
+    they are read.
+    https://rest-docs.synapse.org/rest/org/sagebionetworks/repo/model/discussion/DiscussionReplyBundle.html
+    """
+    __slots__ = ()
+
+    id = _field('id', "The ID of this reply")
+    thread_id = _field('threadId', "The ID of the thread of this reply")
+    forum_id = _field('forumId', "The ID of the forum of this reply")
+    project_id = _field('projectId', "The ID of the project of this reply")
+    created_by = _field('createdBy', "The user ID of the reply author")
+    etag = _field('etag', "The etag of this reply")
+    message_key = _field('messageKey', "The key of the reply message")
+    is_edited = _field('isEdited', "Whether the reply was edited")
+    is_deleted = _field('isDeleted', "Whether the reply was deleted")
+    created_on = _date_field('createdOn', "When the reply was created")
+    modified_on = _date_field('modifiedOn',
+                              "When the reply was last modified")
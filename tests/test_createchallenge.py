@@ -194,14 +194,40 @@ def test__create_teams():
              mock.call(SYN, team_prereg,
                        'Challenge Pre-registration Team',
                        can_public_join=True)]
-    with patch.object(createchallenge, "create_team",
+    with patch.object(createchallenge, "_get_existing_team",
+                      return_value=None) as patch_get,\
+         patch.object(createchallenge, "_store_team",
                       return_value={'id': 'syn1234'}) as patch_create:
         team_map = createchallenge._create_teams(SYN, challenge_name)
         assert team_map == {'team_part_id': 'syn1234',
                             'team_admin_id': 'syn1234',
                             'team_prereg_id': 'syn1234',
                             'team_org_id': 'syn1234'}
-        patch_create.assert_has_calls(calls)
+        patch_create.assert_has_calls(calls, any_order=True)
+        assert patch_get.call_count == 4
+
+
+def test_existing__create_teams():
+    """Existing teams are confirmed and not created again"""
+    challenge_name = str(uuid.uuid1())
+
+    def get_team(syn, name):
+        if name.endswith("Admin"):
+            return {'id': '1', 'name': name}
+        return None
+
+    with patch.object(createchallenge, "_get_existing_team",
+                      side_effect=get_team),\
+         patch.object(createchallenge, "_store_team",
+                      return_value={'id': '2'}) as patch_create,\
+         patch("builtins.input", return_value="y") as patch_input:
+        team_map = createchallenge._create_teams(SYN, challenge_name)
+        assert team_map == {'team_part_id': '2',
+                            'team_admin_id': '1',
+                            'team_prereg_id': '2',
+                            'team_org_id': '2'}
+        assert patch_create.call_count == 3
+        patch_input.assert_called_once()
 
 
 def test_livesitenone_main():
@@ -223,18 +249,20 @@ def test_livesitenone_main():
     wiki = synapseclient.Wiki(title='', owner=proj,
                               markdown='')
     # Mock calls
-    admin_permission_call = mock.call(SYN, proj, team_map['team_admin_id'],
-                                      permission_level="admin")
-    org_permission_call = mock.call(SYN, proj, team_map['team_org_id'],
-                                    permission_level="download")
-    org_permission_edit = mock.call(SYN, proj, team_map['team_org_id'],
-                                    permission_level="edit")
+    live_permission_call = mock.call(
+        SYN, [(proj, team_map['team_admin_id'], "admin"),
+              (proj, team_map['team_org_id'], "download")]
+    )
+    staging_permission_call = mock.call(
+        SYN, [(proj, team_map['team_admin_id'], "admin"),
+              (proj, team_map['team_org_id'], "edit")]
+    )
     with patch.object(createchallenge, "_create_teams",
                       return_value=team_map) as patch_create_team,\
          patch.object(createchallenge, "create_project",
                       return_value=proj) as patch_create_proj,\
          patch.object(permissions,
-                      "set_entity_permissions") as patch_set_perms,\
+                      "set_bulk_permissions") as patch_set_perms,\
          patch.object(createchallenge, "create_challenge_widget",
                       return_value=challenge_obj) as patch_create_chal,\
          patch.object(createchallenge,
@@ -248,10 +276,10 @@ def test_livesitenone_main():
                       return_value=wiki),\
          patch.object(SYN, "store"):
         createchallenge.main(SYN, challenge_name, live_site=None)
-        patch_set_perms.assert_has_calls([admin_permission_call,
-                                          org_permission_call,
-                                          admin_permission_call,
-                                          org_permission_edit])
+        # The live and staging projects are set up concurrently
+        patch_set_perms.assert_has_calls([live_permission_call,
+                                          staging_permission_call],
+                                         any_order=True)
         assert patch_create_proj.call_count == 2
 
         patch_create_chal.assert_called_once_with(SYN, proj,
@@ -290,7 +318,7 @@ def test_livesite_main():
                       return_value=proj) as patch_create_proj,\
          patch.object(SYN, "get", return_value=proj),\
          patch.object(permissions,
-                      "set_entity_permissions") as patch_set_perms,\
+                      "set_bulk_permissions") as patch_set_perms,\
          patch.object(createchallenge, "create_challenge_widget",
                       return_value=challenge_obj),\
          patch.object(createchallenge, "create_evaluation_queue"),\
@@ -303,7 +331,7 @@ def test_livesite_main():
          patch.object(SYN, "store"):
         components = createchallenge.main(SYN, challenge_name,
                                           live_site="syn123")
-        assert patch_set_perms.call_count == 2
+        patch_set_perms.assert_called_once()
         assert patch_create_proj.call_count == 1
         assert components == {"live_projectid": proj.id,
                               "staging_projectid": proj.id,
@@ -311,3 +339,135 @@ def test_livesite_main():
                               "organizer_teamid": '4567',
                               "participant_teamid": '1234',
                               "preregistrantrant_teamid": '3456'}
+
+
+def test_nothingexists_plan():
+    """Every component is missing for a new challenge"""
+    with patch.object(SYN, "getTeam", side_effect=ValueError),\
+         patch.object(SYN, "findEntityId", return_value=None),\
+         patch.object(SYN, "getEvaluationByName",
+                      side_effect=SynapseHTTPError):
+        challenge_plan = createchallenge.plan(SYN, "foo")
+    assert challenge_plan['missing'] == sorted(
+        challenge_plan['components']
+    )
+    assert set(challenge_plan['components']) == {
+        'team_part_id', 'team_admin_id', 'team_org_id', 'team_prereg_id',
+        'live_projectid', 'staging_projectid', 'queueid', 'challengeid',
+        'live_wiki', 'staging_wiki', 'live_permissions',
+        'staging_permissions', 'staging_wiki_rewritten'
+    }
+
+
+def test_state_plan(tmpdir):
+    """Components recorded in the state file are looked up by id"""
+    state_path = str(tmpdir.join("state.json"))
+    components = {'team_part_id': '1', 'team_admin_id': '2',
+                  'team_org_id': '3', 'team_prereg_id': '4',
+                  'live_projectid': 'syn1', 'staging_projectid': 'syn2',
+                  'queueid': '5', 'challengeid': '6', 'live_wiki': True,
+                  'staging_wiki': True, 'live_permissions': 'syn1',
+                  'staging_permissions': 'syn2',
+                  'staging_wiki_rewritten': 'syn2'}
+    createchallenge._save_state(state_path, {'challenge_name': 'foo',
+                                             'components': components})
+    with patch.object(SYN, "getTeam",
+                      side_effect=lambda teamid: {'id': teamid}),\
+         patch.object(SYN, "get",
+                      side_effect=lambda synid, downloadFile: {'id': synid}),\
+         patch.object(SYN, "getEvaluationByName", return_value={'id': '5'}),\
+         patch.object(utils, "get_challenge", return_value={'id': '6'}),\
+         patch.object(SYN, "getWiki", return_value={'id': '7'}),\
+         patch.object(SYN, "getWikiHeaders", return_value=[{'id': '7'}]),\
+         patch.object(SYN, "findEntityId") as patch_find:
+        challenge_plan = createchallenge.plan(SYN, "foo",
+                                              state_path=state_path)
+    assert challenge_plan['missing'] == []
+    assert challenge_plan['components'] == components
+    patch_find.assert_not_called()
+
+
+def test_apply(tmpdir):
+    """Only missing components are created and the state is saved"""
+    state_path = str(tmpdir.join("state.json"))
+    components = {'team_part_id': '1', 'team_admin_id': None,
+                  'team_org_id': '3', 'team_prereg_id': '4',
+                  'live_projectid': 'syn1', 'staging_projectid': None,
+                  'queueid': '5', 'challengeid': '6', 'live_wiki': True,
+                  'staging_wiki': None, 'live_permissions': 'syn1',
+                  'staging_permissions': None,
+                  'staging_wiki_rewritten': None}
+    challenge_plan = {'challenge_name': 'foo', 'live_site': None,
+                      'components': components, 'missing': []}
+    staging = synapseclient.Project("foo - staging", id="syn2")
+    with patch.object(createchallenge, "_store_team",
+                      return_value={'id': '2'}) as patch_team,\
+         patch.object(createchallenge, "create_project",
+                      return_value=staging) as patch_project,\
+         patch.object(permissions,
+                      "set_bulk_permissions") as patch_set_perms,\
+         patch.object(createchallenge,
+                      "create_challenge_widget") as patch_challenge,\
+         patch.object(synapseutils, "copyWiki",
+                      return_value=[{'id': '7'}]) as patch_copy,\
+         patch.object(createchallenge,
+                      "_rewrite_staging_wiki") as patch_rewrite,\
+         patch.object(SYN, "getWikiHeaders", return_value=[{'id': '7'}]):
+        result = createchallenge.apply(SYN, challenge_plan,
+                                       state_path=state_path)
+    patch_team.assert_called_once_with(SYN, 'foo Admin',
+                                       'Challenge Admin Team',
+                                       can_public_join=False)
+    patch_project.assert_called_once_with(SYN, 'foo - staging')
+    patch_set_perms.assert_called_once_with(SYN, [("syn2", '2', "admin"),
+                                                  ("syn2", '3', "edit")])
+    patch_challenge.assert_not_called()
+    patch_copy.assert_called_once_with(
+        SYN, createchallenge.DREAM_CHALLENGE_TEMPLATE_SYNID, "syn2"
+    )
+    patch_rewrite.assert_called_once_with(SYN, "syn2", [{'id': '7'}], '6',
+                                          '1', 'foo', 'syn1')
+    assert result['staging_projectid'] == "syn2"
+    assert result['admin_teamid'] == "2"
+    state = createchallenge._load_state(state_path)
+    assert all(value is not None
+               for value in state['components'].values())
+
+
+def test_failure_apply(tmpdir):
+    """Components created before a failure in the same stage are saved"""
+    state_path = str(tmpdir.join("state.json"))
+    components = {'team_part_id': '1', 'team_admin_id': '2',
+                  'team_org_id': '3', 'team_prereg_id': '4',
+                  'live_projectid': 'syn1', 'staging_projectid': 'syn2',
+                  'queueid': '5', 'challengeid': '6', 'live_wiki': True,
+                  'staging_wiki': None, 'live_permissions': 'syn1',
+                  'staging_permissions': None,
+                  'staging_wiki_rewritten': None}
+    challenge_plan = {'challenge_name': 'foo', 'live_site': None,
+                      'components': components, 'missing': []}
+    with patch.object(permissions, "set_bulk_permissions"),\
+         patch.object(synapseutils, "copyWiki",
+                      side_effect=ValueError("copy failed")),\
+         pytest.raises(ValueError, match="copy failed"):
+        createchallenge.apply(SYN, challenge_plan, state_path=state_path)
+    state = createchallenge._load_state(state_path)
+    assert state['components']['staging_permissions'] == 'syn2'
+    assert state['components']['staging_wiki'] is None
+
+
+def test__rewrite_staging_wiki():
+    """Only pages with placeholders are stored"""
+    pages = {'1': synapseclient.Wiki(owner="syn2", id='1',
+                                     markdown="teamId=0 {challengeName}"),
+             '2': synapseclient.Wiki(owner="syn2", id='2',
+                                     markdown="nothing to replace")}
+    with patch.object(SYN, "getWiki",
+                      side_effect=lambda owner, pageid: pages[pageid]),\
+         patch.object(SYN, "store",
+                      side_effect=lambda wiki: wiki) as patch_store:
+        stored = createchallenge._rewrite_staging_wiki(
+            SYN, "syn2", [{'id': '1'}, {'id': '2'}], "9", "3", "foo", "syn1"
+        )
+    patch_store.assert_called_once_with(pages['1'])
+    assert stored[0].markdown == "teamId=3 foo"
@@ -10,7 +10,7 @@ import synapseclient
 
 from challengeutils import discussion
 from challengeutils.discussion import DiscussionApi
-from synapseservices.discussion import Forum
+from synapseservices.discussion import Forum, Thread
 
 syn = mock.create_autospec(synapseclient.Synapse)
 api = DiscussionApi(syn)
@@ -101,9 +101,8 @@ def test_get_thread_replies():
             '/thread/{threadid}/replies?filter={query_filter}'.format(
                 threadid=222, query_filter="EXCLUDE_DELETED"),
             limit=20, offset=0)
-        # Although actual return isn't a string, this test just makes sure that
-        # that the result from _GET_Paginated is returned
-        assert replies == response
+        # Replies are wrapped in models equal to the JSON responses
+        assert list(replies) == response
 
 
 def test__get_text():
@@ -152,7 +151,7 @@ def test_get_thread_reply_text():
 
 def test_get_forum_participants():
     '''Test get forum participants'''
-    threads = [THREAD_OBJ]
+    threads = [Thread.from_dict(THREAD_OBJ)]
     profile = synapseclient.UserProfile(ownerId="test")
     with mock.patch.object(discussion,
                            "get_forum_threads",
@@ -206,9 +205,8 @@ def test_get_entity_threads():
         entity_threads = api.get_threads_referencing_entity(PROJECTID)
         uri = "/entity/{entityid}/threads".format(entityid=PROJECTID)
         patch_syn_get.assert_called_once_with(uri, limit=20, offset=0)
-        # Although actual return isn't a string, this test just makes sure that
-        # that the result from _GET_Paginated is returned
-        assert entity_threads == response
+        # Threads are wrapped in models equal to the JSON responses
+        assert list(entity_threads) == response
 
 
 def test_copy_thread():
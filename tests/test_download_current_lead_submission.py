@@ -97,4 +97,114 @@ def test_invalid_download_current_lead_sub():
     dl_file = dl_cur.download_current_lead_sub(SYN, SUBMISSIONID,
                                                "INVALID", "key",
                                                verbose=False)
-    assert dl_file is None
\ No newline at end of file
+    assert dl_file is None
+
+def _row(objectid, submitterid, created_on, modified_on, met_cutoff=True):
+    """Evaluation query row"""
+    return {'objectId': objectid, 'submitterId': submitterid,
+            'createdOn': str(created_on), 'modifiedOn': str(modified_on),
+            'prediction_file_status': 'SCORED',
+            'key': 'true' if met_cutoff else 'false'}
+
+
+def test_lead_submission_index_refresh(tmpdir):
+    """Index keeps the latest lead and only queries modified submissions"""
+    cache_dir = str(tmpdir)
+    rows = [_row("1", "5", 100, 100), _row("2", "5", 200, 200),
+            _row("3", "6", 150, 150, met_cutoff=False)]
+    with patch.object(utils, "evaluation_queue_query",
+                      return_value=rows) as patch_query:
+        index = dl_cur.LeadSubmissionIndex(SYN, QUEUEID, "key", cache_dir)
+        index.refresh()
+        assert "modifiedOn > 0" in patch_query.call_args[0][1]
+    assert index.lead_submission("5") == "2"
+    assert index.lead_submission("6") is None
+
+    # A new index reads the saved index and only asks for changes
+    with patch.object(utils, "evaluation_queue_query",
+                      return_value=[]) as patch_query:
+        index = dl_cur.LeadSubmissionIndex(SYN, QUEUEID, "key", cache_dir)
+        index.refresh()
+        assert "modifiedOn > 200" in patch_query.call_args[0][1]
+    assert index.lead_submission("5") == "2"
+
+
+def test_lead_submission_index_lead_removed(tmpdir):
+    """Lead is looked up again if it no longer meets the cutoff"""
+    index = dl_cur.LeadSubmissionIndex(SYN, QUEUEID, "key", str(tmpdir))
+    index.index['leads'] = {"5": {'objectId': "2", 'createdOn': 200}}
+    with patch.object(utils, "evaluation_queue_query",
+                      side_effect=[[_row("2", "5", 200, 300,
+                                         met_cutoff=False)],
+                                   [{'objectId': "1", 'createdOn': "100"}]]):
+        index.refresh()
+    assert index.lead_submission("5") == "1"
+
+
+def test_lead_submission_index_download_once(tmpdir):
+    """Lead file is only downloaded when the lead changes"""
+    index = dl_cur.LeadSubmissionIndex(SYN, QUEUEID, "key", str(tmpdir))
+    index.index['leads'] = {"5": {'objectId': "2", 'createdOn': 200}}
+    lead_file = tmpdir.join("lead.csv")
+    lead_file.write("foo")
+    submission = synapseclient.Submission(evaluationId='2', entityId='2',
+                                          versionNumber='3',
+                                          filePath=str(lead_file))
+    download_path = str(tmpdir.join(dl_cur.LEAD_FILENAME))
+    with patch.object(dl_cur.filestore, "get_submission",
+                      return_value=submission) as patch_get:
+        assert index.download_lead("5", download_path) == download_path
+        assert index.download_lead("5", download_path) == download_path
+        patch_get.assert_called_once()
+    with open(download_path) as lead:
+        assert lead.read() == "foo"
+    assert index.download_lead("6", download_path) is None
+
+
+def test_lead_submission_index_remove_old_leads(tmpdir):
+    """Only the current lead file is kept in the index's store"""
+    download_path = str(tmpdir.join(dl_cur.LEAD_FILENAME))
+
+    def get_submission(syn, objectid, store):
+        stored_path = store.path_of({'id': objectid, 'contentMd5': 'md5',
+                                     'fileName': 'lead.csv'})
+        os.makedirs(os.path.dirname(stored_path))
+        with open(stored_path, "w") as stored:
+            stored.write(objectid)
+        return synapseclient.Submission(evaluationId='2', entityId='2',
+                                        versionNumber='3',
+                                        filePath=stored_path)
+
+    with patch.dict(os.environ, clear=True),\
+         patch.object(dl_cur.filestore, "get_submission",
+                      side_effect=get_submission):
+        index = dl_cur.LeadSubmissionIndex(SYN, QUEUEID, "key", str(tmpdir))
+        for objectid in ("1", "2", "3"):
+            index.index['leads'] = {"5": {'objectId': objectid,
+                                          'createdOn': int(objectid)}}
+            index.download_lead("5", download_path)
+    stored = [os.path.join(root, filename)
+              for root, _, filenames in os.walk(index.store.root)
+              for filename in filenames]
+    assert stored == [index.index['files']["3"]]
+    with open(download_path) as lead:
+        assert lead.read() == "3"
+
+
+def test_cache_dir_download_current_lead_sub(tmpdir):
+    """Lead submission is found through the index with a cache dir"""
+    submission = synapseclient.Submission(evaluationId='2', entityId='2',
+                                          versionNumber='3', userId='5')
+    with patch.object(SYN, "getSubmission", return_value=submission),\
+         patch.object(dl_cur.LeadSubmissionIndex, "refresh") as patch_refresh,\
+         patch.object(dl_cur.LeadSubmissionIndex, "download_lead",
+                      return_value="path") as patch_download,\
+         patch.object(dl_cur, "get_submitterid_from_submission_id") \
+            as patch_getsubmitter:
+        dl_file = dl_cur.download_current_lead_sub(SYN, SUBMISSIONID,
+                                                   "VALIDATED", "key",
+                                                   cache_dir=str(tmpdir))
+        patch_refresh.assert_called_once_with()
+        patch_download.assert_called_once_with('5', verbose=False)
+        patch_getsubmitter.assert_not_called()
+        assert dl_file == "path"
@@ -0,0 +1,124 @@
+"""Test the content-addressed submission file store"""
+import json
+import os
+import time
+
+import mock
+from mock import patch
+import pytest
+import synapseclient
+
+from challengeutils import filestore
+
+SYN = mock.create_autospec(synapseclient.Synapse)
+
+
+def _submission(subid, handleid, md5, filename="pred.csv"):
+    """Submission of a File with its entity bundle"""
+    bundle = {'entity': {'dataFileHandleId': handleid},
+              'fileHandles': [{'id': handleid, 'fileName': filename,
+                               'contentMd5': md5}]}
+    return synapseclient.Submission(id=subid, evaluationId="1",
+                                    entityId="syn1", versionNumber=1,
+                                    entityBundleJSON=json.dumps(bundle))
+
+
+def _fake_get_submission(submissions):
+    """getSubmission that writes the file when downloading"""
+    def get_submission(subid, downloadFile=True, downloadLocation=None):
+        sub = synapseclient.Submission(**submissions[subid])
+        if downloadFile:
+            filepath = os.path.join(downloadLocation, "pred.csv")
+            with open(filepath, "w") as sub_file:
+                sub_file.write(subid * 10)
+            sub.filePath = filepath
+        return sub
+    return get_submission
+
+
+@pytest.fixture
+def store(tmpdir):
+    """File store in a temporary directory"""
+    return filestore.SubmissionFileStore(str(tmpdir.join("store")))
+
+
+def test_submission_file_handle():
+    """File handle is found in the entity bundle"""
+    sub = _submission("1", "9", "abc")
+    assert filestore.submission_file_handle(sub) == {
+        'id': '9', 'fileName': 'pred.csv', 'contentMd5': 'abc'
+    }
+    docker_sub = synapseclient.Submission(id="1", evaluationId="1",
+                                          entityId="syn1", versionNumber=1)
+    assert filestore.submission_file_handle(docker_sub) is None
+
+
+def test_downloaded_once(store, tmpdir):
+    """Files are downloaded once and then hardlinked"""
+    submissions = {"1": _submission("1", "9", "abc")}
+    download_location = str(tmpdir.mkdir("download"))
+    with patch.object(SYN, "getSubmission",
+                      side_effect=_fake_get_submission(submissions)) as patch_get:
+        first = store.get_submission(SYN, "1")
+        second = store.get_submission(SYN, "1",
+                                      download_location=download_location)
+        downloads = [call for call in patch_get.call_args_list
+                     if call[1].get('downloadLocation') is not None]
+        assert len(downloads) == 1
+    assert first.filePath == store.path_of(
+        {'id': '9', 'contentMd5': 'abc', 'fileName': 'pred.csv'}
+    )
+    assert not os.access(first.filePath, os.W_OK) or os.geteuid() == 0
+    assert second.filePath == os.path.join(download_location, "pred.csv")
+    assert os.path.samefile(first.filePath, second.filePath)
+
+
+def test_evict_least_recently_used(tmpdir):
+    """Least recently used files are removed past the size limit"""
+    store = filestore.SubmissionFileStore(str(tmpdir.join("store")),
+                                          max_bytes=15)
+    submissions = {"1": _submission("1", "1", "a"),
+                   "2": _submission("2", "2", "b")}
+    with patch.object(SYN, "getSubmission",
+                      side_effect=_fake_get_submission(submissions)):
+        first = store.get_submission(SYN, "1")
+        # Make sure modification times differ
+        os.utime(first.filePath, (time.time() - 10, time.time() - 10))
+        second = store.get_submission(SYN, "2")
+    assert not os.path.exists(first.filePath)
+    assert os.path.exists(second.filePath)
+
+
+def test_remove(store, tmpdir):
+    """Removed files are gone from the store, but not their hardlinks"""
+    submissions = {"1": _submission("1", "9", "abc")}
+    download_location = str(tmpdir.mkdir("download"))
+    with patch.object(SYN, "getSubmission",
+                      side_effect=_fake_get_submission(submissions)):
+        sub = store.get_submission(SYN, "1",
+                                   download_location=download_location)
+    stored_path = store.path_of({'id': '9', 'contentMd5': 'abc',
+                                 'fileName': 'pred.csv'})
+    store.remove(stored_path)
+    store.remove(sub.filePath)
+    assert not os.path.exists(os.path.dirname(stored_path))
+    assert os.path.exists(sub.filePath)
+
+
+def test_get_submission_no_store():
+    """Without a store, submissions are downloaded as usual"""
+    with patch.dict(os.environ, {}, clear=True),\
+         patch.object(SYN, "getSubmission") as patch_get:
+        filestore.get_submission(SYN, "1", download_location="foo")
+        patch_get.assert_called_once_with("1", downloadLocation="foo")
+
+
+def test_default_store(tmpdir):
+    """Store is configured by environment variables"""
+    root = str(tmpdir.join("store"))
+    with patch.dict(os.environ, {filestore.STORE_ENV: root,
+                                 filestore.STORE_MAX_BYTES_ENV: "100"}):
+        store = filestore.default_store()
+        assert store.root == root
+        assert store.max_bytes == 100
+        assert filestore.default_store() is store
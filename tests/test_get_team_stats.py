@@ -31,14 +31,6 @@ syn = mock.create_autospec(synapseclient.Synapse)
 syn.getTeamMembers.side_effect = get_team_member_results
 
 
-def test__get_team_set():
-    with mock.patch.object(syn, "getTeamMembers", return_value=members1)\
-         as patch_syn_get_team_members:
-        members_set = challengeutils.utils._get_team_set(syn, 1)
-        assert members_set == set([member1, member2, member3, member4])
-        patch_syn_get_team_members.assert_called_once_with(1)
-
-
 def test_team_members_diff():
     assert challengeutils.utils.team_members_diff(syn, 1, 2) == \
         set([member4, member3])
@@ -52,3 +44,34 @@ def test_team_members_intersection():
 def test_team_members_union():
     assert challengeutils.utils.team_members_union(syn, 1, 2) == \
         set([member1, member2, member3, member4, member5, member6])
+
+
+def test_uncached_team_members():
+    with mock.patch.object(syn, "getTeamMembers",
+                           side_effect=get_team_member_results)\
+         as patch_syn_get_team_members:
+        challengeutils.utils.team_members_diff(syn, 1, 2)
+        challengeutils.utils.team_members_union(syn, 1, 2)
+        assert patch_syn_get_team_members.call_count == 4
+
+
+def test_cached_team_members():
+    cache = challengeutils.utils.TeamMemberCache()
+    with mock.patch.object(syn, "getTeamMembers",
+                           side_effect=get_team_member_results)\
+         as patch_syn_get_team_members:
+        challengeutils.utils.team_members_diff(syn, 1, 2, cache=cache)
+        challengeutils.utils.team_members_union(syn, 1, 2, cache=cache)
+        assert patch_syn_get_team_members.call_count == 2
+        cache.invalidate(1)
+        challengeutils.utils.team_members_union(syn, 1, 2, cache=cache)
+        assert patch_syn_get_team_members.call_count == 3
+
+
+def test_expired_team_members():
+    cache = challengeutils.utils.TeamMemberCache(ttl=0)
+    with mock.patch.object(syn, "getTeamMembers", return_value=members1)\
+         as patch_syn_get_team_members:
+        cache.get(syn, 1)
+        cache.get(syn, 1)
+        assert patch_syn_get_team_members.call_count == 2
@@ -1,6 +1,10 @@
 '''
 Test challengeutils helper functions
 '''
+import hashlib
+import json
+import os
+
 import mock
 from mock import patch
 import pytest
@@ -38,6 +42,13 @@ def test_greaterthan0quota_kill_docker_submission_over_quota():
                                                   quota=-1)
 
 
+QUERY = (f"select objectId, {helpers.WORKFLOW_LAST_UPDATED_KEY}, "
+         f"{helpers.WORKFLOW_START_KEY} from evaluation_{EVALUATION_ID} "
+         "where status == 'EVALUATION_IN_PROGRESS'")
+STATUS_URI = (f"/evaluation/{EVALUATION_ID}/submission/status/all"
+              "?status=EVALUATION_IN_PROGRESS")
+
+
 def test_noquota_kill_docker_submission_over_quota():
     '''
     Time remaining annotation should not be added
@@ -45,18 +56,16 @@ def test_noquota_kill_docker_submission_over_quota():
     '''
     with patch.object(utils, "evaluation_queue_query",
                       return_value=[DOCKER_SUB_ANNOTATION]) as patch_query,\
-         patch.object(SYN,
-                      "getSubmissionStatus") as patch_getstatus,\
+         patch.object(SYN, "_GET_paginated") as patch_getstatus,\
          patch.object(utils,
                       "update_single_submission_status") as patch_update, \
-         patch.object(SYN, "store") as patch_synstore:
-        helpers.kill_docker_submission_over_quota(SYN, EVALUATION_ID)
-        query = ("select * from evaluation_{} where "
-                 "status == 'EVALUATION_IN_PROGRESS'").format(EVALUATION_ID)
-        patch_query.assert_called_once_with(SYN, query)
+         patch.object(utils, "store_submission_statuses") as patch_store:
+        killed = helpers.kill_docker_submission_over_quota(SYN, EVALUATION_ID)
+        patch_query.assert_called_once_with(SYN, QUERY, limit=100)
         patch_getstatus.assert_not_called()
         patch_update.assert_not_called()
-        patch_synstore.assert_not_called()
+        patch_store.assert_not_called()
+        assert killed == []
 
 
 def test_notdocker_kill_docker_submission_over_quota():
@@ -67,18 +76,15 @@ def test_notdocker_kill_docker_submission_over_quota():
     '''
     with patch.object(utils, "evaluation_queue_query",
                       return_value=[{}]) as patch_query,\
-         patch.object(SYN,
-                      "getSubmissionStatus") as patch_getstatus,\
+         patch.object(SYN, "_GET_paginated") as patch_getstatus,\
          patch.object(utils,
                       "update_single_submission_status") as patch_update, \
-         patch.object(SYN, "store") as patch_synstore:
+         patch.object(utils, "store_submission_statuses") as patch_store:
         helpers.kill_docker_submission_over_quota(SYN, EVALUATION_ID)
-        query = ("select * from evaluation_{} where "
-                 "status == 'EVALUATION_IN_PROGRESS'").format(EVALUATION_ID)
-        patch_query.assert_called_once_with(SYN, query)
+        patch_query.assert_called_once_with(SYN, QUERY, limit=100)
         patch_getstatus.assert_not_called()
         patch_update.assert_not_called()
-        patch_synstore.assert_not_called()
+        patch_store.assert_not_called()
 
 
 def test_underquota_kill_docker_submission_over_quota():
@@ -88,46 +94,199 @@ def test_underquota_kill_docker_submission_over_quota():
     '''
     with patch.object(utils, "evaluation_queue_query",
                       return_value=[DOCKER_SUB_ANNOTATION]) as patch_query,\
-         patch.object(SYN,
-                      "getSubmissionStatus") as patch_getstatus,\
+         patch.object(SYN, "_GET_paginated") as patch_getstatus,\
          patch.object(utils,
                       "update_single_submission_status") as patch_update, \
-         patch.object(SYN, "store") as patch_synstore:
+         patch.object(utils, "store_submission_statuses") as patch_store:
         # Set quota thats greater than the runtime
         quota = LAST_UPDATED_TIME - START_TIME + 9000
         helpers.kill_docker_submission_over_quota(SYN, EVALUATION_ID,
                                                   quota=quota)
-        query = ("select * from evaluation_{} where "
-                 "status == 'EVALUATION_IN_PROGRESS'").format(EVALUATION_ID)
-        patch_query.assert_called_once_with(SYN, query)
+        patch_query.assert_called_once_with(SYN, QUERY, limit=100)
         patch_getstatus.assert_not_called()
         patch_update.assert_not_called()
-        patch_synstore.assert_not_called()
+        patch_store.assert_not_called()
 
 
 def test_overquota_kill_docker_submission_over_quota():
     '''
-    Time remaining annotation should not be added
-    if the model is over the quota
+    Time remaining annotation should be added to the submissions
+    over the quota and stored in one batch
     '''
-    sub_status = {"annotations": []}
+    sub_status = {"id": "12345", "annotations": []}
+    other_status = {"id": "999", "annotations": []}
+    under_quota = {helpers.WORKFLOW_LAST_UPDATED_KEY: "20000",
+                   helpers.WORKFLOW_START_KEY: "10000",
+                   'objectId': "999"}
     quota_over_annotations = {helpers.TIME_REMAINING_KEY: 0}
     with patch.object(utils, "evaluation_queue_query",
-                      return_value=[DOCKER_SUB_ANNOTATION]) as patch_query,\
-         patch.object(SYN, "getSubmissionStatus",
-                      return_value=sub_status) as patch_getstatus,\
+                      return_value=[DOCKER_SUB_ANNOTATION,
+                                    under_quota]) as patch_query,\
+         patch.object(SYN, "_GET_paginated",
+                      return_value=[sub_status,
+                                    other_status]) as patch_getstatus,\
          patch.object(utils, "update_single_submission_status",
                       return_value=sub_status) as patch_update, \
-         patch.object(SYN, "store") as patch_synstore:
+         patch.object(utils, "store_submission_statuses") as patch_store:
         # Set quota thats lower than the runtime
         quota = LAST_UPDATED_TIME - START_TIME - 9000
-        helpers.kill_docker_submission_over_quota(SYN, EVALUATION_ID,
-                                                  quota=quota)
-        query = ("select * from evaluation_{} where "
-                 "status == 'EVALUATION_IN_PROGRESS'").format(EVALUATION_ID)
-        patch_query.assert_called_once_with(SYN, query)
-        objectid = DOCKER_SUB_ANNOTATION['objectId']
-        patch_getstatus.assert_called_once_with(objectid)
+        killed = helpers.kill_docker_submission_over_quota(SYN, EVALUATION_ID,
+                                                           quota=quota)
+        patch_query.assert_called_once_with(SYN, QUERY, limit=100)
+        patch_getstatus.assert_called_once_with(STATUS_URI, limit=100)
         patch_update.assert_called_once_with(sub_status,
                                              quota_over_annotations)
-        patch_synstore.assert_called_once_with(sub_status)
+        patch_store.assert_called_once_with(SYN, EVALUATION_ID, [sub_status])
+        assert killed == ["12345"]
+
+
+def test_conflict_kill_docker_submission_over_quota():
+    """A batch etag conflict stores fresh statuses one at a time"""
+    sub_status = {"id": "12345", "annotations": []}
+    conflict = synapseclient.core.exceptions.SynapseHTTPError(
+        response=mock.Mock(status_code=412)
+    )
+    with patch.object(utils, "evaluation_queue_query",
+                      return_value=[DOCKER_SUB_ANNOTATION]),\
+         patch.object(SYN, "_GET_paginated", return_value=[sub_status]),\
+         patch.object(utils, "update_single_submission_status",
+                      side_effect=lambda status, annots: status),\
+         patch.object(utils, "store_submission_statuses",
+                      side_effect=conflict),\
+         patch.object(SYN, "getSubmissionStatus",
+                      return_value=sub_status) as patch_get,\
+         patch.object(SYN, "store") as patch_store:
+        killed = helpers.kill_docker_submission_over_quota(SYN, EVALUATION_ID,
+                                                           quota=1)
+    patch_get.assert_called_once_with("12345")
+    patch_store.assert_called_once_with(sub_status)
+    assert killed == ["12345"]
+
+
+def _submission(subid, teamid, created, md5):
+    """Submission of a File with its entity bundle"""
+    bundle = {'entity': {'dataFileHandleId': '9'},
+              'fileHandles': [{'id': '9', 'fileName': "pred.csv",
+                               'contentMd5': md5}]}
+    return synapseclient.Submission(id=subid, evaluationId=EVALUATION_ID,
+                                    entityId="syn1", versionNumber=1,
+                                    teamId=teamid, userId="3",
+                                    createdOn=created,
+                                    entityBundleJSON=json.dumps(bundle))
+
+
+def _fake_download(subid, downloadLocation):
+    """Write a submission file to the download location"""
+    filepath = os.path.join(downloadLocation, "pred.csv")
+    with open(filepath, "w") as sub_file:
+        sub_file.write(subid)
+    return synapseclient.Submission(id=subid, evaluationId=EVALUATION_ID,
+                                    entityId="syn1", versionNumber=1,
+                                    filePath=filepath)
+
+
+def test_rename_submission_files(tmpdir):
+    '''
+    Submissions are downloaded, renamed and recorded in the manifest.
+    Rerunning with the manifest doesn't download again.
+    '''
+    bundles = [(_submission("1", "5", "2020-01-01",
+                            hashlib.md5(b"1").hexdigest()), {}),
+               (_submission("2", "5", "2020-01-02",
+                            hashlib.md5(b"2").hexdigest()), {})]
+    manifest = str(tmpdir.join("manifest.csv"))
+    download_location = str(tmpdir)
+    with patch.object(SYN, "getSubmissionBundles", return_value=bundles),\
+         patch.object(SYN, "getTeam",
+                      return_value={'name': 'foo team'}) as patch_team,\
+         patch.object(SYN, "getSubmission",
+                      side_effect=_fake_download) as patch_get:
+        rows = helpers.rename_submission_files(SYN, EVALUATION_ID,
+                                               download_location,
+                                               manifest=manifest)
+        patch_team.assert_called_once_with("5")
+        assert patch_get.call_count == 2
+        filepaths = sorted(row['filepath'] for row in rows)
+        assert filepaths == [
+            os.path.join(download_location,
+                         "foo_team___2020-01-01___pred.csv"),
+            os.path.join(download_location,
+                         "foo_team___2020-01-02___pred.csv")
+        ]
+        with open(filepaths[1]) as sub_file:
+            assert sub_file.read() == "2"
+
+        patch_get.reset_mock()
+        helpers.rename_submission_files(SYN, EVALUATION_ID,
+                                        download_location,
+                                        manifest=manifest)
+        patch_get.assert_not_called()
+    with open(manifest) as manifest_file:
+        assert len(manifest_file.readlines()) == 3
+
+
+def test_rename_submission_files_existing(tmpdir):
+    '''
+    Submissions already in the download location with the same
+    MD5 aren't downloaded again
+    '''
+    bundles = [(_submission("1", "5", "2020-01-01",
+                            hashlib.md5(b"1").hexdigest()), {})]
+    download_location = str(tmpdir)
+    tmpdir.join("foo_team___2020-01-01___pred.csv").write("1")
+    with patch.object(SYN, "getSubmissionBundles", return_value=bundles),\
+         patch.object(SYN, "getTeam", return_value={'name': 'foo team'}),\
+         patch.object(SYN, "getSubmission") as patch_get:
+        helpers.rename_submission_files(SYN, EVALUATION_ID,
+                                        download_location)
+        patch_get.assert_not_called()
+
+
+def test_archive_writeup():
+    """Submissions already archived are skipped and failures are
+    collected without stopping the other submissions"""
+    evaluation = synapseclient.Evaluation(name="writeups", contentSource="syn1",
+                                          id="5")
+    archived_status = {'annotations': {'stringAnnos': [{'key': 'archived',
+                                                        'value': 'syn9'}]}}
+    bundles = [(synapseclient.Submission(id=subid, name="sub", entityId=entid,
+                                         evaluationId="5", versionNumber=1),
+                status)
+               for subid, entid, status in [("1", "syn1", archived_status),
+                                            ("2", "syn2", {}),
+                                            ("3", "syn3", {})]]
+
+    def archive(syn, sub, status, rearchive):
+        if sub.id == "3":
+            raise ValueError("copy failed")
+        return "syn20"
+
+    with patch.object(SYN, "getSubmissionBundles", return_value=bundles),\
+         patch.object(helpers, "_archive_submission",
+                      side_effect=archive) as patch_archive:
+        archived, failed = helpers.archive_writeup(SYN, evaluation)
+    assert archived == {"2": "syn20"}
+    assert list(failed) == ["3"]
+    assert patch_archive.call_count == 2
+
+
+def test_existing__archive_submission():
+    """A project left by a failed copy is reused instead of creating
+    another one"""
+    sub = synapseclient.Submission(id="2", name="sub", entityId="syn2",
+                                   evaluationId="5", versionNumber=1)
+    project = synapseclient.Project("Archived sub 2 syn2", id="syn20")
+    with patch.object(SYN, "findEntityId",
+                      return_value="syn20") as patch_find,\
+         patch.object(SYN, "get", return_value=project),\
+         patch.object(SYN, "store") as patch_store,\
+         patch.object(SYN, "setPermissions"),\
+         patch.object(helpers.synapseutils, "copy") as patch_copy,\
+         patch.object(utils, "update_single_submission_status",
+                      return_value={}):
+        projectid = helpers._archive_submission(SYN, sub, {})
+    patch_find.assert_called_once_with("Archived sub 2 syn2")
+    patch_copy.assert_called_once_with(SYN, "syn2", "syn20",
+                                       updateExisting=True)
+    patch_store.assert_called_once_with({})
+    assert projectid == "syn20"
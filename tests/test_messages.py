@@ -0,0 +1,125 @@
+'''
+Test scoring harness messages
+'''
+import mock
+from mock import patch
+import pytest
+
+import synapseclient
+
+from scoring_harness import messages
+
+SYN = mock.create_autospec(synapseclient.Synapse)
+ERROR = dict(queue_name="foo queue", submission_name="sub",
+             submission_id="111", message="error",
+             challenge_synid="syn1234")
+
+
+def test_scoring_error_digest():
+    """Admin notifications are added to the digest instead of sent"""
+    digest = messages.AdminDigest(SYN)
+    with patch.object(messages, "send_message") as patch_send,\
+         patch.object(digest, "add") as patch_add:
+        messages.scoring_error(SYN, [1], send_messages=True, dry_run=False,
+                               digest=digest, **ERROR)
+        patch_send.assert_not_called()
+        patch_add.assert_called_once_with([1], **ERROR)
+
+
+def test_scoring_error_digest_no_send_messages():
+    """Nothing is added to the digest if messages aren't sent"""
+    digest = messages.AdminDigest(SYN)
+    with patch.object(digest, "add") as patch_add:
+        messages.scoring_error(SYN, [1], send_messages=False, dry_run=False,
+                               digest=digest, **ERROR)
+        patch_add.assert_not_called()
+
+
+def test_digest_flush():
+    """One message is sent per queue"""
+    digest = messages.AdminDigest(SYN)
+    digest.add([1, 3], **ERROR)
+    digest.add([1, 3], **dict(ERROR, submission_id="222"))
+    digest.add([1, 3], **dict(ERROR, queue_name="bar queue"))
+    with patch.object(SYN, "sendMessage") as patch_send:
+        digest.flush()
+        assert patch_send.call_count == 2
+        first = patch_send.call_args_list[0][1]
+    assert first['userIds'] == [1, 3]
+    assert first['messageSubject'] == \
+        "2 submission(s) to foo queue need attention"
+    assert "submission ID: <b>111</b>" in first['messageBody']
+    assert "submission ID: <b>222</b>" in first['messageBody']
+    assert "{" not in first['messageBody']
+    # Digest is emptied
+    with patch.object(SYN, "sendMessage") as patch_send:
+        digest.flush()
+        patch_send.assert_not_called()
+
+
+def test_digest_window():
+    """Digests are sent once the window has passed"""
+    digest = messages.AdminDigest(SYN, window=0)
+    with patch.object(SYN, "sendMessage") as patch_send:
+        digest.add([1], **ERROR)
+        patch_send.assert_called_once()
+
+
+def _two_pass(template, kwargs):
+    """Fill in templates the way send_message used to"""
+    filled = template.format_map(messages.DefaultFormatter(messages.DEFAULTS))
+    return filled.format_map(messages.DefaultFormatter(kwargs))
+
+
+@pytest.mark.parametrize("template", [
+    messages.VALIDATION_FAILED_SUBJECT_TEMPLATE,
+    messages.VALIDATION_FAILED_TEMPLATE,
+    messages.VALIDATION_PASSED_TEMPLATE,
+    messages.SCORING_SUCEEDED_TEMPLATE,
+    messages.SCORING_ERROR_TEMPLATE,
+    messages.ERROR_NOTIFICATION_TEMPLATE,
+    messages.ADMIN_DIGEST_TEMPLATE
+])
+def test_template_matches_two_pass(template):
+    """Compiled templates render the same as filling in twice"""
+    kwargs = dict(ERROR, username="foo", message="{not_a_field}")
+    compiled = messages.MessageTemplate(template)
+    assert compiled.render(kwargs) == _two_pass(template, kwargs)
+
+
+def test_template_missing_fields():
+    """Placeholders without values are kept"""
+    compiled = messages.MessageTemplate("Hi {username} from {queue_name}")
+    assert compiled.fields == {"username", "queue_name"}
+    assert compiled.render({'username': 'foo'}) == "Hi foo from {queue_name}"
+
+
+def test_compile_template_cached():
+    """Templates are only compiled once"""
+    template = messages.SCORING_ERROR_TEMPLATE
+    assert messages.compile_template(template) is \
+        messages.compile_template(template)
+
+
+def test_template_format_spec():
+    """Conversions and format specs are applied to the values"""
+    compiled = messages.MessageTemplate(
+        "{count:03d}|{submission_id!r}|{queue_name:>12}|{missing:>5}|"
+        "{scoring_script:.3}"
+    )
+    assert compiled.fields == {"count", "submission_id", "queue_name",
+                               "missing"}
+    assert compiled.render(dict(ERROR, count=7)) == \
+        "007|'111'|   foo queue|{missing:>5}|The"
+
+
+def test_compile_template_defaults_changed():
+    """Templates use the current DEFAULTS"""
+    template = "Sincerely, {scoring_script}"
+    assert messages.compile_template(template).render({}) == \
+        "Sincerely, The Challenge Admin"
+    with patch.dict(messages.DEFAULTS, scoring_script="Scoring Bot"):
+        assert messages.compile_template(template).render({}) == \
+            "Sincerely, Scoring Bot"
+    assert messages.compile_template(template).render({}) == \
+        "Sincerely, The Challenge Admin"
@@ -0,0 +1,90 @@
+'''
+Test scoring harness message outbox
+'''
+# pylint: disable=redefined-outer-name
+import mock
+from mock import patch
+import pytest
+
+import synapseclient
+
+from scoring_harness import messages
+from scoring_harness.outbox import MessageOutbox
+
+SYN = mock.create_autospec(synapseclient.Synapse)
+
+
+@pytest.fixture
+def outbox(tmpdir):
+    """Outbox in a temporary directory"""
+    return MessageOutbox(str(tmpdir.join("outbox.db")), retries=2, wait=0)
+
+
+def test_put(outbox):
+    """Messages are queued"""
+    messageid = outbox.put([1, 2], "subject", "body")
+    assert outbox.pending() == [{'id': messageid,
+                                 'userids': ['1', '2'],
+                                 'subject': 'subject',
+                                 'body': 'body',
+                                 'content_type': 'text/html',
+                                 'attempts': 0}]
+
+
+def test_persistent(outbox):
+    """Queued messages survive reopening the outbox"""
+    outbox.put([1], "subject", "body")
+    reopened = MessageOutbox(outbox.path)
+    assert len(reopened.pending()) == 1
+
+
+def test_drain(outbox):
+    """Sent messages are removed from the outbox"""
+    outbox.put([1], "subject", "body")
+    with patch.object(SYN, "sendMessage") as patch_send:
+        assert outbox.drain(SYN) == 1
+        patch_send.assert_called_once_with(userIds=['1'],
+                                           messageSubject="subject",
+                                           messageBody="body",
+                                           contentType="text/html")
+    assert outbox.pending() == []
+
+
+def test_drain_failure_kept(outbox):
+    """Messages that fail are kept and retried until out of retries"""
+    outbox.put([1], "subject", "body")
+    with patch.object(SYN, "sendMessage",
+                      side_effect=ValueError("down")) as patch_send:
+        assert outbox.drain(SYN) == 0
+        assert outbox.pending()[0]['attempts'] == 1
+        assert outbox.drain(SYN) == 0
+        assert outbox.pending() == []
+        assert outbox.drain(SYN) == 0
+        assert patch_send.call_count == 2
+    failed = outbox.failed()
+    assert [(message['attempts'], message['last_error'])
+            for message in failed] == [(2, "down")]
+    assert outbox.log_failed() == 1
+
+
+def test_start_stop(outbox):
+    """Background sender sends queued messages"""
+    outbox.put([1], "subject", "body")
+    with patch.object(SYN, "sendMessage") as patch_send:
+        outbox.start(SYN, interval=0.01)
+        outbox.stop(SYN)
+        patch_send.assert_called_once()
+    assert outbox.pending() == []
+
+
+def test_send_message_outbox(outbox):
+    """Messages are queued instead of sent when there is an outbox"""
+    with patch.object(SYN, "sendMessage") as patch_send:
+        messages.send_message(SYN, [1], "{queue_name}", "Hi {username}",
+                              dry_run=False,
+                              kwargs={'queue_name': 'foo', 'username': 'bar'},
+                              outbox=outbox)
+        patch_send.assert_not_called()
+    pending = outbox.pending()
+    assert pending[0]['subject'] == "foo"
+    assert pending[0]['body'] == "Hi bar"
@@ -1,6 +1,8 @@
 """Test permissions"""
+import json
 import pytest
 from mock import patch, create_autospec
+import pandas as pd
 
 import synapseclient
 
@@ -62,3 +64,141 @@ def test_get_user_entity_permissions(entity):
     with patch.object(SYN, "restGET") as patch_rest_get:
         permissions.get_user_entity_permissions(SYN, entity)
         patch_rest_get.assert_called_once_with("/entity/syn123/permissions")
+
+
+def test_set_bulk_permissions():
+    """Each ACL is read and written once for all of its changes"""
+    entity_acl = {'id': 'syn1', 'resourceAccess': [
+        {'principalId': 5, 'accessType': ['READ']},
+        {'principalId': 6, 'accessType': ['READ']}
+    ]}
+    evaluation_acl = {'id': '9', 'resourceAccess': []}
+    rest_get = {"/entity/syn1/benefactor": {'id': 'syn1'},
+                "/entity/syn1/acl": entity_acl,
+                "/evaluation/9/acl": evaluation_acl}
+    with patch.object(SYN, "restGET",
+                      side_effect=lambda uri: rest_get[uri]) as patch_get,\
+         patch.object(SYN, "_getUserbyPrincipalIdOrName",
+                      side_effect=int),\
+         patch.object(SYN, "restPUT",
+                      side_effect=lambda uri, body: json.loads(body))\
+            as patch_put:
+        acls = permissions.set_bulk_permissions(
+            SYN, [("syn1", "5", "admin"), ("syn1", "6", "remove"),
+                  ("syn1", "7", "view"), ("9", "7", "submit")]
+        )
+    assert patch_get.call_count == 3
+    assert patch_put.call_count == 2
+    assert acls['syn1']['resourceAccess'] == [
+        {'principalId': 5, 'accessType': permissions.ADMIN},
+        {'principalId': 7, 'accessType': permissions.VIEW}
+    ]
+    assert acls['9']['resourceAccess'] == [
+        {'principalId': 7, 'accessType': permissions.SUBMIT}
+    ]
+    put_uris = sorted(call[0][0] for call in patch_put.call_args_list)
+    assert put_uris == ["/entity/syn1/acl", "/evaluation/acl"]
+
+
+def test_inherited_set_bulk_permissions():
+    """An entity that inherits its ACL gets a new one"""
+    rest_get = {"/entity/syn2/benefactor": {'id': 'syn1'},
+                "/entity/syn1/acl": {'id': 'syn1', 'resourceAccess': []}}
+    with patch.object(SYN, "restGET", side_effect=lambda uri: rest_get[uri]),\
+         patch.object(SYN, "_getUserbyPrincipalIdOrName", return_value=5),\
+         patch.object(SYN, "restPOST") as patch_post:
+        permissions.set_bulk_permissions(
+            SYN, [(synapseclient.Folder(id="syn2", parentId="syn1"), "5",
+                   "edit")]
+        )
+    patch_post.assert_called_once()
+    assert patch_post.call_args[0][0] == "/entity/syn2/acl"
+
+
+def test_wrong_permission_level_set_bulk_permissions():
+    """Error raised before any ACL is changed"""
+    with pytest.raises(ValueError,
+                       match=r'permission_level must be one of these:.*'),\
+         patch.object(SYN, "restGET") as patch_get:
+        permissions.set_bulk_permissions(SYN, [("9", "3", "download")])
+    patch_get.assert_not_called()
+
+
+def test_audit_permissions():
+    """Every object gets the rows of its benefactor's ACL"""
+    objects = [('project', 'syn1', 'live', None),
+               ('folder', 'syn2', 'data', None),
+               ('wiki', '10', 'home', 'syn1'),
+               ('evaluation', '9', 'queue', None)]
+    rest_get = {"/entity/syn1/benefactor": {'id': 'syn1'},
+                "/entity/syn2/benefactor": {'id': 'syn1'},
+                "/entity/syn1/acl": {'resourceAccess': [
+                    {'principalId': 5, 'accessType': ['READ', 'DOWNLOAD']}
+                ]},
+                "/evaluation/9/acl": {'resourceAccess': [
+                    {'principalId': 6, 'accessType': ['SUBMIT']}
+                ]}}
+    with patch.object(permissions, "_walk_challenge_objects",
+                      return_value=objects),\
+         patch.object(SYN, "restGET",
+                      side_effect=lambda uri: rest_get[uri]) as patch_get:
+        auditdf = permissions.audit_permissions(SYN, ["syn1"])
+    # The shared ACL is only fetched once
+    acl_calls = [call for call in patch_get.call_args_list
+                 if call[0][0].endswith("/acl")]
+    assert len(acl_calls) == 2
+    # Evaluations don't have a benefactor
+    assert auditdf['benefactor_id'].isnull().tolist() == [False] * 6 + [True]
+    auditdf['benefactor_id'] = auditdf['benefactor_id'].fillna("")
+    assert auditdf.values.tolist() == [
+        ['project', 'syn1', 'live', 'syn1', '5', 'DOWNLOAD'],
+        ['project', 'syn1', 'live', 'syn1', '5', 'READ'],
+        ['folder', 'syn2', 'data', 'syn1', '5', 'DOWNLOAD'],
+        ['folder', 'syn2', 'data', 'syn1', '5', 'READ'],
+        ['wiki', '10', 'home', 'syn1', '5', 'DOWNLOAD'],
+        ['wiki', '10', 'home', 'syn1', '5', 'READ'],
+        ['evaluation', '9', 'queue', '', '6', 'SUBMIT']
+    ]
+
+
+def test__walk_challenge_objects():
+    """Folders are walked level by level"""
+    children = {"syn1": [{'id': 'syn2', 'name': 'a'}],
+                "syn2": [{'id': 'syn3', 'name': 'b'}],
+                "syn3": []}
+    with patch.object(SYN, "get",
+                      return_value=synapseclient.Project("live",
+                                                         id="syn1")),\
+         patch.object(SYN, "getWikiHeaders",
+                      return_value=[{'id': '10', 'title': 'home'}]),\
+         patch.object(SYN, "getEvaluationByContentSource",
+                      return_value=[synapseclient.Evaluation(
+                          name="queue", id="9", contentSource="syn1")]),\
+         patch.object(SYN, "getChildren",
+                      side_effect=lambda parent, includeTypes:
+                      children[parent]):
+        objects = permissions._walk_challenge_objects(SYN, ["syn1"])
+    assert objects == [('project', 'syn1', 'live', None),
+                       ('wiki', '10', 'home', 'syn1'),
+                       ('evaluation', '9', 'queue', None),
+                       ('folder', 'syn2', 'a', None),
+                       ('folder', 'syn3', 'b', None)]
+
+
+def test_diff_permission_audits():
+    """Only added and removed access is reported"""
+    previous = pd.DataFrame(
+        [['project', 'syn1', 'live', 'syn1', 5, 'READ'],
+         ['project', 'syn1', 'live', 'syn1', 6, 'READ']],
+        columns=permissions.AUDIT_COLUMNS
+    )
+    current = pd.DataFrame(
+        [['project', 'syn1', 'live', 'syn1', '5', 'READ'],
+         ['project', 'syn1', 'live', 'syn1', '7', 'READ']],
+        columns=permissions.AUDIT_COLUMNS
+    )
+    diffdf = permissions.diff_permission_audits(previous, current)
+    assert diffdf[['change', 'principal_id']].values.tolist() == [
+        ['removed', '6'], ['added', '7']
+    ]
+    assert diffdf['object_name'].tolist() == ['live', 'live']
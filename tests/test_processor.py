@@ -12,6 +12,7 @@ import synapseclient
 
 import scoring_harness.base_processor
 from scoring_harness.base_processor import EvaluationQueueProcessor
+from scoring_harness.timing import StageTimer
 
 SYN = mock.create_autospec(synapseclient.Synapse)
 ANNOTATIONS = {'foo': 'bar'}
@@ -73,6 +74,7 @@ def test_init():
         assert proc.admin_user_ids == [1111]
         assert not proc.dry_run
         assert not proc.remove_cache
+        assert isinstance(proc.timer, StageTimer)
 
 
 def test_specifyadmin_init():
@@ -242,6 +244,19 @@ def test_dryrun_call(processor):
         patch_store.assert_called_once_with(SUBMISSION_STATUS, SUB_INFO)
         patch_notify.assert_not_called()
 
+def test_call_records_stages(processor):
+    """Each stage of the submission pipeline is timed"""
+    with patch.object(SYN, "getSubmissionBundles", return_value=BUNDLE),\
+         patch.object(SYN, "getSubmission", return_value=SUBMISSION),\
+         patch.object(processor, "interaction_func", return_value=SUB_INFO),\
+         patch.object(processor, "store_submission_status"),\
+         patch.object(processor, "notify"):
+        processor()
+    stages = set(stage for _, stage in processor.timer.totals)
+    assert stages == {"fetch_bundles", "download", "interaction_func",
+                      "store", "notify"}
+
+
 @pytest.mark.parametrize("valid_input", [("foo", None)])
 def test_file_remove_cached_submission(valid_input):
     """Remove cache"""
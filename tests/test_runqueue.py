@@ -0,0 +1,93 @@
+'''
+Test the runqueue script
+'''
+import importlib.util
+import os
+
+import mock
+from mock import patch
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      os.pardir, "bin", "runqueue.py")
+SPEC = importlib.util.spec_from_file_location("runqueue", SCRIPT)
+runqueue = importlib.util.module_from_spec(SPEC)
+SPEC.loader.exec_module(runqueue)
+
+CONFIG = """
+def invoke(*args, **kwargs):
+    pass
+
+EVALUATION_QUEUES_CONFIG = [
+    {{'id': {evaluationid}, 'func': invoke, 'kwargs': {{}}}}
+]
+"""
+
+
+def _write_config(config, text, mtime):
+    """Write the config script with a given modification time"""
+    config.write(text)
+    os.utime(str(config), (mtime, mtime))
+
+
+def test_changed_reload_if_changed(tmpdir):
+    """A modified config is swapped in"""
+    config = tmpdir.join("config.py")
+    _write_config(config, CONFIG.format(evaluationid=1), 1000)
+    watcher = runqueue.ConfigWatcher(str(config))
+    assert list(watcher.eval_queues) == [1]
+    _write_config(config, CONFIG.format(evaluationid=2), 2000)
+    assert watcher.reload_if_changed()
+    assert list(watcher.eval_queues) == [2]
+
+
+def test_unchanged_reload_if_changed(tmpdir):
+    """A config whose modification time is the same isn't reloaded"""
+    config = tmpdir.join("config.py")
+    _write_config(config, CONFIG.format(evaluationid=1), 1000)
+    watcher = runqueue.ConfigWatcher(str(config))
+    _write_config(config, CONFIG.format(evaluationid=2), 1000)
+    with patch.object(runqueue, "load_config") as patch_load:
+        assert not watcher.reload_if_changed()
+        patch_load.assert_not_called()
+    assert list(watcher.eval_queues) == [1]
+
+
+@pytest.mark.parametrize("text", [
+    "EVALUATION_QUEUES_CONFIG = [",
+    "EVALUATION_QUEUES_CONFIG = [{'id': 2}]"
+])
+def test_invalid_reload_if_changed(tmpdir, text):
+    """An invalid config keeps the previous config and is only checked
+    once per change"""
+    config = tmpdir.join("config.py")
+    _write_config(config, CONFIG.format(evaluationid=1), 1000)
+    watcher = runqueue.ConfigWatcher(str(config))
+    previous = watcher.eval_queues
+    _write_config(config, text, 2000)
+    assert not watcher.reload_if_changed()
+    assert watcher.eval_queues is previous
+    with patch.object(runqueue, "load_config") as patch_load:
+        assert not watcher.reload_if_changed()
+        patch_load.assert_not_called()
+
+
+def test_missing_config_watcher(tmpdir):
+    """A missing config raises ValueError"""
+    with pytest.raises(ValueError):
+        runqueue.ConfigWatcher(str(tmpdir.join("config.py")))
+
+
+def test_release_lock_run_cycle():
+    """The lock is released even if the end of the run fails"""
+    update_lock = mock.Mock()
+    timer = mock.Mock()
+    timer.write.side_effect = OSError("disk full")
+    args = mock.Mock(digest=False)
+    with patch.object(runqueue.lock, "acquire_lock_or_fail",
+                      return_value=update_lock),\
+         patch.object(runqueue, "command") as patch_command:
+        with pytest.raises(OSError):
+            runqueue.run_cycle(None, {}, args, timer=timer)
+        patch_command.assert_called_once()
+    update_lock.release.assert_called_once_with()
@@ -59,6 +59,7 @@ def test_valid_notify(scorer):
                                            userids=[SUBMISSION.userId],
                                            send_messages=False,
                                            dry_run=False,
+                                           outbox=None,
                                            message=SUB_INFO['message'],
                                            username=SYN_USERPROFILE.userName,
                                            queue_name=EVALUATION.name,
@@ -80,6 +81,8 @@ def test_error_notify(scorer):
                                            userids=[111],
                                            send_messages=False,
                                            dry_run=False,
+                                           outbox=None,
+                                           digest=None,
                                            message=info['message'],
                                            username="Challenge Administrator",
                                            queue_name=EVALUATION.name,
@@ -0,0 +1,168 @@
+'''
+Test challengeutils server
+'''
+import os
+import socket
+import threading
+
+import mock
+from mock import patch
+import pytest
+import synapseclient
+
+from challengeutils import server, utils
+
+SYN = mock.create_autospec(synapseclient.Synapse)
+
+
+def test_run_command():
+    """Commands use the server's Synapse object and their output is
+    captured"""
+    with patch.object(SYN, "sendMessage") as patch_send:
+        response = server.run_command(
+            SYN, ['sendemail', '--userids', '1', '--subject', 'a',
+                  '--message', 'b']
+        )
+    patch_send.assert_called_once_with(userIds=['1'], messageSubject='a',
+                                       messageBody='b')
+    assert response == {'stdout': '', 'stderr': '', 'exit_code': 0}
+
+
+def test_version_run_command():
+    """What commands print is returned"""
+    response = server.run_command(SYN, ['-v'])
+    assert response['stdout'].startswith("challengeutils ")
+    assert response['exit_code'] == 0
+
+
+def test_badargs_run_command():
+    """Argument errors are returned with the argparse exit code"""
+    response = server.run_command(SYN, ['changestatus'])
+    assert "required" in response['stderr']
+    assert response['exit_code'] == 2
+
+
+def test_error_run_command():
+    """Exceptions are returned as a traceback"""
+    with patch.object(SYN, "sendMessage", side_effect=ValueError("foo")):
+        response = server.run_command(
+            SYN, ['sendemail', '--userids', '1', '--subject', 'a',
+                  '--message', 'b']
+        )
+    assert "ValueError: foo" in response['stderr']
+    assert response['exit_code'] == 1
+
+
+def test_cwd_run_command(tmpdir):
+    """Relative paths are read from the caller's directory"""
+    tmpdir.join("invitees.txt").write("user1\n")
+    cwd = os.getcwd()
+    results = [('user1', 'invited', '1', None)]
+    with patch.object(utils, "invite_members_to_team",
+                      return_value=results) as patch_invite:
+        response = server.run_command(SYN, ['inviteteam', '123',
+                                            'invitees.txt'],
+                                      cwd=str(tmpdir))
+    patch_invite.assert_called_once_with(SYN, '123', users=['user1'],
+                                         emails=[], message=None,
+                                         max_workers=8)
+    assert "invited" in response['stdout']
+    assert os.getcwd() == cwd
+
+
+def test_local_run_command():
+    """Commands that run locally are refused by the server"""
+    response = server.run_command(SYN, ['-c', 'cfg', 'server'])
+    assert "server can't run on the server" in response['stderr']
+    assert response['exit_code'] == 1
+
+
+@pytest.mark.parametrize("argv,expected", [
+    (['-c', 'cfg', 'server'], ('cfg', 'server', [])),
+    (['--synapse_config=cfg', 'query', 'uri'], ('cfg', 'query', ['uri'])),
+    (['--synapse', 'cfg', '-v'], ('cfg', None, [])),
+    (['-ccfg', 'query', '-c'], ('cfg', 'query', ['-c'])),
+    (['query', 'uri'], (None, 'query', ['uri']))
+])
+def test__split_argv(argv, expected):
+    """The subcommand is found after the Synapse config"""
+    assert server._split_argv(argv) == expected
+
+
+@pytest.mark.parametrize("argv,expected", [
+    (['-c', 'cfg', 'server'], True),
+    (['createchallenge', 'name', '--plan'], True),
+    (['downloadsubmission', '1'], True),
+    (['killdockeroverquota', '1', '10', '--interval', '60'], True),
+    (['killdockeroverquota', '1', '10', '--interval=60'], True),
+    (['killdockeroverquota', '1', '10'], False),
+    (['-v'], False)
+])
+def test__runs_locally(argv, expected):
+    """Long running commands aren't forwarded"""
+    assert server._runs_locally(argv) == expected
+
+
+def test_server_forward(tmpdir, capsys):
+    """Forwarded commands print the output of the server"""
+    socket_path = str(tmpdir.join("server.sock"))
+    command_server = server.CommandServer(SYN, socket_path)
+    thread = threading.Thread(target=command_server.serve_forever)
+    thread.start()
+    try:
+        assert oct(os.stat(socket_path).st_mode & 0o777) == oct(0o600)
+        with patch.dict(os.environ, {server.SERVER_ENV: socket_path}):
+            exit_code = server.forward(['-v'])
+        assert exit_code == 0
+        assert capsys.readouterr().out.startswith("challengeutils ")
+        with pytest.raises(ValueError, match="already listening"):
+            server.CommandServer(SYN, socket_path)
+    finally:
+        command_server.shutdown()
+        command_server.server_close()
+        thread.join()
+    assert not os.path.exists(socket_path)
+
+
+def test_noserver_forward(tmpdir):
+    """Commands run locally when there is no server"""
+    socket_path = str(tmpdir.join("server.sock"))
+    with patch.dict(os.environ, {server.SERVER_ENV: socket_path}):
+        assert server.forward(['-v']) is None
+        assert server.forward(['server']) is None
+        assert server.forward(['-c', 'cfg', 'server']) is None
+    with patch.dict(os.environ, clear=True):
+        assert server.forward(['-v']) is None
+
+
+def test_config_forward(tmpdir, capsys):
+    """Commands with another Synapse config than the server's run
+    locally"""
+    socket_path = str(tmpdir.join("server.sock"))
+    synapse_config = str(tmpdir.join("synapseConfig"))
+    command_server = server.CommandServer(SYN, socket_path,
+                                          synapse_config=synapse_config)
+    thread = threading.Thread(target=command_server.serve_forever)
+    thread.start()
+    try:
+        with patch.dict(os.environ, {server.SERVER_ENV: socket_path}):
+            assert server.forward(['-v']) is None
+            assert server.forward(['-c', 'other', '-v']) is None
+            assert capsys.readouterr().out == ''
+            assert server.forward(['-c', synapse_config, '-v']) == 0
+        assert capsys.readouterr().out.startswith("challengeutils ")
+    finally:
+        command_server.shutdown()
+        command_server.server_close()
+        thread.join()
+
+
+def test_timeout_send_command(tmpdir):
+    """The client stops waiting for a server that doesn't answer"""
+    socket_path = str(tmpdir.join("server.sock"))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(socket_path)
+        listener.listen(1)
+        response = server.send_command(socket_path, ['-v'], timeout=0.1)
+    assert response['exit_code'] == 1
+    assert "No response from the server" in response['stderr']
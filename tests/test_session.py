@@ -0,0 +1,172 @@
+'''
+Test challengeutils session cache
+'''
+import os
+import stat
+
+import mock
+from mock import patch
+import pytest
+import synapseclient
+from synapseclient.core.credentials.cred_data import (
+    SynapseApiKeyCredentials, SynapseAuthTokenCredentials
+)
+
+from challengeutils import session
+
+ENDPOINTS = {'repoEndpoint': 'https://repo.test/repo/v1',
+             'authEndpoint': 'https://repo.test/auth/v1',
+             'fileHandleEndpoint': 'https://repo.test/file/v1',
+             'portalEndpoint': 'https://www.repo.test/'}
+
+
+def _logged_in(credentials):
+    """Synapse object as it is after a login"""
+    syn = mock.create_autospec(synapseclient.Synapse)
+    syn.credentials = credentials
+    for endpoint, url in ENDPOINTS.items():
+        setattr(syn, endpoint, url)
+    return syn
+
+
+def _config(tmpdir, **authentication):
+    """Synapse config with an [authentication] section"""
+    config = tmpdir.join("synapseConfig")
+    config.write("[authentication]\n" + "".join(
+        f"{key} = {value}\n" for key, value in authentication.items()
+    ))
+    return str(config)
+
+
+@pytest.fixture(autouse=True)
+def no_auth_token():
+    """Credentials are only read from the config unless a test sets
+    SYNAPSE_AUTH_TOKEN"""
+    with patch.dict(os.environ):
+        os.environ.pop("SYNAPSE_AUTH_TOKEN", None)
+        yield
+
+
+def test_save_load(tmpdir):
+    """Saved logins are restored without logging in again"""
+    config = _config(tmpdir, authtoken="token")
+    cache = session.SessionCache(str(tmpdir.join("cache", "session.json")))
+    credentials = SynapseAuthTokenCredentials("token", username="user")
+    cache.save(_logged_in(credentials), config)
+
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+    syn = cache.load(config)
+    assert isinstance(syn.credentials, SynapseAuthTokenCredentials)
+    assert syn.credentials.secret == "token"
+    assert syn.credentials.username == "user"
+    assert syn.repoEndpoint == ENDPOINTS['repoEndpoint']
+
+
+def test_nosecret_save(tmpdir):
+    """The secret isn't written to the cache file"""
+    config = _config(tmpdir, authtoken="s3cr3t")
+    cache = session.SessionCache(str(tmpdir.join("session.json")))
+    cache.save(_logged_in(SynapseAuthTokenCredentials("s3cr3t", "user")),
+               config)
+    with open(cache.path) as cache_file:
+        assert "s3cr3t" not in cache_file.read()
+
+
+def test_othersecret_save(tmpdir):
+    """Logins whose secret isn't in the environment or config aren't
+    cached"""
+    config = _config(tmpdir, authtoken="token")
+    cache = session.SessionCache(str(tmpdir.join("session.json")))
+    cache.save(_logged_in(SynapseAuthTokenCredentials("keyring", "user")),
+               config)
+    assert not os.path.exists(cache.path)
+
+
+def test_env_save_load(tmpdir):
+    """Tokens are read from SYNAPSE_AUTH_TOKEN on every load"""
+    cache = session.SessionCache(str(tmpdir.join("session.json")))
+    with patch.dict(os.environ, {"SYNAPSE_AUTH_TOKEN": "token"}):
+        cache.save(_logged_in(SynapseAuthTokenCredentials("token", "user")),
+                   None)
+        syn = cache.load(None)
+    assert syn.credentials.secret == "token"
+    assert cache.load(None) is None
+
+
+def test_apikey_save_load(tmpdir):
+    """Logins with an API key are restored too"""
+    config = _config(tmpdir, username="user", apikey="a2V5")
+    cache = session.SessionCache(str(tmpdir.join("session.json")))
+    credentials = SynapseApiKeyCredentials("a2V5", "user")
+    cache.save(_logged_in(credentials), config)
+    syn = cache.load(config)
+    assert isinstance(syn.credentials, SynapseApiKeyCredentials)
+    assert syn.credentials.secret == "a2V5"
+
+
+def test_changedconfig_load(tmpdir):
+    """Logins aren't reused once the config changes"""
+    config = _config(tmpdir, authtoken="token")
+    cache = session.SessionCache(str(tmpdir.join("session.json")))
+    cache.save(_logged_in(SynapseAuthTokenCredentials("token")), config)
+    os.utime(config, (1, 1))
+    assert cache.load(config) is None
+
+
+def test_oldsecret_load(tmpdir):
+    """Logins cached with their secret are dropped"""
+    config = _config(tmpdir, authtoken="token")
+    cache = session.SessionCache(str(tmpdir.join("session.json")))
+    cache._write({session._session_key(config): {
+        'type': 'authtoken', 'secret': 'token', 'username': 'user',
+        'endpoints': ENDPOINTS, 'expires': 2e10
+    }})
+    assert cache.load(config) is None
+
+
+def test_expired_load(tmpdir):
+    """Expired logins aren't reused"""
+    config = _config(tmpdir, authtoken="token")
+    cache = session.SessionCache(str(tmpdir.join("session.json")), ttl=60)
+    cache.save(_logged_in(SynapseAuthTokenCredentials("token")), config)
+    with patch.object(session.time, "time", return_value=2e10):
+        assert cache.load(config) is None
+
+
+def test_permissions_load(tmpdir):
+    """Cache files others can read are ignored"""
+    config = _config(tmpdir, authtoken="token")
+    cache = session.SessionCache(str(tmpdir.join("session.json")))
+    cache.save(_logged_in(SynapseAuthTokenCredentials("token")), config)
+    os.chmod(cache.path, 0o644)
+    assert cache.load(config) is None
+
+
+def test_cached_login(tmpdir):
+    """Only the first call logs in"""
+    config = _config(tmpdir, authtoken="token")
+    cache = session.SessionCache(str(tmpdir.join("session.json")))
+    syn = _logged_in(SynapseAuthTokenCredentials("token", username="user"))
+    login = mock.Mock(return_value=syn)
+    assert session.cached_login(config, login, cache=cache) == syn
+    cached = session.cached_login(config, login, cache=cache)
+    login.assert_called_once_with()
+    assert cached.credentials.secret == "token"
+
+
+def test_disabled_default_cache():
+    """A TTL of 0 turns the cache off"""
+    with patch.dict(os.environ, {session.SESSION_TTL_ENV: "0"}):
+        assert session.default_cache() is None
+    with patch.dict(os.environ, {session.SESSION_CACHE_ENV: "/tmp/a.json",
+                                 session.SESSION_TTL_ENV: "5"}):
+        cache = session.default_cache()
+    assert cache.path == "/tmp/a.json"
+    assert cache.ttl == 5
+
+
+def test_badttl_default_cache():
+    """A TTL that isn't a number falls back to the default"""
+    with patch.dict(os.environ, {session.SESSION_TTL_ENV: "1h"}):
+        cache = session.default_cache()
+    assert cache.ttl == session.DEFAULT_SESSION_TTL
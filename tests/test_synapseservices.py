@@ -0,0 +1,98 @@
+"""Test synapseservices models"""
+import datetime
+import json
+
+import pytest
+
+from synapseservices.challenge import Challenge
+from synapseservices.discussion import Forum, Reply, Thread
+
+CHALLENGE_DICT = {'id': "1", 'projectId': "syn2", 'etag': "foo",
+                  'participantTeamId': "3"}
+
+
+def test_challenge_attributes():
+    """Attributes are set from the JSON keys"""
+    challenge = Challenge(**CHALLENGE_DICT)
+    assert challenge.id == "1"
+    assert challenge.projectid == "syn2"
+    assert challenge.etag == "foo"
+    assert challenge.participant_teamid == "3"
+
+
+def test_from_dict():
+    """from_dict converts primitive values and leaves missing keys None"""
+    forum = Forum.from_dict({'id': 1, 'projectId': "syn2"})
+    assert forum == Forum(id="1", projectId="syn2")
+    assert forum.etag is None
+
+
+def test_to_dict():
+    """to_dict is keyed by attribute name"""
+    assert Challenge(**CHALLENGE_DICT).to_dict() == {
+        'id': "1", 'projectid': "syn2", 'etag': "foo",
+        'participant_teamid': "3"
+    }
+
+
+def test_getitem():
+    """Values can be read by their JSON key"""
+    challenge = Challenge(**CHALLENGE_DICT)
+    assert challenge['participantTeamId'] == "3"
+    with pytest.raises(KeyError):
+        challenge['foo']
+
+
+def test_slots():
+    """Models don't have a __dict__"""
+    challenge = Challenge(**CHALLENGE_DICT)
+    assert not hasattr(challenge, "__dict__")
+    with pytest.raises(AttributeError):
+        challenge.foo = "bar"
+
+
+def test_eq():
+    """Models are equal when their class and values are"""
+    assert Challenge(**CHALLENGE_DICT) == Challenge(**CHALLENGE_DICT)
+    assert Challenge(**CHALLENGE_DICT) != Challenge(id="2")
+    assert Forum(id="1") != Challenge(id="1")
+
+
+THREAD_DICT = {'id': "5583", 'title': "titlehere",
+               'activeAuthors': ["2222", "3333"],
+               'createdOn': "2019-06-27T04:01:25.000Z"}
+
+
+def test_thread():
+    """Threads keep active authors as ids and parse dates when read"""
+    thread = Thread.from_dict(THREAD_DICT)
+    assert thread.title == "titlehere"
+    assert list(thread.active_authors) == [2222, 3333]
+    assert thread['activeAuthors'] == ["2222", "3333"]
+    assert thread.created_on == datetime.datetime(
+        2019, 6, 27, 4, 1, 25, tzinfo=datetime.timezone.utc
+    )
+    assert thread.modified_on is None
+    assert thread == THREAD_DICT
+    assert thread.to_dict() == THREAD_DICT
+    assert not hasattr(thread, "__dict__")
+
+
+def test_thread_mapping():
+    """Threads are read-only mappings of their JSON response"""
+    thread = Thread.from_dict(THREAD_DICT)
+    assert 'id' in thread
+    assert 'activeAuthors' in thread
+    assert 'modifiedOn' not in thread
+    assert sorted(thread) == sorted(THREAD_DICT)
+    assert len(thread) == len(THREAD_DICT)
+    assert dict(thread.items()) == THREAD_DICT
+    assert json.loads(json.dumps(dict(thread))) == THREAD_DICT
+
+
+def test_reply():
+    """Replies can be read by attribute or JSON key"""
+    reply = Reply.from_dict({'id': "1", 'threadId': "5583"})
+    assert reply.thread_id == reply['threadId'] == "5583"
+    assert reply.get('createdOn') is None
+    assert reply != Reply.from_dict({'id': "2"})
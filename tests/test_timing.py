@@ -0,0 +1,71 @@
+'''
+Test scoring harness stage timing
+'''
+import json
+
+from mock import patch
+import pytest
+
+from scoring_harness import timing
+from scoring_harness.timing import StageTimer
+
+
+def test_span_records_totals():
+    """Spans are accumulated per evaluation and stage"""
+    timer = StageTimer()
+    with timer.span("download", evaluation_id="1", submission_id="2"):
+        pass
+    with timer.span("download", evaluation_id="1", submission_id="3"):
+        pass
+    count, total = timer.totals[("1", "download")]
+    assert count == 2
+    assert total >= 0
+
+
+def test_span_records_on_error():
+    """Spans are recorded even if the stage raises an error"""
+    timer = StageTimer()
+    with pytest.raises(ValueError):
+        with timer.span("interaction_func", evaluation_id="1"):
+            raise ValueError("test")
+    assert timer.totals[("1", "interaction_func")][0] == 1
+
+
+def test_record_logs_json():
+    """Each span is logged as a JSON line"""
+    timer = StageTimer()
+    with patch.object(timing.LOGGER, "info") as patch_log:
+        timer.record("store", 0.5, evaluation_id="1", submission_id="2")
+        span = json.loads(patch_log.call_args[0][0])
+    assert span == {'stage': 'store', 'seconds': 0.5,
+                    'evaluation_id': '1', 'submission_id': '2'}
+
+
+def test_to_prometheus():
+    """Totals are written as Prometheus count and sum"""
+    timer = StageTimer()
+    timer.record("store", 0.5, evaluation_id="1")
+    timer.record("store", 0.25, evaluation_id="1")
+    metrics = timer.to_prometheus()
+    assert ('scoring_harness_stage_seconds_count'
+            '{evaluation_id="1",stage="store"} 2') in metrics
+    assert ('scoring_harness_stage_seconds_sum'
+            '{evaluation_id="1",stage="store"} 0.750000') in metrics
+
+
+def test_write(tmpdir):
+    """Metrics file is written"""
+    metrics_path = str(tmpdir.join("harness.prom"))
+    timer = StageTimer(metrics_path=metrics_path)
+    timer.record("notify", 1, evaluation_id="1")
+    timer.write()
+    with open(metrics_path) as metrics_file:
+        assert metrics_file.read() == timer.to_prometheus()
+
+
+def test_write_no_path():
+    """Nothing is written without a metrics path"""
+    timer = StageTimer()
+    with patch("builtins.open") as patch_open:
+        timer.write()
+        patch_open.assert_not_called()
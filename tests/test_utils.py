@@ -125,30 +125,13 @@ def test_topublic_update_single_submission_status():
     expected_status = {'annotations': expected_annot}
     assert new_status == expected_status
 
-def test_valid__check_date_range():
+def test__datetime_to_epoch():
     '''
-    Test checking valid date range
+    Date time bounds are converted to UTC epoch milliseconds
     '''
-    date_str = '2019-05-26T23:59:59.062Z'
-    datetime1 = '2019-05-06 1:00'
-    datetime2 = '2019-06-01 1:00'
-    result = challengeutils.utils._check_date_range(date_str,
-                                                    datetime1,
-                                                    datetime2)
-    assert result
-
-
-def test_invalid__check_date_range():
-    '''
-    Test checking invalid date range
-    '''
-    date_str = '2019-05-26T23:59:59.062Z'
-    datetime1 = '2019-05-06 1:00'
-    datetime2 = '2019-06-01 1:00'
-    result = challengeutils.utils._check_date_range(date_str,
-                                                    datetime2,
-                                                    None)
-    assert not result
+    epoch = challengeutils.utils._datetime_to_epoch('2019-05-26 23:59')
+    assert epoch == 1558915140000
+    assert challengeutils.utils._datetime_to_epoch(None) is None
 
 
 def test__get_contributors():
@@ -158,27 +141,73 @@ def test__get_contributors():
     sub = synapseclient.Submission(evaluationId=123, entityId="syn1234", versionNumber=1,
                                    contributors=[{"principalId": 321}], createdOn="2019-05-26T23:59:59.062Z")
     bundle = [(sub, "temp")]
-    with patch.object(syn, "getSubmissionBundles",
-                      return_value=bundle) as patch_syn_get_bundles:
+    with patch.object(challengeutils.utils, "get_submission_bundles",
+                      return_value=bundle) as patch_get_bundles:
         contributors = challengeutils.utils._get_contributors(
             syn, 123, "SCORED","2019-05-06 1:00","2019-06-01 1:00")
-        patch_syn_get_bundles.assert_called_once_with(
-            123,
-            status="SCORED")
+        patch_get_bundles.assert_called_once_with(
+            syn, 123, status="SCORED", start_datetime="2019-05-06 1:00",
+            end_datetime="2019-06-01 1:00", max_workers=1)
         assert contributors == set([321])
 
 
+def test_daterange_get_submission_bundles():
+    '''
+    Date ranges and statuses are filtered by an evaluation query and only
+    the matching bundles are fetched
+    '''
+    query_results = [[{'objectId': '1'}], [{'objectId': '2'}]]
+    with patch.object(challengeutils.utils, "evaluation_queue_query",
+                      side_effect=query_results) as patch_query,\
+         patch.object(syn, "getSubmission",
+                      side_effect=lambda subid, downloadFile: f"sub{subid}"),\
+         patch.object(syn, "getSubmissionStatus",
+                      side_effect=lambda subid: f"status{subid}"),\
+         patch.object(syn, "getSubmissionBundles") as patch_get_bundles:
+        bundles = list(challengeutils.utils.get_submission_bundles(
+            syn, 123, status=["SCORED", "VALIDATED"],
+            start_datetime="2019-05-06 1:00", end_datetime="2019-06-01 1:00"
+        ))
+    queries = [call[0][1] for call in patch_query.call_args_list]
+    assert queries == [
+        "select objectId from evaluation_123 where createdOn >= "
+        "1557104400000 and createdOn <= 1559350800000 and "
+        "status == 'SCORED'",
+        "select objectId from evaluation_123 where createdOn >= "
+        "1557104400000 and createdOn <= 1559350800000 and "
+        "status == 'VALIDATED'"
+    ]
+    assert bundles == [("sub1", "status1"), ("sub2", "status2")]
+    patch_get_bundles.assert_not_called()
+
+
+def test_nodaterange_get_submission_bundles():
+    '''
+    Without a date range the bundles are listed directly
+    '''
+    with patch.object(syn, "getSubmissionBundles",
+                      return_value=[("sub", "status")]) as patch_get_bundles:
+        bundles = list(challengeutils.utils.get_submission_bundles(
+            syn, 123, status="SCORED"
+        ))
+    patch_get_bundles.assert_called_once_with(123, status="SCORED")
+    assert bundles == [("sub", "status")]
+
+
 def test_get_contributors():
     '''
     Test getting contributors by a list of evaluation IDs
     '''
     contributors = set([321])
-    ids = [123]
+    ids = [123, 456]
     with patch.object(challengeutils.utils, "_get_contributors",
                       return_value=contributors) as patch_syn_get_bundles:
         all_contributors = challengeutils.utils.get_contributors(
             syn, ids, "SCORED")
         assert all_contributors == set([321])
+        # The queues share the workers instead of each getting 8
+        patch_syn_get_bundles.assert_any_call(syn, 456, "SCORED", None,
+                                              None, max_workers=4)
 
 
 def test_list_evaluations():
@@ -299,6 +328,68 @@ def test_teamid__get_submitter_name():
         patch_get_team.assert_called_once_with(submitterid)
 
 
+def test_store_submission_statuses():
+    """Statuses are stored in batches that chain the batch token"""
+    statuses = [{'id': str(subid)} for subid in range(5)]
+    responses = [{'nextUploadToken': 'a'}, {'nextUploadToken': 'b'},
+                 {'batchToken': 'b'}]
+    with patch.object(syn, "restPOST",
+                      side_effect=responses) as patch_rest_post:
+        challengeutils.utils.store_submission_statuses(syn, "123", statuses,
+                                                       batch_size=2)
+    uris = [call[0][0] for call in patch_rest_post.call_args_list]
+    assert uris == ["/evaluation/123/statusBatch"] * 3
+    batches = [json.loads(call[0][1])
+               for call in patch_rest_post.call_args_list]
+    assert [batch['statuses'] for batch in batches] == [statuses[0:2],
+                                                        statuses[2:4],
+                                                        statuses[4:]]
+    assert [batch['isFirstBatch'] for batch in batches] == [True, False,
+                                                            False]
+    assert [batch['isLastBatch'] for batch in batches] == [False, False,
+                                                           True]
+    assert 'batchToken' not in batches[0]
+    assert [batch['batchToken'] for batch in batches[1:]] == ['a', 'b']
+
+
+def test_nostatuses_store_submission_statuses():
+    """Nothing is posted without statuses"""
+    with patch.object(syn, "restPOST") as patch_rest_post:
+        challengeutils.utils.store_submission_statuses(syn, "123", [])
+    patch_rest_post.assert_not_called()
+
+
+def test_invite_members_to_team():
+    """The team is looked up once, members are skipped and failures are
+    reported without stopping the other invitations"""
+    def get_profile(user):
+        if user == "missing":
+            raise ValueError("no such user")
+        return {'ownerId': {'alice': '1', 'bob': '2'}[user]}
+
+    def membership_status(uri):
+        return {'isMember': uri == "/team/3/member/2/membershipStatus"}
+
+    with patch.object(syn, "getTeam", return_value={'id': '3'}) as patch_team,\
+         patch.object(syn, "getUserProfile", side_effect=get_profile),\
+         patch.object(syn, "restGET", side_effect=membership_status),\
+         patch.object(syn, "restPOST",
+                      return_value={'id': '9'}) as patch_post:
+        results = challengeutils.utils.invite_members_to_team(
+            syn, "team", users=["alice", "bob", "missing"],
+            emails=["c@example.com"]
+        )
+    patch_team.assert_called_once_with("team")
+    assert [row['result'] for row in results] == ["invited", "member",
+                                                  "error", "invited"]
+    assert results[0]['invitationid'] == '9'
+    assert patch_post.call_count == 2
+    posted = [json.loads(call[1]['body'])
+              for call in patch_post.call_args_list]
+    assert {'teamId': '3', 'inviteeId': '1'} in posted
+    assert {'teamId': '3', 'inviteeEmail': 'c@example.com'} in posted
+
+
 def test_get_challenge():
     projectid = str(uuid.uuid1())
     chalid = str(uuid.uuid1())
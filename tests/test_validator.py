@@ -59,6 +59,7 @@ def test_valid_notify(validator):
                                            userids=[SUBMISSION.userId],
                                            acknowledge_receipt=False,
                                            dry_run=False,
+                                           outbox=None,
                                            username=SYN_USERPROFILE.userName,
                                            queue_name=EVALUATION.name,
                                            submission_name=SUBMISSION.name,
@@ -80,6 +81,8 @@ def test_error_notify(validator):
                                            userids=[1, 3],
                                            send_messages=False,
                                            dry_run=False,
+                                           outbox=None,
+                                           digest=None,
                                            username="Challenge Administrator",
                                            queue_name=EVALUATION.name,
                                            submission_name=SUBMISSION.name,
@@ -102,6 +105,8 @@ def test_invalid__notify(validator):
                                            userids=[SUBMISSION.userId],
                                            send_messages=False,
                                            dry_run=False,
+                                           outbox=None,
+                                           digest=None,
                                            username=SYN_USERPROFILE.userName,
                                            queue_name=EVALUATION.name,
                                            submission_name=SUBMISSION.name,
@@ -0,0 +1,79 @@
+'''
+Test challengeutils writeup attacher
+'''
+import json
+
+import mock
+from mock import patch
+import pandas as pd
+import synapseclient
+
+from challengeutils import utils, writeup_attacher
+
+SYN = mock.create_autospec(synapseclient.Synapse)
+
+WRITEUPS = [{'team': 'a', 'entityId': 'syn1', 'archived': 'syn11'},
+            {'team': 'b', 'entityId': 'syn2', 'archived': 'syn22'}]
+SUBMISSIONS = [{'objectId': '1', 'team': 'a', 'writeUp': None,
+                'archivedWriteUp': None},
+               {'objectId': '2', 'team': 'b', 'writeUp': 'syn2',
+                'archivedWriteUp': 'syn22'},
+               {'objectId': '3', 'team': 'c', 'writeUp': None,
+                'archivedWriteUp': None}]
+
+
+def test__writeup_changes():
+    """Submissions get an action depending on their current annotations"""
+    summary = writeup_attacher._writeup_changes(pd.DataFrame(SUBMISSIONS),
+                                                pd.DataFrame(WRITEUPS))
+    assert summary['objectId'].tolist() == ['1', '2', '3']
+    assert summary['action'].tolist() == ['updated', 'unchanged',
+                                          'no_writeup']
+    assert summary['writeUp'].tolist()[:2] == ['syn1', 'syn2']
+
+
+def test_missingcolumns__writeup_changes():
+    """Queues that never had write ups attached have no annotation columns"""
+    submissions = pd.DataFrame([{'objectId': '1', 'team': 'a'}])
+    summary = writeup_attacher._writeup_changes(submissions,
+                                                pd.DataFrame(WRITEUPS))
+    assert summary['action'].tolist() == ['updated']
+
+
+def test_attach_writeup():
+    """Only changed submissions are fetched and stored in one batch"""
+    status = synapseclient.SubmissionStatus(id='1', etag='foo',
+                                            status="SCORED")
+    with patch.object(utils, "evaluation_queue_query",
+                      side_effect=[WRITEUPS, SUBMISSIONS]),\
+         patch.object(SYN, "getSubmissionStatus",
+                      return_value=status) as patch_get,\
+         patch.object(utils, "update_single_submission_status",
+                      return_value=status) as patch_update,\
+         patch.object(utils, "store_submission_statuses") as patch_store:
+        summary = writeup_attacher.attach_writeup(SYN, "111", "222")
+    patch_get.assert_called_once_with('1')
+    patch_update.assert_called_once()
+    patch_store.assert_called_once_with(SYN, "222", [status])
+    assert summary['action'].tolist() == ['updated', 'unchanged',
+                                          'no_writeup']
+
+
+def test_request_attach_writeup():
+    """Statuses are sent as Synapse JSON, like syn.store would send them"""
+    status = synapseclient.SubmissionStatus(id='1', etag='foo',
+                                            status="SCORED")
+    with patch.object(utils, "evaluation_queue_query",
+                      side_effect=[WRITEUPS, SUBMISSIONS]),\
+         patch.object(SYN, "getSubmissionStatus", return_value=status),\
+         patch.object(SYN, "restPOST", return_value={}) as patch_post:
+        writeup_attacher.attach_writeup(SYN, "111", "222")
+    uri, body = patch_post.call_args[0]
+    assert uri == "/evaluation/222/statusBatch"
+    sent = json.loads(body)['statuses'][0]
+    assert sent['annotations']['stringAnnos'] == [
+        {'key': 'writeUp', 'value': 'syn1', 'isPrivate': False},
+        {'key': 'archivedWriteUp', 'value': 'syn11', 'isPrivate': False}
+    ]
+    assert sent['submissionAnnotations'] == {'id': '1', 'etag': 'foo',
+                                             'annotations': {}}